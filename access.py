@@ -1,7 +1,6 @@
+import numpy as np
 from tvtk.api import tvtk
 from callout import Callout
-from math import sqrt
-import collections
 
 
 class AccessObj:
@@ -49,7 +48,7 @@ class PointBounds(AccessObj):
         self.y_mid = (y_max - y_min) / 2.0 + y_min
         self.z_mid = (z_max - z_min) / 2.0 + z_min
         if self.plotter.outline is None:
-            self.plotter.outline = self.plotter.scene.mlab.outline(line_width=3)
+            self.plotter.outline = self.plotter.scene.mlab.outline(line_width=3, figure=self.plotter.scene.mayavi_scene)
         self.plotter.outline.manual_bounds = True
         self.plotter.outline.bounds = (self.x_mid - 0.5, self.x_mid + 0.5,
                                        self.y_mid - 0.5, self.y_mid + 0.5,
@@ -63,48 +62,30 @@ class PointBounds(AccessObj):
         t.rotate_z(mun_az)
         t.rotate_y(-90.0 + mun_aof)  # AOF - 90 is necessary to give correct orientation in the Mayavi coord sys
         t.rotate_x(180.0)  # 0 deg is at North Pole by default, so must flip 180 deg to match JMAE orientation
-
-        # create reverse lookup -- all component ids that use each zone angle
-        zone_lookup = collections.defaultdict(list)
-        for cid in comp_ids:
+        matrix = t.matrix.to_array()
+
+        # gather every (zone, component) pair in one pass. Each pair becomes a copy of the cached unit zone mesh,
+        # scaled out to the distance of the component.
+        points, triangles, pks = [], [], []
+        num_points = 0
+        comp_ids = [cid for cid in comp_ids if frag_zones[pid][mun_az].get(cid)]
+        # distances to all the components are measured in one array operation.
+        radii = model.comp_distances((self.x_mid, self.y_mid, self.z_mid), comp_ids)
+        for cid, radius in zip(comp_ids, radii):
             zones = frag_zones[pid][mun_az][cid]
+            pk = model.comp_pk[pid][mun_az][cid]
             for _, lower_angle, upper_angle in zones:
-                zone_lookup[(lower_angle, upper_angle)].append(cid)
-
-        # display each frag zone using largest radius of involved components
-        max_radius = 0.0
-        for zone in zone_lookup:
-            lower_angle, upper_angle = zone
-            for cid in zone_lookup[zone]:
-                sphere_radius = self.dist_to_active_comp(cid)
-                max_radius = max(sphere_radius, max_radius)
-                # set the center to (0, 0, 0) so rotation occurs about the origin first, then translate at the end.
-                frag_zone = tvtk.SphereSource(center=(0, 0, 0), radius=sphere_radius,
-                                              start_phi=lower_angle, end_phi=upper_angle, phi_resolution=50,
-                                              theta_resolution=50)
-                zone_obj = tvtk.AppendPolyData(input_connection=frag_zone.output_port)
-                zone_obj.update()
-                zone_tf = tvtk.TransformPolyDataFilter(input_connection=zone_obj.output_port, transform=t)
-                zone_tf.update()
-                # add the surface to the Mayavi scene
-                surf = self.plotter.scene.mlab.pipeline.surface(zone_tf.output, reset_zoom=False)
-                # manually adjust zone color according to PK value. When the 3D scene was generated, a color lookup
-                # table was saved when the matrix plot was done, and here I use it to match the same color scheme.
-                tid = self.plotter.lut_table.get_index(model.comp_pk[pid][mun_az][cid])
-                surf.actor.actor.property = tvtk.Property(opacity=0.5,
-                                                          color=self.plotter.lut_table.get_table_value(tid)[0:3])
-                # store all the zones in a list so we can do operations (like hide) on them later.
-                self.zones.append(surf)
-                surf.actor.update_data()
-
-    def dist_to_active_comp(self, idx):
-        """ Distance between burstpoint and AV component.
-        :param idx: AV component index
-        :return: distance distance between the burstpoint X,Y,Z coordinates and the AV component X,Y,Z coordinates.
-        """
-        model = self.plotter.model
-        cmp_x, cmp_y, cmp_z = model.comps[idx].x, model.comps[idx].y, model.comps[idx].z
-        return sqrt((self.x_mid - cmp_x) ** 2 + (self.y_mid - cmp_y) ** 2 + (self.z_mid - cmp_z) ** 2)
+                unit_points, unit_triangles = self.plotter.get_zone_mesh(lower_angle, upper_angle)
+                points.append(unit_points * radius)
+                triangles.append(unit_triangles + num_points)
+                pks.append(np.full(len(unit_triangles), pk))
+                num_points += len(unit_points)
+        if not points:
+            return
+        # rotate and translate all of the zone shells at once, then hand them to the single zone actor.
+        points = np.concatenate(points).dot(matrix[:3, :3].T) + matrix[:3, 3]
+        self.plotter.update_frag_zones(points, np.concatenate(triangles), np.concatenate(pks))
+        self.zones.append(self.plotter.zone_surf)
 
     # noinspection PyMethodMayBeStatic
     def is_cell_outline(self):
@@ -120,7 +101,7 @@ class CellBounds(AccessObj):
         super().__init__(plotter)
         self.callout = Callout(justification='center', font_size=18, color=(1, 1, 1))
         self.plotter.scene.add_actor(self.callout.actor)
-        self.plotter.outline = self.plotter.scene.mlab.outline(line_width=3)
+        self.plotter.outline = self.plotter.scene.mlab.outline(line_width=3, figure=self.plotter.scene.mayavi_scene)
         self.hide()
 
     def hide(self):
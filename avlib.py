@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Fragment AV and PE table lookups, vectorized over every AV table at once.
+
+    JMAE interpolates the AV tables between the azimuth, elevation, fragment mass and fragment velocity breakpoints
+    instead of taking the nearest entry, and AVTables.evaluate does the same multilinear interpolation here.
+'''
+
+
+def bracket(breakpoints, value, periodic=False):
+    """ Finds the two breakpoints on either side of a value and the weight of the upper one. Values past the ends are
+    clamped to the end breakpoints, except on a periodic (azimuth) axis, where the interval between the last and the
+    first breakpoint wraps around through 360 degrees.
+
+    :param breakpoints: ascending array of breakpoints
+    :param value: value to look up
+    :param periodic: True for an azimuth axis in degrees
+    :return: (lower index, upper index, upper weight)
+    """
+    n = len(breakpoints)
+    if n == 1:
+        return 0, 0, 0.0
+    if periodic:
+        value = breakpoints[0] + (value - breakpoints[0]) % 360.0
+        if value > breakpoints[-1]:
+            span = breakpoints[0] + 360.0 - breakpoints[-1]
+            if span <= 0.0:  # the table already covers the full circle
+                return n - 1, n - 1, 0.0
+            return n - 1, 0, (value - breakpoints[-1]) / span
+    value = min(max(value, breakpoints[0]), breakpoints[-1])
+    i = int(np.clip(np.searchsorted(breakpoints, value, side='right') - 1, 0, n - 2))
+    width = breakpoints[i + 1] - breakpoints[i]
+    return i, i + 1, (value - breakpoints[i]) / width if width > 0.0 else 0.0
+
+
+class AVTables(object):
+    """ The AV and PE tables of a model as arrays indexed as [table, azimuth, elevation, mass, velocity]. """
+    def __init__(self, model):
+        """
+        :param model: DataModel with the AV file read in
+        """
+        self.azs = np.array(model.azs, dtype=float)
+        self.els = np.array(model.els, dtype=float)
+        self.mss = np.array(model.mss, dtype=float)
+        self.vls = np.array(model.vls, dtype=float)
+        self.avs = np.array(model.avs, dtype=float)
+        self.pes = np.array(model.pes, dtype=float)
+        if model.av_averaging == 1:
+            # only the first azimuth is stored at straight up and straight down, so copy it to the others.
+            polar = np.nonzero(np.abs(self.els) == 90.0)[0]
+            self.avs[:, :, polar] = self.avs[:, :1, polar]
+            self.pes[:, :, polar] = self.pes[:, :1, polar]
+
+    def evaluate(self, az, el, mass, vel):
+        """ Multilinear interpolation of every table at one attack aspect and fragment.
+
+        :param az: attack azimuth in degrees
+        :param el: attack elevation in degrees
+        :param mass: fragment mass
+        :param vel: fragment velocity
+        :return: (avs, pes), each an array with one value per table.
+        """
+        brackets = [bracket(self.azs, az, periodic=True), bracket(self.els, el),
+                    bracket(self.mss, mass), bracket(self.vls, vel)]
+        # gather the 2x2x2x2 corner block of every table, then weight the corners in one contraction.
+        index = np.ix_(*[[lo, hi] for lo, hi, _ in brackets])
+        weights = np.ones((2, 2, 2, 2))
+        for axis, (_, _, w) in enumerate(brackets):
+            shape = [1, 1, 1, 1]
+            shape[axis] = 2
+            weights = weights * np.array([1.0 - w, w]).reshape(shape)
+        avs = np.tensordot(self.avs[(slice(None),) + index], weights, axes=4)
+        pes = np.tensordot(self.pes[(slice(None),) + index], weights, axes=4)
+        return avs, pes
+
+
+class TestAVLib(unittest.TestCase):
+    def setUp(self):
+        class Model(object):
+            azs, els, mss, vls = [0.0, 90.0, 180.0, 270.0], [-90.0, 0.0, 90.0], [1.0, 2.0], [1000.0, 3000.0]
+            av_averaging = 1
+        model = Model()
+        # AV = az + el + 10 * mass + vel / 100, so multilinear interpolation reproduces it exactly inside the table.
+        az, el, ms, vl = np.meshgrid(model.azs, model.els, model.mss, model.vls, indexing='ij')
+        table = az + el + 10.0 * ms + vl / 100.0
+        model.avs = np.stack([table, 2.0 * table])
+        model.pes = np.ones_like(model.avs)
+        self.tables = AVTables(model)
+
+    def test_bracket(self):
+        self.assertEqual(bracket(np.array([0.0, 10.0, 20.0]), 15.0), (1, 2, 0.5))
+        self.assertEqual(bracket(np.array([0.0, 10.0, 20.0]), 25.0), (1, 2, 1.0))
+        lo, hi, w = bracket(np.array([0.0, 90.0, 180.0, 270.0]), 315.0, periodic=True)
+        self.assertEqual((lo, hi), (3, 0))
+        self.assertAlmostEqual(w, 0.5)
+
+    def test_evaluate(self):
+        avs, pes = self.tables.evaluate(45.0, 0.0, 1.5, 2000.0)
+        self.assertEqual(avs.shape, (2,))
+        self.assertAlmostEqual(avs[0], 45.0 + 15.0 + 20.0)
+        self.assertAlmostEqual(avs[1], 2.0 * (45.0 + 15.0 + 20.0))
+        self.assertTrue(np.allclose(pes, 1.0))
+        # straight down only stores azimuth 0, so every azimuth gets that table.
+        avs, _ = self.tables.evaluate(180.0, -90.0, 1.0, 1000.0)
+        self.assertAlmostEqual(avs[0], 0.0 - 90.0 + 10.0 + 10.0)
@@ -6,3 +6,43 @@ BY_AZIMUTH = 1
 GYPSY_PINK = (0.6745, 0.196, 0.3882)  # color coveted by JJS; used for blast volumes
 WHITE = (1.0, 1.0, 1.0)
 CMPID, R1, R2, R3, Z1, Z2 = range(6)
+MATRIX_TILE_THRESHOLD = 1000000  # non-uniform matrices with more cells than this are drawn as tiles
+MATRIX_TILE_SIZE = 256  # number of cells along each side of a matrix tile
+MATRIX_COARSE_FACTOR = 8  # cells merged along each side when a tile is drawn at low resolution
+# matrix cell display options in the parameter dialog, with the PK tolerance used for merging cells (None = no merge)
+MATRIX_CELL_OPTIONS = [('All cells', None), ('Merge equal cells', 0.0), ('Merge cells within 0.01 Pk', 0.01)]
+PK_CONTOUR_LEVELS = (0.1, 0.5, 0.9)  # iso-PK lines drawn over the matrix
+AZIMUTH_PLAYBACK_INTERVAL = 100  # milliseconds between azimuths when the azimuth sweep is playing
+BURSTPOINT_PICK_RADIUS = 0.375  # world units; half the burstpoint glyph size
+PICK_TOLERANCE_PIXELS = 5  # how far (in pixels) a click can miss a burstpoint and still select it
+POINT_RENDER_THRESHOLD = 5000  # above this many burstpoints, points are drawn as vertices instead of sphere glyphs
+POINT_RENDER_SIZE = 4  # on-screen size in pixels of burstpoints drawn as vertices
+SWEEP_AXES = ('AOF', 'Terminal velocity', 'Burst height')  # terminal conditions a sweep can step through
+SWEEP_FRAME_INTERVAL = 50  # milliseconds between frames of a playing sweep
+MATRIX_COMPARE_MAX_LINES = 2049  # most gridlines along each axis of the common grid used to compare matrices
+# derived matrix views over the cases along the sweep axis
+MATRIX_VIEWS = ('Case Pk', 'Mean Pk over sweep', 'Max Pk over sweep', 'Pk difference from')
+EXPORT_MAGNIFICATION = 4  # default size of exported images, as a multiple of the window size
+EXPORT_MAX_MAGNIFICATION = 8  # largest export size offered, which keeps a full size image within a few hundred MB
+EXPORT_MAX_RENDER_SIZE = 4096  # widest offscreen frame buffer rendered in one pass; larger images are tiled
+MOVIE_KINDS = ('Orbit from home view', 'Orbit from top view', 'Azimuth sweep', 'Sweep along toolbar axis')
+MOVIE_ORBIT_FRAMES = 120  # frames in a full 360 degree orbit
+MOVIE_FPS = 24
+AV_GLYPH_SIZE = 0.3  # size of the AV component spheres when they aren't colored by a fragment
+AV_GLYPH_MIN_SIZE, AV_GLYPH_MAX_SIZE = 0.1, 0.6  # sphere size range when sized by interpolated AV
+AV_SLIDER_STEPS = 20  # slider steps between neighboring mass or velocity breakpoints
+POINT_COLORINGS = ('Color by kill PK', 'Color by frag zone reach')  # burstpoint coloring options in the detail frame
+SHOTLINE_DRAW_LIMIT = 20000  # most burstpoint-to-component shotlines drawn at once; past this they're only counted
+SHOTLINE_BATCH = 100000  # shotlines traced through the surfaces at a time, which bounds the memory of a trace
+SHOTLINE_TRACE_LIMIT = 2000000  # above this many shotlines, ask before tracing from every burstpoint on display
+AV_HIGHLIGHT_SCALE, AV_DIM_SCALE = 2.0, 0.5  # AV sphere size multipliers for search matches and everything else
+AV_HIGHLIGHT_CALLOUTS = 10  # show the name callouts of the matches when there are no more than this many
+DETAIL_MECHANISMS = ('All', 'DH', 'Blast', 'Frag')  # kill mechanism filter of the burstpoint detail table
+PERF_LOG_FILE = 'jmaeout_perf.jsonl'  # timing log written next to jmaeout.ini while timings are recorded
+# scene layers counted by the frame time HUD, each of which can be hidden from the toolbar
+SCENE_LAYERS = ('Target', 'Matrix', 'Blast volumes', 'AV glyphs', 'Callouts', 'Burstpoints', 'Frag zones')
+HUD_FRAME_WINDOW = 240  # most recent frames the HUD frame time percentiles are taken over
+MEMORY_BUDGET_MB = 4096  # memory the open cases, scenes and caches should stay under
+MEMORY_EVICT_FRACTION = 0.8  # fraction of the budget at which caches and offscreen geometry are released
+MEMORY_REARM_FRACTION = 0.7  # fraction of the budget usage has to drop under before releasing them again
+MEMORY_CHECK_INTERVAL = 5000  # milliseconds between memory checks of the parameter dialog
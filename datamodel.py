@@ -1,7 +1,42 @@
-from parselib import AV, Surfaces, Output, Matrix, Kill, Detail
+from parselib import AV, Surfaces, Output, Matrix, Kill, Detail, KillNode, AVComp
 import os
+import logging
+import unittest
 import numpy as np
 import util
+import perf
+import memory
+from const import SHOTLINE_BATCH
+from matrixlib import PKQuadtree
+from geomlib import KDTree, BVH, distances, inside_blast_volumes, munition_axes, inside_frag_zones, \
+    quads_to_triangles
+from killlib import KillTree
+from searchlib import NameIndex
+
+log = logging.getLogger(__name__)
+
+# the attributes sized for each part of a case in DataModel.memory_usage.
+MEMORY_GROUPS = (('AV tables', ('avs', 'pes', 'azs', 'els', 'mss', 'vls', 'table_names', 'table_ids')),
+                 ('Surfaces', ('surfaces', 'surf_names')),
+                 ('PKs', ('pks', 'pk_trees', 'kill_pks')),
+                 ('Detail', ('comp_pk', 'surface_hit', 'frag_zones', 'sample_loc', 'burst_loc', 'sample_xyz',
+                             'burst_xyz', 'blast_inside', 'frag_reach', 'detail_comp_ids', 'detail_comp_names',
+                             'detail_mechanisms', 'pk_cid', 'pk_value', 'pk_point_index', 'pk_az_index', 'zone_cid',
+                             'zone_lower', 'zone_upper', 'zone_point_index', 'zone_az_index')),
+                 ('Spatial indexes', ('burst_trees', 'surface_bvh', 'comp_name_index')))
+# the nested .dtl dictionaries, sized from a sample of their records instead of walking all of them.
+ESTIMATED_ATTRS = ('comp_pk', 'surface_hit', 'frag_zones', 'sample_loc', 'burst_loc')
+
+
+def lookup_columns(values, keys):
+    """ :return: array with the position of each value in keys, or -1 for values that aren't in keys. """
+    values = np.asarray(values, dtype=int)
+    if len(keys) == 0:
+        return np.full(len(values), -1, dtype=int)
+    keys = np.asarray(keys, dtype=int)
+    order = np.argsort(keys)
+    pos = np.clip(np.searchsorted(keys[order], values), 0, len(keys) - 1)
+    return np.where(keys[order][pos] == values, order[pos], -1)
 
 
 class DataModel(object):
@@ -20,6 +55,7 @@ class DataModel(object):
         self.gridlines_range_mid, self.gridlines_defl_mid = None, None
         self.cell_size_range, self.cell_size_defl = None, None
         self.pks = None
+        self.pk_trees = {}  # merged-cell matrices by PK tolerance
         self.surf_names = None
         self.surfaces = None
         self.srf_min_x, self.srf_max_x = None, None
@@ -37,6 +73,7 @@ class DataModel(object):
         self.vls = None
         self.mss = None
         self.table_names = None
+        self.table_ids = None
         self.avs = None
         self.pes = None
         self.av_averaging = None
@@ -57,8 +94,35 @@ class DataModel(object):
         self.dh_ids = None
         self.dtl_file = None
         self.comp_num = None
+        self.pk_pid, self.pk_az, self.pk_cid, self.pk_value = None, None, None, None
+        self.zone_pid, self.zone_az, self.zone_cid, self.zone_lower, self.zone_upper = None, None, None, None, None
+        self.pk_point_index, self.pk_az_index = None, None
+        self.zone_point_index, self.zone_az_index = None, None
         self.sample_loc = None
         self.burst_loc = None
+        self.point_ids = None
+        self.point_index = None
+        self.detail_azs = None
+        self.detail_az_index = None
+        self.sample_xyz = None
+        self.burst_xyz = None
+        self.comp_ids = None
+        self.comp_index = None
+        self.comp_xyz = None
+        self.burst_trees = None
+        self.surface_bvh = None
+        self.comp_name_index = None
+        self.kill_pks = None
+        self.blast_comp_ids = None
+        self.blast_inside = None
+        self.reach_comp_ids = None
+        self.frag_reach = None
+        self.detail_comp_ids = None
+        self.detail_comp_names = None
+        self.detail_mechanisms = None
+        self.mem_usage = None
+        self.mem_seen = None
+        self.built = set()
 
     def read_and_transform_all_files(self, out_file):
         av_file, srf_file, mtx_file, kill_file, dtl_file = Output(self).read(out_file)
@@ -75,6 +139,7 @@ class DataModel(object):
             if detail.validate(dtl_file):
                 detail.read(dtl_file)
                 self.dtl_file = dtl_file
+                self.transform_detail()
             else:
                 raise IOError(".dtl file does not have the full level of detail.")
         # extract the component IDs that are part of the selected kill in the kill definition file.
@@ -84,25 +149,51 @@ class DataModel(object):
         self.transform_direct_hit_components(kill_comps)
         self.transform_frag_components(kill_comps)
         self.transform_surfaces()
+        self.build_spatial_index()
+        # the kill PKs, blast and frag classifications and the search indexes are built the first time they're
+        # asked for (see lazy), so reading a case only does the work needed to draw it.
+        if self.dtl_file is not None:
+            self.index_detail_components()
+            perf.count('burstpoints', len(self.point_ids))
+        perf.count('components', len(self.comps))
+        # sized while the case is read in, so the memory check only has to read the totals.
+        self.memory_usage()
+        memory.track_model(self)
+
+    def read_matrix(self, out_file):
+        """ Read only the terminal conditions and the matrix of a case, which is all a sweep frame or a case
+        comparison needs. This runs on the sweep worker thread, so the case is left for the caller to register with
+        memory.track_model on the GUI thread. """
+        av_file, _, mtx_file, _, _ = Output(self).read(out_file)
+        if av_file is None:
+            raise IOError("Case didn't complete.")
+        if not os.path.exists(mtx_file):
+            raise IOError("Case has no matrix file.")
+        Matrix(self).read(mtx_file)
+        self.transform_matrix()
 
+    @perf.timed()
     def transform_blast_volumes(self, kill_ids):
         """ Keep only the blast AVs that match with the frag components listed in the selected kill. """
         if kill_ids:
             self.blast_ids.intersection_update(kill_ids)
             self.blast_ids.difference_update(self.invuln_ids)
 
+    @perf.timed()
     def transform_direct_hit_components(self, kill_ids):
         """ Keep only the direct hit AVs that match with the frag components listed in the selected kill. """
         if kill_ids:
             self.dh_ids.intersection_update(kill_ids)
             self.dh_ids.difference_update(self.invuln_ids)
 
+    @perf.timed()
     def transform_frag_components(self, kill_ids):
         """ Keep only the fragment AVs that match with the frag components listed in the selected kill. """
         if kill_ids:
             self.frag_ids.intersection_update(kill_ids)
             self.frag_ids.difference_update(self.invuln_ids)
 
+    @perf.timed()
     def transform_surfaces(self):
         """ Calculate a volume radius and geometric center for the target surfaces. """
         self.surfaces = np.array(self.surfaces)
@@ -110,6 +201,223 @@ class DataModel(object):
         for r1, r2, r3, z1, z2 in self.blast_vol.values():
             self.volume_radius = max(self.volume_radius, z1 + z2 + max(r3, r2, r1) + 10.0)
 
+    @perf.timed()
+    def transform_detail(self):
+        """ Copy the sample and burstpoint locations into (num_points, num_azimuths, 3) arrays, so all the points
+        for an azimuth can be pulled out with a single slice instead of walking the nested dictionaries. """
+        self.point_ids = sorted(self.burst_loc)
+        self.point_index = {pid: i for i, pid in enumerate(self.point_ids)}
+        self.detail_azs = sorted(set(az for pid in self.point_ids for az in self.burst_loc[pid]))
+        self.detail_az_index = {az: i for i, az in enumerate(self.detail_azs)}
+        shape = (len(self.point_ids), len(self.detail_azs), 3)
+        self.sample_xyz = np.full(shape, np.nan)
+        self.burst_xyz = np.full(shape, np.nan)
+        for i, pid in enumerate(self.point_ids):
+            for az, loc in self.sample_loc[pid].items():
+                self.sample_xyz[i, self.detail_az_index[az]] = loc
+            for az, loc in self.burst_loc[pid].items():
+                self.burst_xyz[i, self.detail_az_index[az]] = loc
+        # the flat PK and frag zone records from the parser become arrays, indexed into the same layout.
+        point_ids, azs = np.array(self.point_ids), np.array(self.detail_azs)
+        self.pk_cid, self.pk_value = np.array(self.pk_cid, dtype=int), np.array(self.pk_value, dtype=float)
+        self.pk_point_index = np.searchsorted(point_ids, np.array(self.pk_pid, dtype=int))
+        self.pk_az_index = np.searchsorted(azs, np.array(self.pk_az, dtype=int))
+        self.zone_cid = np.array(self.zone_cid, dtype=int)
+        self.zone_lower, self.zone_upper = np.array(self.zone_lower), np.array(self.zone_upper)
+        self.zone_point_index = np.searchsorted(point_ids, np.array(self.zone_pid, dtype=int))
+        self.zone_az_index = np.searchsorted(azs, np.array(self.zone_az, dtype=int))
+        self.pk_pid = self.pk_az = self.zone_pid = self.zone_az = None
+
+    def lazy(self, name, build):
+        """ Build an attribute the first time it's asked for.
+        :param name: attribute set by build
+        :param build: method that computes the attribute
+        :return: the attribute's value
+        """
+        if name not in self.built:
+            build()
+            self.built.add(name)
+            self.add_memory_usage(name, getattr(self, name))
+        return getattr(self, name)
+
+    def has_blast_detail(self):
+        """ :return: True if the burstpoints can be classified by blast volume. """
+        return self.dtl_file is not None and bool(self.blast_ids)
+
+    def get_kill_pks(self):
+        """ :return: (num_points, num_azimuths) array of kill PKs, or None without a .dtl file or a kill tree. """
+        return self.lazy('kill_pks', self.compute_kill_pks) if self.dtl_file is not None else None
+
+    def get_blast_inside(self):
+        """ :return: blast_inside (see classify_blast_points), or None without blast components. """
+        return self.lazy('blast_inside', self.classify_blast_points) if self.dtl_file is not None else None
+
+    def get_frag_reach(self):
+        """ :return: frag_reach (see compute_frag_reach), or None without a .dtl file. """
+        return self.lazy('frag_reach', self.compute_frag_reach) if self.dtl_file is not None else None
+
+    def get_surface_bvh(self):
+        return self.lazy('surface_bvh', self.build_surface_bvh)
+
+    def get_comp_name_index(self):
+        return self.lazy('comp_name_index', self.build_comp_name_index)
+
+    def get_burst_tree(self, az):
+        """ :return: k-d tree over the burstpoint locations at azimuth az, for picking. """
+        if self.burst_trees is None:
+            self.burst_trees = {}
+        if az not in self.burst_trees:
+            with perf.span('DataModel.get_burst_tree'):
+                self.burst_trees[az] = KDTree(self.burst_xyz[:, self.detail_az_index[az]])
+            self.add_memory_usage('burst_trees', self.burst_trees[az])
+        return self.burst_trees[az]
+
+    @perf.timed()
+    def index_detail_components(self):
+        """ List the direct hit, blast and frag components with a PK in the .dtl file, with the kill mechanism of
+        each as DH, Blast or Frag (in that order of precedence). """
+        self.detail_comp_ids = np.array(sorted(self.dh_ids.union(self.blast_ids).union(self.frag_ids)), dtype=int)
+        self.detail_comp_names = np.array([self.comps[cid].name for cid in self.detail_comp_ids], dtype=object)
+        self.detail_mechanisms = np.array(['DH' if cid in self.dh_ids else 'Blast' if cid in self.blast_ids
+                                           else 'Frag' for cid in self.detail_comp_ids], dtype=object)
+
+    def get_comp_pks(self, pid, az):
+        """ :return: array of the component PKs at a point and azimuth, in detail_comp_ids order. """
+        pks = self.comp_pk[pid][az]
+        return np.fromiter((pks.get(cid, 0.0) for cid in self.detail_comp_ids.tolist()), dtype=float,
+                           count=len(self.detail_comp_ids))
+
+    @perf.timed()
+    def compute_kill_pks(self):
+        """ Evaluate the selected kill at every burstpoint and azimuth, as a (num_points, num_azimuths) array. A
+        component without a PK at a point (not hit, or not listed in the .dtl file) counts as 0. A kill the tree can't
+        be built from leaves the points uncolored, the same as extract_components finding no components. """
+        try:
+            tree = KillTree(self.kill_lines, self.last_node, self.mtx_kill_id) if self.mtx_kill_id else None
+        except ValueError as e:
+            log.warning('No kill PKs for %s: %s', self.mtx_kill_id, e)
+            tree = None
+        if tree is None or tree.root is None:
+            self.kill_pks = None
+            return
+        comp_pks = np.zeros((len(self.point_ids), len(self.detail_azs), len(tree.comp_ids)))
+        column = lookup_columns(self.pk_cid, tree.comp_ids)
+        keep = column >= 0
+        comp_pks[self.pk_point_index[keep], self.pk_az_index[keep], column[keep]] = self.pk_value[keep]
+        self.kill_pks = np.clip(tree.evaluate(comp_pks), 0.0, 1.0)
+
+    @perf.timed()
+    def classify_blast_points(self):
+        """ Find which blast volumes each burstpoint falls in, at every azimuth. blast_inside is a
+        (num_points, num_azimuths, num_blast_comps) boolean array, with the components in blast_comp_ids order. """
+        self.blast_comp_ids = sorted(self.blast_ids)
+        if not self.blast_comp_ids:
+            self.blast_inside = None
+            return
+        centers = [(self.comps[cid].x, self.comps[cid].y) for cid in self.blast_comp_ids]
+        volumes = [self.blast_vol[cid] for cid in self.blast_comp_ids]
+        inside = inside_blast_volumes(self.burst_xyz.reshape(-1, 3), centers, volumes)
+        self.blast_inside = inside.reshape(self.burst_xyz.shape[:2] + (len(self.blast_comp_ids),))
+
+    @perf.timed()
+    def compute_frag_reach(self):
+        """ Find which frag components are inside one of their own frag zones, for every burstpoint and azimuth.
+        The parser keeps one record per (point, azimuth, component, zone), and all the records are tested at once.
+        frag_reach is a (num_points, num_azimuths, num_frag_comps) boolean array, with the components in
+        reach_comp_ids order. """
+        self.reach_comp_ids = sorted(self.frag_ids)
+        self.frag_reach = np.zeros((len(self.point_ids), len(self.detail_azs), len(self.reach_comp_ids)), dtype=bool)
+        column = lookup_columns(self.zone_cid, self.reach_comp_ids)
+        keep = np.nonzero(column >= 0)[0]
+        if not len(keep):
+            return
+        pt, az, comp = self.zone_point_index[keep], self.zone_az_index[keep], column[keep]
+        targets = self.comp_xyz[[self.comp_index[cid] for cid in self.reach_comp_ids]]
+        axes = munition_axes(self.detail_azs, self.aof)
+        inside = inside_frag_zones(self.burst_xyz[pt, az], targets[comp], axes[az], self.zone_lower[keep],
+                                   self.zone_upper[keep])
+        self.frag_reach[pt[inside], az[inside], comp[inside]] = True
+
+    def get_frag_reach_counts(self, az):
+        """ :return: list of (component ID, number of burstpoints whose frags reach it) at azimuth az. """
+        counts = self.get_frag_reach()[:, self.detail_az_index[az]].sum(axis=0)
+        return list(zip(self.reach_comp_ids, counts))
+
+    def get_blast_mask(self, az):
+        """ :return: boolean array over the burstpoints, True for the ones inside any blast volume at azimuth az. """
+        return self.get_blast_inside()[:, self.detail_az_index[az]].any(axis=1)
+
+    def get_blast_counts(self, az):
+        """ :return: list of (component ID, number of burstpoints inside its blast volume) at azimuth az. """
+        counts = self.get_blast_inside()[:, self.detail_az_index[az]].sum(axis=0)
+        return list(zip(self.blast_comp_ids, counts))
+
+    @perf.timed()
+    def build_spatial_index(self):
+        """ Gather the component locations for distance queries. The k-d trees over the burstpoints, the surface
+        BVH and the name index are built on first use (see get_burst_tree, get_surface_bvh and get_comp_name_index).
+        """
+        self.comp_ids = np.array(sorted(self.comps))
+        self.comp_index = {cid: i for i, cid in enumerate(self.comp_ids)}
+        self.comp_xyz = np.array([(self.comps[cid].x, self.comps[cid].y, self.comps[cid].z) for cid in self.comp_ids])
+
+    @perf.timed()
+    def build_surface_bvh(self):
+        """ Index the target surfaces for tracing shotlines. """
+        self.surface_bvh = BVH(quads_to_triangles(self.surfaces), leaf_size=32)
+
+    @perf.timed()
+    def build_comp_name_index(self):
+        """ Index the component names and IDs for searching. """
+        self.comp_name_index = NameIndex({cid: comp.name for cid, comp in self.comps.items()})
+
+    def comp_distances(self, point, comp_ids=None):
+        """
+        :param point: (x, y, z) location, usually a burstpoint
+        :param comp_ids: component IDs to measure, or None for every component
+        :return: array of distances from the point to each component, in the order of comp_ids (or self.comp_ids).
+        """
+        if comp_ids is None:
+            return distances(self.comp_xyz, point)
+        return distances(self.comp_xyz[[self.comp_index[cid] for cid in comp_ids]], point)
+
+    def shotline_ends(self, origins, comp_ids):
+        """ :return: (P * C, 2, 3) array of the end points of the shotlines from P origins to C components, ordered
+        by origin and then component. """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        targets = self.comp_xyz[[self.comp_index[cid] for cid in comp_ids]]
+        return np.stack([np.repeat(origins, len(targets), axis=0), np.tile(targets, (len(origins), 1))], axis=1)
+
+    def trace_shotlines(self, origins, comp_ids, list_hits=False):
+        """ Trace a shotline from every origin to every component through the target surfaces. The shotlines are
+        traced a batch of origins at a time, so memory stays bounded however many burstpoints there are.
+
+        :param origins: (P, 3) array of burstpoint locations
+        :param comp_ids: component IDs to trace to
+        :param list_hits: True to also list the surfaces in the way of each shotline
+        :return: (blocked, hits). blocked is a (P, C) boolean array, True where a surface is in the way; hits is a
+                 list of (shotline index, surface index) pairs for every obstructing surface, with shotlines
+                 numbered by origin and then component, or None if list_hits is False.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        targets = self.comp_xyz[[self.comp_index[cid] for cid in comp_ids]]
+        num_targets = len(targets)
+        blocked = np.zeros((len(origins), num_targets), dtype=bool)
+        hits = set() if list_hits else None
+        bvh = self.get_surface_bvh()
+        step = max(1, SHOTLINE_BATCH // max(num_targets, 1))
+        for start in range(0, len(origins), step):
+            batch = origins[start:start + step]
+            rays, tris, _ = bvh.intersect_segments(np.repeat(batch, num_targets, axis=0),
+                                                  np.tile(targets, (len(batch), 1)))
+            rays += start * num_targets
+            blocked.ravel()[rays] = True
+            if list_hits:
+                # the two triangles of a quad are one surface; a line crossing the shared diagonal only counts once.
+                hits.update(zip(rays.tolist(), (tris // 2).tolist()))
+        return blocked, sorted(hits) if list_hits else None
+
+    @perf.timed()
     def transform_matrix(self):
         # Store the matrix extents in range & deflection for later display in the 3D scene.
         self.mtx_extent_range = (self.gridlines_range[0], self.gridlines_range[-1])
@@ -129,6 +437,47 @@ class DataModel(object):
         # Get rid of floating point noise that can cause Pk values > 1.0
         self.pks = np.clip(self.pks, 0.0, 1.0)
 
+    def get_pk_tree(self, tolerance):
+        """ :return: the merged-cell (quadtree) version of the PK matrix at a tolerance, or None if tolerance is None.
+        Each tolerance is built once and kept, since windows showing the same case may use different ones. """
+        if tolerance is None or self.pks is None:
+            return None
+        if tolerance not in self.pk_trees:
+            with perf.span('DataModel.get_pk_tree'):
+                self.pk_trees[tolerance] = PKQuadtree(self.pks, tolerance)
+            self.add_memory_usage('pk_trees', self.pk_trees[tolerance])
+        return self.pk_trees[tolerance]
+
+    def memory_usage(self):
+        """ Sized once when the case is read in and kept; the indexes built later are added with add_memory_usage.
+        :return: dict of bytes held by each group in MEMORY_GROUPS, plus everything else as 'Other'.
+        """
+        if self.mem_usage is None:
+            seen = self.mem_seen = set()
+            seen.add(id(seen))
+            usage = {}
+            for group, names in MEMORY_GROUPS:
+                usage[group] = 0
+                for name in names:
+                    value = getattr(self, name, None)
+                    if name in ESTIMATED_ATTRS and isinstance(value, dict):
+                        usage[group] += memory.estimate_sizeof(value, seen=seen)
+                    else:
+                        usage[group] += memory.sizeof(value, seen)
+            usage['Other'] = memory.sizeof(self.__dict__, seen)
+            self.mem_usage = usage
+        return self.mem_usage
+
+    def add_memory_usage(self, name, value):
+        """ Add something built after the case was sized to its group's total, without sizing the rest again.
+        :param name: attribute the value is kept in
+        :param value: the new object
+        """
+        if self.mem_usage is None:
+            return
+        group = next((group for group, names in MEMORY_GROUPS if name in names), 'Other')
+        self.mem_usage[group] += memory.sizeof(value, self.mem_seen)
+
     def extract_components(self, kill_type, kill_node=None):
         """
         :param kill_type: string with k number (e.g., 'k1' or 'k5') matched against the same type in the kill
@@ -162,3 +511,150 @@ class DataModel(object):
 
     def get_burst_points(self):
         return self.burst_loc
+
+    def get_sample_array(self):
+        return self.sample_xyz
+
+    def get_burst_array(self):
+        return self.burst_xyz
+
+
+class TestDataModel(unittest.TestCase):
+    """ The array versions of the detail transforms, checked against the per-point loops they replaced. """
+    def setUp(self):
+        """ A hand-built case with 4 burstpoints at 2 azimuths, the way the parsers leave it. Point 12 is missing
+        its 90 degree azimuth. """
+        model = self.model = DataModel()
+        model.dtl_file = 'test.dtl'
+        model.mtx_kill_id = 'k1'
+        model.aof = 30.0
+        # k1: c1 OR (c2 AND c3)
+        model.kill_lines = {'k1,1': KillNode('AND', ['c2', 'c3']), 'k1,2': KillNode('OR', ['c1', 'n1'])}
+        model.last_node = {'k1': '2'}
+        model.comps = {cid: AVComp(x=x, y=y, z=0.0, name='comp %d' % cid)
+                       for cid, x, y in ((1, 2.0, 1.0), (2, 6.0, -3.0), (3, 9.0, 4.0), (8, -4.0, 2.0))}
+        model.frag_ids = {1, 2, 3}
+        model.dh_ids, model.blast_ids = set(), set()
+        azs = {4: (0, 90), 7: (0, 90), 9: (0, 90), 12: (0,)}
+        model.burst_loc = {pid: {az: (pid, az / 10.0, 5.0) for az in azs[pid]} for pid in azs}
+        model.sample_loc = {pid: {az: (pid, az / 10.0, 0.0) for az in azs[pid]} for pid in azs}
+        model.comp_pk = {4: {0: {1: 0.5, 2: 0.2}, 90: {3: 0.4}}, 7: {0: {}, 90: {1: 0.1, 2: 0.5, 3: 0.5, 8: 0.9}},
+                         9: {0: {2: 1.0, 3: 1.0}, 90: {}}, 12: {0: {3: 0.3}}}
+        zones = [(1, 0.0, 60.0), (2, 60.0, 120.0), (3, 120.0, 180.0)]
+        model.frag_zones = {pid: {az: {cid: zones[(pid + cid) % 3:] for cid in (1, 2, 3, 8)} for az in azs[pid]}
+                            for pid in azs}
+        # the flat records the parser appends next to the dictionaries.
+        model.pk_pid, model.pk_az, model.pk_cid, model.pk_value = [], [], [], []
+        for pid, az_pks in model.comp_pk.items():
+            for az, pks in az_pks.items():
+                for cid, pk in pks.items():
+                    model.pk_pid.append(pid)
+                    model.pk_az.append(az)
+                    model.pk_cid.append(cid)
+                    model.pk_value.append(pk)
+        model.zone_pid, model.zone_az, model.zone_cid, model.zone_lower, model.zone_upper = [], [], [], [], []
+        for pid, az_zones in model.frag_zones.items():
+            for az, comp_zones in az_zones.items():
+                for cid, zone_info in comp_zones.items():
+                    for _, lower, upper in zone_info:
+                        model.zone_pid.append(pid)
+                        model.zone_az.append(az)
+                        model.zone_cid.append(cid)
+                        model.zone_lower.append(lower)
+                        model.zone_upper.append(upper)
+        # two plates between the burstpoints and the components.
+        model.surfaces = np.array([[3.0, -10.0, 2.5], [8.0, -10.0, 2.5], [8.0, 10.0, 2.5], [3.0, 10.0, 2.5],
+                                   [0.0, -10.0, 0.0], [0.0, 10.0, 0.0], [0.0, 10.0, 6.0], [0.0, -10.0, 6.0]])
+        model.transform_detail()
+        model.build_spatial_index()
+
+    def test_transform_detail(self):
+        model = self.model
+        self.assertEqual(model.point_ids, [4, 7, 9, 12])
+        for pid in model.point_ids:
+            for j, az in enumerate(model.detail_azs):
+                i = model.point_index[pid]
+                if az in model.burst_loc[pid]:
+                    self.assertEqual(tuple(model.burst_xyz[i, j]), model.burst_loc[pid][az])
+                    self.assertEqual(tuple(model.sample_xyz[i, j]), model.sample_loc[pid][az])
+                else:
+                    self.assertTrue(np.isnan(model.burst_xyz[i, j]).all())
+        pks = {(model.point_ids[i], model.detail_azs[j], cid): pk for i, j, cid, pk in
+               zip(model.pk_point_index, model.pk_az_index, model.pk_cid, model.pk_value)}
+        self.assertEqual(pks, {(pid, az, cid): pk for pid, az_pks in model.comp_pk.items()
+                               for az, comp_pks in az_pks.items() for cid, pk in comp_pks.items()})
+
+    def test_kill_pks(self):
+        model = self.model
+        tree = KillTree(model.kill_lines, model.last_node, model.mtx_kill_id)
+        comp_pks = np.zeros((len(model.point_ids), len(model.detail_azs), len(tree.comp_ids)))
+        for i, pid in enumerate(model.point_ids):
+            for az, pks in model.comp_pk[pid].items():
+                comp_pks[i, model.detail_az_index[az]] = [pks.get(cid, 0.0) for cid in tree.comp_ids]
+        self.assertTrue(np.allclose(model.get_kill_pks(), np.clip(tree.evaluate(comp_pks), 0.0, 1.0)))
+        self.assertAlmostEqual(model.kill_pks[model.point_index[9], model.detail_az_index[0]], 1.0)
+
+    def test_bad_kill_tree(self):
+        self.model.kill_lines['k1,1'].op = 'XOR'
+        self.assertIsNone(self.model.get_kill_pks())
+        del self.model.kill_lines['k1,1']
+        self.model.compute_kill_pks()
+        self.assertIsNone(self.model.kill_pks)
+
+    def test_frag_reach(self):
+        model = self.model
+        reach = model.get_frag_reach()
+        axes = munition_axes(model.detail_azs, model.aof)
+        expected = np.zeros_like(reach)
+        for i, pid in enumerate(model.point_ids):
+            for az, comp_zones in model.frag_zones[pid].items():
+                j = model.detail_az_index[az]
+                for k, cid in enumerate(model.reach_comp_ids):
+                    offset = model.comp_xyz[model.comp_index[cid]] - np.array(model.burst_loc[pid][az])
+                    angle = np.degrees(np.arccos(np.dot(offset, axes[j]) / np.linalg.norm(offset)))
+                    expected[i, j, k] = any(lower <= angle <= upper for _, lower, upper in comp_zones[cid])
+        self.assertTrue(expected.any() and not expected.all())
+        self.assertTrue((reach == expected).all())
+
+    def test_trace_shotlines(self):
+        model = self.model
+        origins = model.burst_xyz[:, 0]
+        comp_ids = [1, 2, 3, 8]
+        triangles = quads_to_triangles(model.surfaces)
+
+        def crosses(start, end, tri):
+            # segment/triangle test, one shotline and one triangle at a time.
+            edge1, edge2 = tri[1] - tri[0], tri[2] - tri[0]
+            direction = end - start
+            p = np.cross(direction, edge2)
+            det = np.dot(edge1, p)
+            if abs(det) < 1e-12:
+                return False
+            s = start - tri[0]
+            u = np.dot(s, p) / det
+            q = np.cross(s, edge1)
+            v = np.dot(direction, q) / det
+            t = np.dot(edge2, q) / det
+            return u >= 0.0 and v >= 0.0 and u + v <= 1.0 and 1e-6 < t < 1.0 - 1e-6
+
+        expected_hits = set()
+        for p, origin in enumerate(origins):
+            for c, cid in enumerate(comp_ids):
+                target = model.comp_xyz[model.comp_index[cid]]
+                for t, tri in enumerate(triangles):
+                    if crosses(origin, target, tri):
+                        expected_hits.add((p * len(comp_ids) + c, t // 2))
+        expected = np.zeros((len(origins), len(comp_ids)), dtype=bool)
+        for ray, _ in expected_hits:
+            expected.ravel()[ray] = True
+        self.assertTrue(expected.any() and not expected.all())
+        global SHOTLINE_BATCH
+        batch, SHOTLINE_BATCH = SHOTLINE_BATCH, 6  # a few origins per batch
+        try:
+            blocked, hits = model.trace_shotlines(origins, comp_ids, list_hits=True)
+        finally:
+            SHOTLINE_BATCH = batch
+        self.assertTrue((blocked == expected).all())
+        self.assertEqual(hits, sorted(expected_hits))
+        ends = model.shotline_ends(origins, comp_ids)
+        self.assertTrue(np.array_equal(ends[5], [origins[1], model.comp_xyz[model.comp_index[2]]]))
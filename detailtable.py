@@ -0,0 +1,111 @@
+import numpy as np
+from PyQt4.QtCore import Qt, QAbstractTableModel
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Table model for the component details of a selected burstpoint. The view asks only for the rows it shows, so
+    a point's details are just a PK array and a row order until they scroll into view.
+'''
+
+COLUMNS = ('Component', 'Mechanism', 'PK', 'Surface hit', 'Frag zones')
+COMPONENT, MECHANISM, PK, SURFACE, ZONES = range(len(COLUMNS))
+
+
+class DetailTableModel(QAbstractTableModel):
+    """ One row per direct hit, blast or frag component of the selected point, sortable by any column and filterable
+    by kill mechanism. """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = None
+        self.pid = None
+        self.az = None
+        self.pks = np.zeros(0)
+        self.rows = np.zeros(0, dtype=int)
+        self.mechanism = None
+        self.sort_column, self.sort_order = PK, Qt.DescendingOrder
+
+    def set_point(self, model, pid, az):
+        """ Show the components of another point, keeping the sort order and mechanism filter.
+        :param model: DataModel with the .dtl file read in
+        :param pid: point ID
+        :param az: azimuth
+        """
+        self.beginResetModel()
+        self.model, self.pid, self.az = model, pid, az
+        self.pks = model.get_comp_pks(pid, az)
+        self._update_rows()
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.model = self.pid = self.az = None
+        self.pks = np.zeros(0)
+        self.rows = np.zeros(0, dtype=int)
+        self.endResetModel()
+
+    def set_mechanism(self, mechanism):
+        """ :param mechanism: 'DH', 'Blast' or 'Frag' to show only those components, or None for all of them. """
+        self.beginResetModel()
+        self.mechanism = mechanism
+        self._update_rows()
+        self.endResetModel()
+
+    def _update_rows(self):
+        """ Sort and filter the component indices with array operations; no rows are formatted here. """
+        if self.model is None:
+            return
+        mechanisms = self.model.detail_mechanisms
+        if self.sort_column == PK:
+            keys = self.pks
+        elif self.sort_column == MECHANISM:
+            keys = mechanisms
+        else:
+            keys = self.model.detail_comp_names
+        rows = np.argsort(keys, kind='mergesort')  # stable, so ties keep the component order
+        if self.sort_order == Qt.DescendingOrder:
+            rows = rows[::-1]
+        if self.mechanism is not None:
+            rows = rows[mechanisms[rows] == self.mechanism]
+        self.rows = rows
+
+    def rowCount(self, parent=None):
+        return len(self.rows)
+
+    def columnCount(self, parent=None):
+        return len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        model = self.model
+        i = self.rows[index.row()]
+        cid = int(model.detail_comp_ids[i])
+        mechanism = model.detail_mechanisms[i]
+        column = index.column()
+        if column == COMPONENT:
+            return model.comps[cid].name
+        elif column == MECHANISM:
+            return mechanism
+        elif column == PK:
+            return '{0:.2f}'.format(self.pks[i])
+        elif column == SURFACE:
+            if mechanism == 'DH' and self.pks[i] > 0.0:
+                # surf_names is 0 indexed, but JMAE surface IDs start at 1.
+                return model.surf_names[model.surface_hit[self.pid][self.az] - 1]
+        elif column == ZONES and mechanism == 'Frag':
+            zones = model.frag_zones[self.pid][self.az].get(cid)
+            if not zones:
+                return 'None'
+            return '; '.join('Zone {0}, {1}-{2} degrees'.format(*zone) for zone in zones)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column, self.sort_order = column, order
+        self._update_rows()
+        self.layoutChanged.emit()
@@ -0,0 +1,221 @@
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pyface.api import GUI
+from tvtk.api import tvtk
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Image export of the 3D scene at a higher resolution than the window. Rendering has to happen on the GUI thread,
+    but writing the image files is handed to worker threads, and queued exports are rendered one per idle callback so
+    the window keeps responding between them.
+'''
+
+
+def write_image(filename, pixels, size):
+    """ Write rendered pixels to a PNG or JPEG file (chosen by the file extension). Safe to call from a worker thread,
+    since it only touches VTK objects it creates itself.
+
+    :param filename: image file path
+    :param pixels: (width * height, components) uint8 array, bottom row first as VTK renders it
+    :param size: (width, height) of the image
+    """
+    image = tvtk.ImageData(dimensions=(size[0], size[1], 1))
+    image.point_data.scalars = pixels
+    if os.path.splitext(filename)[1].lower() in ('.jpg', '.jpeg'):
+        writer = tvtk.JPEGWriter(quality=95)
+    else:
+        writer = tvtk.PNGWriter()
+    writer.file_name = filename
+    writer.set_input_data(image)
+    writer.write()
+
+
+def find_ffmpeg():
+    """ :return: path of the ffmpeg executable, or None if it isn't installed. Videos need it; frames don't. """
+    return shutil.which('ffmpeg')
+
+
+def encode_movie(frame_pattern, filename, fps):
+    """ Encode numbered PNG frames into a video with ffmpeg. Meant to run on a worker thread.
+
+    :param frame_pattern: printf-style path of the frames, e.g. /dir/frame_%04d.png
+    :param filename: video file path (the container is picked by ffmpeg from the extension)
+    :param fps: frames per second
+    """
+    # H.264 needs even frame sizes, so pad by a pixel where needed.
+    subprocess.run([find_ffmpeg(), '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', frame_pattern,
+                    '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', filename],
+                   check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class ExportJob(object):
+    """ One queued image export. """
+    def __init__(self, filename, magnification=1, setup=None, done=None):
+        """
+        :param filename: image file path
+        :param magnification: image size as a multiple of the window size
+        :param setup: optional callable that puts the scene into the state to export (a camera preset, an azimuth)
+        :param done: optional callable, called on the GUI thread with True/False once the file is written or failed
+        """
+        self.filename = filename
+        self.magnification = magnification
+        self.setup = setup
+        self.done = done
+
+
+class ImageExporter(object):
+    """ Runs a queue of image exports for a Plotter. Each job is rendered from the current camera in the plotter's
+    offscreen window (see Plotter.render_image), tiled when the image is too large for one pass, and the camera is put
+    back afterwards; the encoding and writing of the file overlaps with rendering the next job. """
+    def __init__(self, plotter, progress_callback=None, error_callback=None, finished_callback=None, workers=2):
+        """
+        :param plotter: Plotter whose scene is exported
+        :param progress_callback: called on the GUI thread with (files written, files queued)
+        :param error_callback: called on the GUI thread with (filename, error message)
+        :param finished_callback: called on the GUI thread once the queue is empty and every file is written
+        :param workers: number of encoding threads
+        """
+        self.plotter = plotter
+        self.progress_callback = progress_callback
+        self.error_callback = error_callback
+        self.finished_callback = finished_callback
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = []
+        self.written = 0
+        self.total = 0
+
+    def add(self, filename, magnification=1, setup=None, done=None):
+        """ Queue an export (see ExportJob for the arguments). Rendering starts on the next idle callback if the
+        queue was empty. """
+        self.jobs.append(ExportJob(filename, magnification, setup, done))
+        self.total += 1
+        if len(self.jobs) == 1:
+            GUI.invoke_later(self.render_next)
+        self.report()
+
+    def is_busy(self):
+        return self.written < self.total
+
+    def cancel(self):
+        """ Drop the jobs that haven't been rendered yet. Files already being written are finished. """
+        jobs, self.jobs = self.jobs, []
+        self.total -= len(jobs)
+        for job in jobs:
+            if job.done is not None:
+                job.done(False)
+        self.report()
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=False)
+
+    def render_next(self):
+        if not self.jobs:
+            return
+        job = self.jobs[0]
+        result = {}
+
+        def render():
+            if job.setup is not None:
+                job.setup()
+            result['image'] = self.plotter.render_image(job.magnification)
+
+        try:
+            self.plotter.keep_camera(render)
+        except Exception as e:
+            self.jobs.pop(0)
+            self.total -= 1
+            self.report_error(job.filename, str(e))
+            if job.done is not None:
+                job.done(False)
+        else:
+            self.jobs.pop(0)
+            pixels, size = result['image']
+            future = self.pool.submit(write_image, job.filename, pixels, size)
+            # done callbacks run on the worker thread, so hop back to the GUI thread before touching anything.
+            future.add_done_callback(lambda f, written_job=job: GUI.invoke_later(self.on_written, written_job, f))
+        if self.jobs:
+            GUI.invoke_later(self.render_next)
+
+    def on_written(self, job, future):
+        if future.exception() is not None:
+            self.total -= 1
+            self.report_error(job.filename, str(future.exception()))
+        else:
+            self.written += 1
+        if job.done is not None:
+            job.done(future.exception() is None)
+        self.report()
+
+    def report_error(self, filename, message):
+        if self.error_callback is not None:
+            self.error_callback(filename, message)
+
+    def report(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.written, self.total)
+        if not self.is_busy():
+            self.written = self.total = 0
+            self.plotter.release_export_window()
+            if self.finished_callback is not None:
+                self.finished_callback()
+
+
+class MovieExport(object):
+    """ Renders a sequence of frames through an ImageExporter, then encodes them into a video on one of its worker
+    threads. The frames are written as they're rendered, so encoding PNGs overlaps with rendering and only the final
+    video encode happens after the last frame. """
+    def __init__(self, exporter, filename, setups, fps, magnification=1, finished_callback=None):
+        """
+        :param exporter: ImageExporter doing the rendering and writing
+        :param filename: video file path, or a .png path to keep just the numbered frames
+        :param setups: one callable per frame that puts the scene into that frame's state
+        :param fps: frames per second of the video
+        :param magnification: frame size as a multiple of the window size
+        :param finished_callback: called on the GUI thread with a message once the movie is done or has failed
+        """
+        self.exporter = exporter
+        self.filename = filename
+        self.fps = fps
+        self.finished_callback = finished_callback
+        root, ext = os.path.splitext(filename)
+        self.make_video = ext.lower() != '.png'
+        if self.make_video:
+            # frames go in a folder next to the video.
+            frame_dir = root + '_frames'
+            os.makedirs(frame_dir, exist_ok=True)
+            self.frame_pattern = os.path.join(frame_dir, 'frame_%04d.png')
+        else:
+            self.frame_pattern = root + '_%04d.png'
+        self.remaining = len(setups)
+        self.failed = 0
+        for i, setup in enumerate(setups):
+            exporter.add(self.frame_pattern % i, magnification, setup, self.on_frame_written)
+
+    def on_frame_written(self, ok):
+        self.remaining -= 1
+        self.failed += 0 if ok else 1
+        if self.remaining:
+            return
+        if self.failed:
+            self.finish('{0} movie frames failed; no video was made.'.format(self.failed))
+        elif not self.make_video:
+            self.finish('Movie frames written to {0}'.format(self.frame_pattern))
+        elif find_ffmpeg() is None:
+            self.finish('ffmpeg was not found; movie frames were left in {0}'.format(
+                os.path.dirname(self.frame_pattern)))
+        else:
+            future = self.exporter.pool.submit(encode_movie, self.frame_pattern, self.filename, self.fps)
+            future.add_done_callback(lambda f: GUI.invoke_later(self.on_encoded, f))
+
+    def on_encoded(self, future):
+        if future.exception() is not None:
+            self.finish('Movie encoding failed: {0}'.format(future.exception()))
+        else:
+            self.finish('Movie written to {0}'.format(self.filename))
+
+    def finish(self, message):
+        if self.finished_callback is not None:
+            self.finished_callback(message)
@@ -0,0 +1,349 @@
+import unittest
+import numpy as np
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Spatial indexes and geometry queries over the target scene (burstpoints, sample points and components).
+'''
+
+
+class KDTree(object):
+    """ Static k-d tree over a set of 3D points, stored as flat node arrays. Each node covers a contiguous run of the
+    permuted point index array and keeps its own bounding box, so queries can skip whole subtrees. """
+    def __init__(self, points, leaf_size=32):
+        """
+        :param points: (N, 3) array of point coordinates. Rows with NaN coordinates are left out of the tree.
+        :param leaf_size: largest number of points held by a leaf node
+        """
+        self.points = np.asarray(points, dtype=float)
+        self.index = np.nonzero(np.all(np.isfinite(self.points), axis=1))[0]
+        starts, ends, lows, highs, lefts, rights = [], [], [], [], [], []
+
+        def add_node(start, end):
+            pts = self.points[self.index[start:end]]
+            starts.append(start)
+            ends.append(end)
+            lows.append(pts.min(axis=0) if end > start else np.full(3, np.inf))
+            highs.append(pts.max(axis=0) if end > start else np.full(3, -np.inf))
+            lefts.append(-1)
+            rights.append(-1)
+            return len(starts) - 1
+
+        stack = [add_node(0, len(self.index))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= leaf_size:
+                continue
+            # split on the widest axis at the median point.
+            axis = int(np.argmax(highs[node] - lows[node]))
+            mid = (start + end) // 2
+            run = self.index[start:end]
+            order = np.argpartition(self.points[run, axis], mid - start)
+            self.index[start:end] = run[order]
+            lefts[node] = add_node(start, mid)
+            rights[node] = add_node(mid, end)
+            stack.extend([lefts[node], rights[node]])
+        self.start, self.end = np.array(starts), np.array(ends)
+        self.low, self.high = np.array(lows), np.array(highs)
+        self.left, self.right = np.array(lefts), np.array(rights)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _leaves(self, visit):
+        """ Yields the point indices of every leaf whose node passes the visit(node) test. """
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not visit(node):
+                continue
+            if self.left[node] < 0:
+                yield self.index[self.start[node]:self.end[node]]
+            else:
+                stack.extend([self.left[node], self.right[node]])
+
+    def query_radius(self, center, radius):
+        """
+        :param center: (x, y, z) of the query point
+        :param radius: search radius
+        :return: sorted array of indices (into the original points) within radius of the center.
+        """
+        center = np.asarray(center, dtype=float)
+
+        def visit(node):
+            gap = np.maximum(0.0, np.maximum(self.low[node] - center, center - self.high[node]))
+            return gap.dot(gap) <= radius * radius
+
+        found = [idx[np.sum((self.points[idx] - center) ** 2, axis=1) <= radius * radius]
+                 for idx in self._leaves(visit)]
+        return np.sort(np.concatenate(found)) if found else np.zeros(0, dtype=int)
+
+    def query_ray(self, origin, direction, radius, mask=None):
+        """ Finds the point closest to the viewer among the points within radius of a ray, which is how a click on
+        a point in the 3D scene is resolved.
+
+        :param origin: (x, y, z) start of the ray (e.g. the camera position)
+        :param direction: (x, y, z) direction of the ray; doesn't need to be normalized
+        :param radius: largest allowed distance between a point and the ray
+        :param mask: optional boolean array over the original points; only points where it's True can be picked
+        :return: index (into the original points) of the picked point, or -1 if no point is close enough.
+        """
+        origin = np.asarray(origin, dtype=float)
+        direction = np.asarray(direction, dtype=float)
+        direction = direction / np.linalg.norm(direction)
+        with np.errstate(divide='ignore'):
+            inv = 1.0 / direction
+
+        def visit(node):
+            # slab test against the node's bounding box grown by the pick radius.
+            with np.errstate(invalid='ignore'):
+                t0 = (self.low[node] - radius - origin) * inv
+                t1 = (self.high[node] + radius - origin) * inv
+            t0, t1 = np.minimum(t0, t1), np.maximum(t0, t1)
+            t0, t1 = np.where(np.isnan(t0), -np.inf, t0), np.where(np.isnan(t1), np.inf, t1)
+            return max(t0.max(), 0.0) <= t1.min()
+
+        best, best_t = -1, np.inf
+        for idx in self._leaves(visit):
+            offset = self.points[idx] - origin
+            t = offset.dot(direction)
+            dist2 = np.sum((offset - t[:, None] * direction) ** 2, axis=1)
+            hit = (t >= 0.0) & (dist2 <= radius * radius) & (t < best_t)
+            if mask is not None:
+                hit &= mask[idx]
+            if np.any(hit):
+                i = np.argmin(np.where(hit, t, np.inf))
+                best, best_t = idx[i], t[i]
+        return int(best)
+
+
+class BVH(object):
+    """ Bounding volume hierarchy over triangles, stored as flat node arrays like KDTree. Line segments are traced
+    through it in batches: each node tests all the segments that reached it at once, and passes the ones that hit its
+    box down to its children. """
+    def __init__(self, triangles, leaf_size=8):
+        """
+        :param triangles: (N, 3, 3) array of triangle vertices
+        :param leaf_size: largest number of triangles held by a leaf node
+        """
+        self.triangles = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+        self.index = np.arange(len(self.triangles))
+        tri_low, tri_high = self.triangles.min(axis=1), self.triangles.max(axis=1)
+        centroids = self.triangles.mean(axis=1)
+        starts, ends, lows, highs, lefts, rights = [], [], [], [], [], []
+
+        def add_node(start, end):
+            run = self.index[start:end]
+            starts.append(start)
+            ends.append(end)
+            lows.append(tri_low[run].min(axis=0) if end > start else np.full(3, np.inf))
+            highs.append(tri_high[run].max(axis=0) if end > start else np.full(3, -np.inf))
+            lefts.append(-1)
+            rights.append(-1)
+            return len(starts) - 1
+
+        stack = [add_node(0, len(self.index))]
+        while stack:
+            node = stack.pop()
+            start, end = starts[node], ends[node]
+            if end - start <= leaf_size:
+                continue
+            # split at the median centroid along the axis where the centroids are most spread out.
+            run = self.index[start:end]
+            axis = int(np.argmax(np.ptp(centroids[run], axis=0)))
+            mid = (start + end) // 2
+            self.index[start:end] = run[np.argpartition(centroids[run, axis], mid - start)]
+            lefts[node] = add_node(start, mid)
+            rights[node] = add_node(mid, end)
+            stack.extend([lefts[node], rights[node]])
+        self.start, self.end = np.array(starts), np.array(ends)
+        self.low, self.high = np.array(lows), np.array(highs)
+        self.left, self.right = np.array(lefts), np.array(rights)
+
+    def intersect_segments(self, origins, ends, tolerance=1e-6):
+        """ Finds every triangle crossed by each line segment. Hits within tolerance (as a fraction of the segment
+        length) of either end are ignored, so a segment starting or ending on a surface doesn't count it.
+
+        :param origins: (R, 3) array of segment start points
+        :param ends: (R, 3) array of segment end points
+        :param tolerance: fraction of the segment length ignored at each end
+        :return: (segment indices, triangle indices, hit fractions along the segment) of all the hits.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        direction = np.asarray(ends, dtype=float).reshape(-1, 3) - origins
+        with np.errstate(divide='ignore'):
+            inv = 1.0 / direction
+        found = []
+        stack = [(0, np.arange(len(origins)))]
+        while stack:
+            node, rays = stack.pop()
+            # slab test of the segments against the node box, clipped to the length of the segments.
+            with np.errstate(invalid='ignore'):
+                t0 = (self.low[node] - origins[rays]) * inv[rays]
+                t1 = (self.high[node] - origins[rays]) * inv[rays]
+            t_near, t_far = np.minimum(t0, t1), np.maximum(t0, t1)
+            t_near = np.where(np.isnan(t_near), -np.inf, t_near).max(axis=1)
+            t_far = np.where(np.isnan(t_far), np.inf, t_far).min(axis=1)
+            rays = rays[(t_near <= t_far) & (t_far >= 0.0) & (t_near <= 1.0)]
+            if len(rays) == 0:
+                continue
+            if self.left[node] >= 0:
+                stack.extend([(self.left[node], rays), (self.right[node], rays)])
+                continue
+            # Moller-Trumbore test of every remaining segment against every triangle of the leaf.
+            tris = self.index[self.start[node]:self.end[node]]
+            v0, v1, v2 = (self.triangles[tris, i][np.newaxis] for i in range(3))
+            o, d = origins[rays][:, np.newaxis], direction[rays][:, np.newaxis]
+            e1, e2 = v1 - v0, v2 - v0
+            p = np.cross(d, e2)
+            det = np.sum(e1 * p, axis=2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv_det = 1.0 / det
+                s = o - v0
+                u = np.sum(s * p, axis=2) * inv_det
+                q = np.cross(s, e1)
+                v = np.sum(d * q, axis=2) * inv_det
+                t = np.sum(e2 * q, axis=2) * inv_det
+                hit = ((np.abs(det) > 1e-12) & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) &
+                       (t > tolerance) & (t < 1.0 - tolerance))
+            ray_idx, tri_idx = np.nonzero(hit)
+            found.append((rays[ray_idx], tris[tri_idx], t[ray_idx, tri_idx]))
+        if not found:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+def quads_to_triangles(quad_points):
+    """
+    :param quad_points: (4 * N, 3) array of quad corner points, four in a row per quad
+    :return: (2 * N, 3, 3) array of triangles; triangles 2i and 2i+1 make up quad i.
+    """
+    quads = np.asarray(quad_points, dtype=float).reshape(-1, 4, 3)
+    return np.stack([quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]], axis=1).reshape(-1, 3, 3)
+
+
+def distances(points, center):
+    """
+    :param points: (N, 3) array of coordinates
+    :param center: (x, y, z) point
+    :return: (N,) array of distances from each point to the center.
+    """
+    return np.sqrt(np.sum((np.asarray(points, dtype=float) - np.asarray(center, dtype=float)) ** 2, axis=1))
+
+
+def inside_blast_volumes(points, centers, volumes):
+    """ Classifies points against blast volumes. A volume with r1, r2 and z1 all 0 is a sphere of radius r3 around
+    (x, y, z2). Any other volume is a lower cylinder of radius r1 from the ground up to z1, an upper cylinder of radius
+    r2 from z1 up to z2, and a spherical cap of radius r3 around (x, y, z2) above that.
+
+    :param points: (N, 3) array of coordinates. Rows with NaN coordinates are outside every volume.
+    :param centers: (V, 2) array of the (x, y) location of each blast component
+    :param volumes: (V, 5) array of the (r1, r2, r3, z1, z2) blast volume parameters
+    :return: (N, V) boolean array, True where a point is inside a volume.
+    """
+    points = np.asarray(points, dtype=float)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    r1, r2, r3, z1, z2 = np.asarray(volumes, dtype=float).reshape(-1, 5).T
+    # points down the rows, volumes across the columns.
+    rho2 = (points[:, 0:1] - centers[:, 0]) ** 2 + (points[:, 1:2] - centers[:, 1]) ** 2
+    z = points[:, 2:3]
+    with np.errstate(invalid='ignore'):
+        in_sphere = rho2 + (z - z2) ** 2 <= r3 * r3
+        lower = (z >= 0.0) & (z <= z1) & (rho2 <= r1 * r1)
+        upper = (z > z1) & (z <= z2) & (rho2 <= r2 * r2)
+        cap = (z > z2) & in_sphere
+    is_sphere = (r1 == 0.0) & (r2 == 0.0) & (z1 == 0.0)
+    return np.where(is_sphere, in_sphere, lower | upper | cap)
+
+
+def munition_axes(azs, aof):
+    """ Direction of flight of the munition, which is the polar axis of its frag zones (the same orientation
+    PointBounds.display gives the zone meshes).
+
+    :param azs: attack azimuths in degrees
+    :param aof: angle of fall in degrees
+    :return: (len(azs), 3) array of unit vectors.
+    """
+    azs, aof = np.radians(np.asarray(azs, dtype=float)), np.radians(aof)
+    return np.column_stack([np.cos(aof) * np.cos(azs), np.cos(aof) * np.sin(azs), np.full(len(azs), -np.sin(aof))])
+
+
+def inside_frag_zones(origins, targets, axes, lower, upper):
+    """ Tests whether targets lie in the angular band of a frag zone, for any number of (burstpoint, target, zone)
+    records at once.
+
+    :param origins: (R, 3) array of burstpoint locations
+    :param targets: (R, 3) array of target (component) locations
+    :param axes: (R, 3) array of unit zone polar axes (see munition_axes)
+    :param lower: (R,) array of lower zone angles in degrees from the axis
+    :param upper: (R,) array of upper zone angles in degrees from the axis
+    :return: (R,) boolean array, True where the target is inside the zone.
+    """
+    offset = np.asarray(targets, dtype=float) - np.asarray(origins, dtype=float)
+    length = np.sqrt(np.sum(offset * offset, axis=1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos_angle = np.sum(offset * axes, axis=1) / length
+        angle = np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+        return (angle >= lower) & (angle <= upper)
+
+
+class TestGeomLib(unittest.TestCase):
+    def setUp(self):
+        self.points = np.random.RandomState(1).uniform(-50.0, 50.0, (2000, 3))
+        self.points[7] = np.nan
+        self.tree = KDTree(self.points, leaf_size=8)
+
+    def test_query_radius(self):
+        center = (5.0, -3.0, 10.0)
+        dist = distances(self.points, center)
+        expected = np.nonzero(dist <= 15.0)[0]
+        self.assertEqual(list(self.tree.query_radius(center, 15.0)), list(expected))
+        self.assertEqual(len(self.tree), 1999)
+
+    def test_query_ray(self):
+        target = self.points[42]
+        origin = np.array([200.0, 200.0, 200.0])
+        idx = self.tree.query_ray(origin, target - origin, 1e-3)
+        self.assertEqual(idx, 42)
+        self.assertEqual(self.tree.query_ray(origin, origin, 1.0), -1)
+
+    def test_query_ray_axis_aligned(self):
+        tree = KDTree([[0.0, 0.0, 0.0], [0.0, 0.0, 5.0], [3.0, 0.0, 0.0]], leaf_size=1)
+        self.assertEqual(tree.query_ray((0.0, 0.0, 10.0), (0.0, 0.0, -1.0), 0.5), 1)
+
+    def test_query_ray_mask(self):
+        tree = KDTree([[0.0, 0.0, 0.0], [0.0, 0.0, 5.0]], leaf_size=1)
+        self.assertEqual(tree.query_ray((0.0, 0.0, 10.0), (0.0, 0.0, -1.0), 0.5, mask=np.array([True, False])), 0)
+
+    def test_inside_blast_volumes(self):
+        centers = [(0.0, 0.0), (10.0, 0.0)]
+        # a sphere of radius 2 at z=1, and a volume with r1=3 up to z=1, r2=2 up to z=4 and a cap of radius 1.
+        volumes = [(0.0, 0.0, 2.0, 0.0, 1.0), (3.0, 2.0, 1.0, 1.0, 4.0)]
+        points = [(0.0, 0.0, 2.5), (0.0, 0.0, 3.5), (12.5, 0.0, 0.5), (12.5, 0.0, 2.0), (11.5, 0.0, 2.0),
+                  (10.0, 0.0, 4.9), (10.0, 0.0, 5.1), (np.nan, np.nan, np.nan)]
+        inside = inside_blast_volumes(points, centers, volumes)
+        self.assertEqual(inside.shape, (8, 2))
+        self.assertEqual(list(inside[:, 0]), [True, False, False, False, False, False, False, False])
+        self.assertEqual(list(inside[:, 1]), [False, False, True, False, True, True, False, False])
+
+    def test_inside_frag_zones(self):
+        axes = munition_axes([0.0, 90.0], 90.0)
+        self.assertTrue(np.allclose(axes, [(0.0, 0.0, -1.0), (0.0, 0.0, -1.0)]))
+        axes = munition_axes([0.0, 90.0, 90.0], 0.0)
+        self.assertTrue(np.allclose(axes, [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 1.0, 0.0)]))
+        origins = np.zeros((3, 3))
+        targets = [(5.0, 0.0, 0.0), (5.0, 5.0, 0.0), (0.0, -5.0, 0.0)]
+        inside = inside_frag_zones(origins, targets, axes, np.array([0.0, 40.0, 0.0]), np.array([10.0, 50.0, 90.0]))
+        self.assertEqual(list(inside), [True, True, False])
+
+    def test_bvh(self):
+        # a row of 50 unit squares in the z=0 plane, from x=0 to x=50.
+        quads = [[(x, 0.0, 0.0), (x + 1.0, 0.0, 0.0), (x + 1.0, 1.0, 0.0), (x, 1.0, 0.0)] for x in range(50)]
+        bvh = BVH(quads_to_triangles(np.array(quads).reshape(-1, 3)), leaf_size=4)
+        origins = [(10.5, 0.25, 1.0), (10.5, 0.5, 1.0), (60.0, 0.5, 1.0), (20.25, 0.25, 0.0)]
+        ends = [(30.5, 0.25, -1.0), (10.5, 0.5, 0.5), (60.0, 0.5, -1.0), (20.25, 0.25, -1.0)]
+        rays, tris, t = bvh.intersect_segments(origins, ends)
+        self.assertEqual(list(rays), [0])
+        self.assertEqual(tris[0] // 2, 20)
+        self.assertAlmostEqual(t[0], 0.5)
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Kill-level PK from component PKs. A kill in the kill definition file is a tree of AND/OR nodes over components
+    and other nodes; KillTree compiles one into a list of array operations so it can be evaluated for every
+    burstpoint and azimuth at once.
+'''
+
+
+def or_pk(pks, axis=-1):
+    """ PK of killing at least one of several independent components. """
+    return 1.0 - np.prod(1.0 - pks, axis=axis)
+
+
+def and_pk(pks, axis=-1):
+    """ PK of killing all of several independent components. """
+    return np.prod(pks, axis=axis)
+
+
+class KillTree(object):
+    """ One kill from the kill definition file, compiled into a list of nodes in evaluation order. Each step holds the
+    node's operation, the columns of its components in the component PK array, and the steps of its child nodes. """
+    def __init__(self, kill_lines, last_node, kill_type):
+        """
+        :param kill_lines: dict of KillNode objects keyed by 'kill,node' (DataModel.kill_lines)
+        :param last_node: dict of the top node of each kill (DataModel.last_node)
+        :param kill_type: string with the k number of the kill (e.g., 'k1')
+        """
+        self.comp_ids = []
+        self.steps = []
+        comp_column = {}
+        step_index = {}
+
+        def compile_node(kill, node):
+            key = kill + ',' + node
+            if key in step_index:
+                return step_index[key]
+            if key not in kill_lines:
+                raise ValueError("Kill node %s is not in the kill file" % key)
+            item = kill_lines[key]
+            op = item.op.upper()
+            if op not in ('AND', 'OR'):
+                raise ValueError("Unrecognized operation %s in kill file for %s" % (item.op, key))
+            columns, children = [], []
+            for ref in item.items:
+                if ref.startswith('c'):
+                    cid = int(ref[1:])
+                    if cid not in comp_column:
+                        comp_column[cid] = len(self.comp_ids)
+                        self.comp_ids.append(cid)
+                    columns.append(comp_column[cid])
+                elif ref.startswith('n'):
+                    children.append(compile_node(kill, ref[1:]))
+                elif ref.startswith('k'):
+                    children.append(compile_node(*ref.split(',')))
+                else:
+                    raise ValueError("Unrecognized item %s in kill file for %s" % (ref, kill))
+            # children are compiled first, so every step only refers to steps before it.
+            step_index[key] = len(self.steps)
+            self.steps.append((op, np.array(columns, dtype=int), children))
+            return step_index[key]
+
+        self.root = compile_node(kill_type, last_node[kill_type]) if kill_type in last_node else None
+
+    def evaluate(self, comp_pks):
+        """
+        :param comp_pks: array of component PKs whose last axis follows self.comp_ids, e.g. indexed as
+                         [burstpoint, azimuth, component]
+        :return: array of kill PKs, with the shape of comp_pks minus its last axis.
+        """
+        if self.root is None:
+            return np.zeros(comp_pks.shape[:-1])
+        results = []
+        for op, columns, children in self.steps:
+            combine = and_pk if op == 'AND' else or_pk
+            parts = [comp_pks[..., columns]] if len(columns) else []
+            parts.extend(results[i][..., np.newaxis] for i in children)
+            results.append(combine(np.concatenate(parts, axis=-1)))
+        return results[self.root]
+
+
+class TestKillLib(unittest.TestCase):
+    def setUp(self):
+        class KillNode(object):
+            def __init__(self, op, items):
+                self.op, self.items = op, items
+        # k1: (c1 OR c2) AND c3, with node 2 pulling in k2 (c4 alone).
+        self.kill_lines = {'k1,1': KillNode('OR', ['c1', 'c2']), 'k1,2': KillNode('and', ['n1', 'c3', 'k2,1']),
+                           'k2,1': KillNode('OR', ['c4'])}
+        self.last_node = {'k1': '2', 'k2': '1'}
+
+    def test_evaluate(self):
+        tree = KillTree(self.kill_lines, self.last_node, 'k1')
+        self.assertEqual(tree.comp_ids, [1, 2, 3, 4])
+        pks = np.random.RandomState(3).uniform(0.0, 1.0, (50, 4, 4))
+        expected = (1.0 - (1.0 - pks[..., 0]) * (1.0 - pks[..., 1])) * pks[..., 2] * pks[..., 3]
+        self.assertTrue(np.allclose(tree.evaluate(pks), expected))
+
+    def test_bad_operation(self):
+        self.kill_lines['k2,1'].op = 'XOR'
+        self.assertRaises(ValueError, KillTree, self.kill_lines, self.last_node, 'k1')
@@ -0,0 +1,448 @@
+import unittest
+import numpy as np
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Array routines that operate on the whole cell PK matrix at once.
+
+    The matrix gridlines are stored in descending order after DataModel.transform_matrix flips them to target-centered
+    coordinates, and PKs are indexed as pks[range_index, defl_index]. Everything here follows those conventions.
+'''
+
+
+def uniform_spacing(gridlines, rel_tol=1e-6):
+    """
+    :param gridlines: sequence of N gridline coordinates
+    :param rel_tol: relative tolerance allowed between the cell sizes
+    :return: the signed distance between gridlines if they are evenly spaced, otherwise None.
+    """
+    lines = np.asarray(gridlines, dtype=float)
+    if len(lines) < 2:
+        return None
+    diffs = np.diff(lines)
+    if np.allclose(diffs, diffs[0], rtol=rel_tol, atol=0.0):
+        return float(diffs[0])
+    return None
+
+
+def tile_bounds(num_range, num_defl, tile_size):
+    """
+    :param num_range: number of matrix cells in range
+    :param num_defl: number of matrix cells in deflection
+    :param tile_size: maximum number of cells along each side of a tile
+    :return: list of (r0, r1, d0, d1) cell index slices that cover the whole matrix.
+    """
+    return [(r0, min(r0 + tile_size, num_range), d0, min(d0 + tile_size, num_defl))
+            for r0 in range(0, num_range, tile_size)
+            for d0 in range(0, num_defl, tile_size)]
+
+
+def coarsen(pks, gridlines_range, gridlines_defl, factor):
+    """ Merges factor x factor blocks of cells into a single cell whose PK is the area-weighted mean of the block.
+    The last block along each axis is allowed to be smaller than the others.
+
+    :param pks: 2D PK array indexed as [range, defl]
+    :param gridlines_range: range gridlines (len = pks.shape[0] + 1)
+    :param gridlines_defl: deflection gridlines (len = pks.shape[1] + 1)
+    :param factor: number of cells merged along each side of a block
+    :return: coarse_pks, coarse_gridlines_range, coarse_gridlines_defl
+    """
+    pks = np.asarray(pks, dtype=float)
+    gr = np.asarray(gridlines_range, dtype=float)
+    gd = np.asarray(gridlines_defl, dtype=float)
+    r_idx = np.arange(0, pks.shape[0], factor)
+    d_idx = np.arange(0, pks.shape[1], factor)
+    area = np.outer(np.abs(np.diff(gr)), np.abs(np.diff(gd)))
+    weighted = np.add.reduceat(np.add.reduceat(pks * area, r_idx, axis=0), d_idx, axis=1)
+    total = np.add.reduceat(np.add.reduceat(area, r_idx, axis=0), d_idx, axis=1)
+    coarse = weighted / np.where(total > 0.0, total, 1.0)
+    return coarse, np.append(gr[r_idx], gr[-1]), np.append(gd[d_idx], gd[-1])
+
+
+def project_tiles(corners, matrix):
+    """
+    :param corners: (num_tiles, 4, 3) array of tile corner coordinates in world space
+    :param matrix: 4x4 composite projection matrix of the camera (world to normalized device coordinates)
+    :return: in_view, size -- in_view is True for every tile whose screen bounding box overlaps the viewport, and
+             size is the (num_tiles, 2) width and height of each bounding box in normalized device coordinates.
+    """
+    n = corners.shape[0]
+    pts = np.concatenate([corners.reshape(-1, 3), np.ones((n * 4, 1))], axis=1).dot(np.asarray(matrix).T)
+    w = pts[:, 3]
+    # corners behind the camera are pushed to infinity so they don't clip the tile out of view.
+    w = np.where(w > 1e-9, w, 1e-9)
+    ndc = (pts[:, :2] / w[:, None]).reshape(n, 4, 2)
+    lo, hi = ndc.min(axis=1), ndc.max(axis=1)
+    return np.all((hi >= -1.0) & (lo <= 1.0), axis=1), hi - lo
+
+
+def find_cells(gridlines, values):
+    """ Binary search for the cells containing each value. Works on ascending or descending gridlines, and a value
+    sitting exactly on an interior gridline belongs to the cell before it, matching a linear scan of
+    gridlines[i] >= value >= gridlines[i+1].
+
+    :param gridlines: N gridline coordinates (a numpy array, so no conversion cost is paid per lookup)
+    :param values: scalar or array of coordinates
+    :return: cell index (0 to N-2) for each value, or -1 if the value lies outside the gridlines.
+    """
+    lines = gridlines if gridlines[0] <= gridlines[-1] else -gridlines
+    v = np.asarray(values, dtype=float) if gridlines[0] <= gridlines[-1] else -np.asarray(values, dtype=float)
+    idx = np.clip(np.searchsorted(lines, v, side='left') - 1, 0, len(lines) - 2)
+    return np.where((v >= lines[0]) & (v <= lines[-1]), idx, -1)
+
+
+class PKQuadtree(object):
+    """ Adaptive representation of the PK matrix. Square blocks of cells whose PKs all fall within a tolerance of each
+    other are merged into a single leaf, so the mostly uniform areas of a large matrix (zero PK far from the target,
+    saturated PK near it) collapse into a handful of large cells. Leaves are stored as parallel arrays:
+    r0, r1, d0, d1 are the cell index bounds of each leaf and pk is its value. """
+    def __init__(self, pks, tolerance=0.0):
+        """
+        :param pks: 2D PK array indexed as [range, defl]
+        :param tolerance: largest PK spread allowed inside a merged leaf. Each leaf stores the midpoint of its spread,
+                          so every cell is within tolerance/2 of the PK it had in the dense array.
+        """
+        pks = np.asarray(pks, dtype=float)
+        self.shape = pks.shape
+        self.tolerance = tolerance
+        self.depth = int(np.ceil(np.log2(max(max(self.shape), 1))))
+        size = 2 ** self.depth
+        # pad to a power of two with NaN. fmin/fmax ignore the NaNs, so padding never blocks a merge, and the
+        # leaves are clipped back to the matrix bounds at the end.
+        lo = np.full((size, size), np.nan)
+        lo[:self.shape[0], :self.shape[1]] = pks
+        hi = lo.copy()
+        uniform = np.ones((size, size), dtype=bool)
+        levels = [(lo, hi, uniform)]
+        for _ in range(self.depth):
+            n = lo.shape[0] // 2
+            lo = np.fmin.reduce(np.fmin.reduce(lo.reshape(n, 2, n, 2), axis=3), axis=1)
+            hi = np.fmax.reduce(np.fmax.reduce(hi.reshape(n, 2, n, 2), axis=3), axis=1)
+            children = uniform.reshape(n, 2, n, 2).all(axis=(1, 3))
+            with np.errstate(invalid='ignore'):
+                uniform = children & ~(hi - lo > tolerance)
+            levels.append((lo, hi, uniform))
+
+        r0, d0, sizes, values = [], [], [], []
+        parent_uniform = np.zeros((1, 1), dtype=bool)
+        for level in range(self.depth, -1, -1):
+            lo, hi, uniform = levels[level]
+            # a block becomes a leaf when it is uniform, isn't entirely padding, and wasn't swallowed by its parent.
+            covered = np.repeat(np.repeat(parent_uniform, 2, axis=0), 2, axis=1)[:lo.shape[0], :lo.shape[1]]
+            leaf = uniform & ~covered & ~np.isnan(lo)
+            rows, cols = np.nonzero(leaf)
+            r0.append(rows << level)
+            d0.append(cols << level)
+            sizes.append(np.full(len(rows), 1 << level))
+            values.append((lo[leaf] + hi[leaf]) / 2.0)
+            parent_uniform = uniform | covered
+        self.r0 = np.concatenate(r0)
+        self.d0 = np.concatenate(d0)
+        self.r1 = np.minimum(self.r0 + np.concatenate(sizes), self.shape[0])
+        self.d1 = np.minimum(self.d0 + np.concatenate(sizes), self.shape[1])
+        self.pk = np.concatenate(values)
+        self.level = np.concatenate([np.full(len(r), lvl) for r, lvl in zip(r0, range(self.depth, -1, -1))])
+        # (level, block row, block column) -> leaf index, for O(depth) cell lookups.
+        self._lookup = dict(zip(zip(self.level.tolist(), (self.r0 >> self.level).tolist(),
+                                    (self.d0 >> self.level).tolist()), range(len(self.pk))))
+
+    def __len__(self):
+        return len(self.pk)
+
+    def leaf_at(self, rng_index, defl_index):
+        """
+        :return: index of the leaf containing matrix cell [rng_index, defl_index], or None if it's out of bounds.
+        """
+        if not (0 <= rng_index < self.shape[0] and 0 <= defl_index < self.shape[1]):
+            return None
+        for level in range(self.depth, -1, -1):
+            leaf = self._lookup.get((level, rng_index >> level, defl_index >> level))
+            if leaf is not None:
+                return leaf
+        return None
+
+    def pk_at(self, rng_index, defl_index):
+        """ Same lookup as pks[rng_index, defl_index] on the dense array. """
+        leaf = self.leaf_at(rng_index, defl_index)
+        return None if leaf is None else self.pk[leaf]
+
+    def to_dense(self):
+        """ Expands the leaves back into a full 2D PK array. """
+        pks = np.empty(self.shape)
+        for r0, r1, d0, d1, pk in zip(self.r0, self.r1, self.d0, self.d1, self.pk):
+            pks[r0:r1, d0:d1] = pk
+        return pks
+
+    def quads(self, gridlines_range, gridlines_defl, z):
+        """
+        :return: (4 * num_leaves, 3) array of leaf corner points at height z, ordered so that every group of four
+                 consecutive points is one quad polygon.
+        """
+        gr = np.asarray(gridlines_range, dtype=float)
+        gd = np.asarray(gridlines_defl, dtype=float)
+        x0, x1, y0, y1 = gr[self.r0], gr[self.r1], gd[self.d0], gd[self.d1]
+        zs = np.full(len(self.pk), z)
+        return np.stack([np.column_stack([x0, y0, zs]), np.column_stack([x1, y0, zs]),
+                         np.column_stack([x1, y1, zs]), np.column_stack([x0, y1, zs])], axis=1).reshape(-1, 3)
+
+
+# Marching squares segment table. Corners are numbered a=(i, j), b=(i+1, j), c=(i+1, j+1), d=(i, j+1) and the case
+# index has bit 0 set for a, bit 1 for b, bit 2 for c and bit 3 for d when that corner is at or above the level.
+# Edges are 0=a-b, 1=b-c, 2=c-d, 3=d-a. Each case has up to two segments given as (edge, edge); -1 means no segment.
+# The saddle cases 5 and 10 list the pairing used when the cell center is below the level; SADDLE_SEGMENTS holds the
+# pairing used when the center is at or above it.
+_SEGMENTS = np.array([[[-1, -1], [-1, -1]], [[3, 0], [-1, -1]], [[0, 1], [-1, -1]], [[3, 1], [-1, -1]],
+                      [[1, 2], [-1, -1]], [[3, 0], [1, 2]], [[0, 2], [-1, -1]], [[3, 2], [-1, -1]],
+                      [[2, 3], [-1, -1]], [[0, 2], [-1, -1]], [[0, 1], [2, 3]], [[1, 2], [-1, -1]],
+                      [[1, 3], [-1, -1]], [[0, 1], [-1, -1]], [[0, 3], [-1, -1]], [[-1, -1], [-1, -1]]])
+_SADDLE_SEGMENTS = {5: [[3, 2], [1, 0]], 10: [[0, 3], [2, 1]]}
+
+
+def cell_centers(gridlines):
+    """
+    :param gridlines: N gridline coordinates in either ascending or descending order
+    :return: N-1 cell center coordinates
+    """
+    lines = np.asarray(gridlines, dtype=float)
+    return (lines[:-1] + lines[1:]) / 2.0
+
+
+def contour_segments(pks, x, y, level):
+    """ Extracts the iso-PK line for a single level with marching squares, treating each PK as a sample at its cell
+    center. Every cell of the dual grid is processed at once.
+
+    :param pks: 2D PK array indexed as [range, defl]
+    :param x: range coordinates of the cell centers (len = pks.shape[0])
+    :param y: deflection coordinates of the cell centers (len = pks.shape[1])
+    :param level: PK value of the iso-line
+    :return: (num_segments, 2, 2) array of line segment end points in (range, defl) coordinates.
+    """
+    pks = np.asarray(pks, dtype=float)
+    if pks.shape[0] < 2 or pks.shape[1] < 2:
+        return np.zeros((0, 2, 2))
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    a, b, c, d = pks[:-1, :-1], pks[1:, :-1], pks[1:, 1:], pks[:-1, 1:]
+    case = ((a >= level) * 1 + (b >= level) * 2 + (c >= level) * 4 + (d >= level) * 8).ravel()
+    active = np.nonzero((case != 0) & (case != 15))[0]
+    if len(active) == 0:
+        return np.zeros((0, 2, 2))
+    case = case[active]
+    i, j = np.unravel_index(active, a.shape)
+    va, vb, vc, vd = a.ravel()[active], b.ravel()[active], c.ravel()[active], d.ravel()[active]
+    x0, x1, y0, y1 = x[i], x[i + 1], y[j], y[j + 1]
+
+    def crossing(v0, v1):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(v1 != v0, (level - v0) / (v1 - v0), 0.5)
+        return np.clip(t, 0.0, 1.0)
+
+    # (num_active, 4 edges, xy) crossing points
+    t0, t1, t2, t3 = crossing(va, vb), crossing(vb, vc), crossing(vc, vd), crossing(vd, va)
+    edges = np.stack([np.column_stack([x0 + t0 * (x1 - x0), y0]),
+                      np.column_stack([x1, y0 + t1 * (y1 - y0)]),
+                      np.column_stack([x1 + t2 * (x0 - x1), y1]),
+                      np.column_stack([x0, y1 + t3 * (y0 - y1)])], axis=1)
+    table = _SEGMENTS[case].copy()
+    center_high = (va + vb + vc + vd) / 4.0 >= level
+    for saddle, segments in _SADDLE_SEGMENTS.items():
+        table[(case == saddle) & center_high] = segments
+    rows = np.arange(len(case))
+    result = []
+    for slot in range(2):
+        present = table[:, slot, 0] >= 0
+        e0, e1 = table[present, slot, 0], table[present, slot, 1]
+        result.append(np.stack([edges[rows[present], e0], edges[rows[present], e1]], axis=1))
+    return np.concatenate(result)
+
+
+def _resample_axis(values, src, dst):
+    """ Area-weighted average of values along axis 0 from the cells between the ascending edges src onto the cells
+    between the ascending edges dst. The PK density is constant inside a source cell, so its running integral is
+    piecewise linear and can be read off exactly at the destination edges by linear interpolation.
+    Parts of a destination cell that fall outside src contribute 0.
+    """
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    widths = np.diff(src)
+    running = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values * widths.reshape(shape), axis=0)])
+    x = np.clip(dst, src[0], src[-1])
+    idx = np.clip(np.searchsorted(src, x, side='right') - 1, 0, len(src) - 2)
+    frac = np.where(widths[idx] > 0.0, (x - src[idx]) / np.where(widths[idx] > 0.0, widths[idx], 1.0), 0.0)
+    at = running[idx] + frac.reshape(shape) * (running[idx + 1] - running[idx])
+    dst_widths = np.diff(dst)
+    return np.diff(at, axis=0) / np.where(dst_widths > 0.0, dst_widths, 1.0).reshape(shape)
+
+
+def regrid(pks, gridlines_range, gridlines_defl, new_range, new_defl, fill=0.0):
+    """ Resamples a PK matrix onto other gridlines. Each new cell gets the area-weighted mean PK of the old cells it
+    overlaps, and any part of a new cell outside the old matrix counts as fill. Gridlines can be ascending or
+    descending, independently for the old and new grids.
+
+    :param pks: 2D PK array indexed as [range, defl]
+    :param gridlines_range: range gridlines of pks
+    :param gridlines_defl: deflection gridlines of pks
+    :param new_range: range gridlines to resample onto
+    :param new_defl: deflection gridlines to resample onto
+    :param fill: PK assumed outside the old matrix
+    :return: 2D PK array of shape (len(new_range) - 1, len(new_defl) - 1)
+    """
+    pks = np.asarray(pks, dtype=float)
+    gr, gd = np.asarray(gridlines_range, dtype=float), np.asarray(gridlines_defl, dtype=float)
+    nr, nd = np.asarray(new_range, dtype=float), np.asarray(new_defl, dtype=float)
+    if np.array_equal(gr, nr) and np.array_equal(gd, nd):
+        return pks.copy()
+    # the running integrals need ascending edges, so flip descending axes on the way in and out.
+    if gr[0] > gr[-1]:
+        gr, pks = gr[::-1], pks[::-1, :]
+    if gd[0] > gd[-1]:
+        gd, pks = gd[::-1], pks[:, ::-1]
+    flip_r, flip_d = nr[0] > nr[-1], nd[0] > nd[-1]
+    if flip_r:
+        nr = nr[::-1]
+    if flip_d:
+        nd = nd[::-1]
+    result = _resample_axis(_resample_axis(pks, gr, nr).T, gd, nd).T
+    if fill:
+        cover_r = _resample_axis(np.ones(len(gr) - 1), gr, nr)
+        cover_d = _resample_axis(np.ones(len(gd) - 1), gd, nd)
+        result += fill * (1.0 - np.outer(cover_r, cover_d))
+    if flip_r:
+        result = result[::-1, :]
+    if flip_d:
+        result = result[:, ::-1]
+    return result
+
+
+def common_gridlines(gridline_sets, max_lines=2049):
+    """ Gridlines along one axis that cover a whole set of matrices. This is the union of all their gridlines when it
+    fits in max_lines, so that every old cell is an exact block of new cells and regridding loses nothing; otherwise
+    the combined extent is split evenly into max_lines - 1 cells.
+
+    :param gridline_sets: list of gridline arrays (ascending or descending)
+    :param max_lines: largest number of gridlines to return
+    :return: descending gridlines
+    """
+    lines = np.unique(np.round(np.concatenate([np.asarray(g, dtype=float) for g in gridline_sets]), 6))
+    if len(lines) > max_lines:
+        lines = np.linspace(lines[0], lines[-1], max_lines)
+    return lines[::-1]
+
+
+def regrid_all(matrices, max_lines=2049, fill=0.0):
+    """ Resamples any number of matrices onto one common grid, so they can be compared or combined cell for cell.
+
+    :param matrices: list of (pks, gridlines_range, gridlines_defl)
+    :param max_lines: largest number of common gridlines along each axis
+    :param fill: PK assumed outside each matrix
+    :return: (stack, gridlines_range, gridlines_defl), where stack is indexed as [matrix, range, defl]
+    """
+    gr = common_gridlines([m[1] for m in matrices], max_lines)
+    gd = common_gridlines([m[2] for m in matrices], max_lines)
+    stack = np.empty((len(matrices), len(gr) - 1, len(gd) - 1))
+    for i, (pks, gridlines_range, gridlines_defl) in enumerate(matrices):
+        stack[i] = regrid(pks, gridlines_range, gridlines_defl, gr, gd, fill)
+    return stack, gr, gd
+
+
+class TestMatrixLib(unittest.TestCase):
+    def test_uniform_spacing(self):
+        self.assertAlmostEqual(uniform_spacing([10.0, 8.0, 6.0, 4.0]), -2.0)
+        self.assertIsNone(uniform_spacing([10.0, 8.0, 5.0, 4.0]))
+        self.assertIsNone(uniform_spacing([10.0]))
+
+    def test_tile_bounds(self):
+        tiles = tile_bounds(5, 3, 2)
+        self.assertEqual(len(tiles), 6)
+        self.assertEqual(tiles[-1], (4, 5, 2, 3))
+        covered = np.zeros((5, 3), dtype=int)
+        for r0, r1, d0, d1 in tiles:
+            covered[r0:r1, d0:d1] += 1
+        self.assertTrue(np.all(covered == 1))
+
+    def test_coarsen(self):
+        pks = np.array([[1.0, 0.0, 0.5], [1.0, 0.0, 0.5], [0.2, 0.2, 0.2]])
+        coarse, gr, gd = coarsen(pks, [3.0, 2.0, 1.0, 0.0], [0.0, 1.0, 2.0, 5.0], 2)
+        self.assertEqual(coarse.shape, (2, 2))
+        self.assertAlmostEqual(coarse[0, 0], 0.5)
+        self.assertAlmostEqual(coarse[0, 1], 0.5)
+        self.assertAlmostEqual(coarse[1, 0], 0.2)
+        self.assertEqual(list(gr), [3.0, 1.0, 0.0])
+        self.assertEqual(list(gd), [0.0, 2.0, 5.0])
+
+    def test_project_tiles(self):
+        corners = np.array([[[-0.5, -0.5, 0], [0.5, -0.5, 0], [0.5, 0.5, 0], [-0.5, 0.5, 0]],
+                            [[2.0, 2.0, 0], [3.0, 2.0, 0], [3.0, 3.0, 0], [2.0, 3.0, 0]]])
+        in_view, size = project_tiles(corners, np.identity(4))
+        self.assertEqual(list(in_view), [True, False])
+        self.assertTrue(np.allclose(size, 1.0))
+
+    def test_quadtree_matches_dense(self):
+        rng = np.random.RandomState(0)
+        pks = np.zeros((37, 21))
+        pks[10:20, 5:12] = 1.0
+        pks[30:, :] = rng.rand(7, 21)
+        tree = PKQuadtree(pks)
+        self.assertLess(len(tree), pks.size // 2)
+        self.assertTrue(np.array_equal(tree.to_dense(), pks))
+        for r in range(pks.shape[0]):
+            for d in range(pks.shape[1]):
+                self.assertEqual(tree.pk_at(r, d), pks[r, d])
+        self.assertIsNone(tree.pk_at(37, 0))
+
+    def test_quadtree_tolerance(self):
+        pks = np.linspace(0.0, 0.004, 64).reshape(8, 8)
+        tree = PKQuadtree(pks, tolerance=0.01)
+        self.assertEqual(len(tree), 1)
+        self.assertTrue(np.all(np.abs(tree.to_dense() - pks) <= 0.005))
+        self.assertEqual(tree.quads([8, 7, 6, 5, 4, 3, 2, 1, 0], range(9), 2.0).shape, (4, 3))
+
+    def test_contour_segments(self):
+        # a single high cell in the middle of a 3x3 block is surrounded by a closed diamond of four segments.
+        pks = np.zeros((3, 3))
+        pks[1, 1] = 1.0
+        segments = contour_segments(pks, [0.0, 1.0, 2.0], [0.0, 1.0, 2.0], 0.5)
+        self.assertEqual(segments.shape, (4, 2, 2))
+        dist = np.abs(segments - 1.0).sum(axis=2)
+        self.assertTrue(np.allclose(dist, 0.5))
+        self.assertEqual(contour_segments(np.ones((3, 3)), [0, 1, 2], [0, 1, 2], 0.5).shape, (0, 2, 2))
+        self.assertEqual(list(cell_centers([4.0, 2.0, 0.0])), [3.0, 1.0])
+
+    def test_find_cells(self):
+        descending = np.array([10.0, 8.0, 5.0, 4.0])
+        values = [10.0, 9.0, 8.0, 6.0, 4.0, 3.9, 10.1]
+
+        def linear(v):
+            for i in range(len(descending) - 1):
+                if descending[i] >= v >= descending[i + 1]:
+                    return i
+            return -1
+        self.assertEqual(list(find_cells(descending, values)), [linear(v) for v in values])
+        self.assertEqual(list(find_cells(descending[::-1].copy(), [4.0, 4.5, 10.0, 11.0])), [0, 0, 2, -1])
+        self.assertEqual(int(find_cells(descending, 7.0)), 1)
+
+    def test_regrid(self):
+        pks = np.array([[1.0, 0.0], [0.5, 0.25]])
+        gr, gd = [4.0, 2.0, 0.0], [0.0, 1.0, 3.0]
+        # same gridlines in the other order give the same matrix flipped.
+        self.assertTrue(np.allclose(regrid(pks, gr, gd, gr[::-1], gd), pks[::-1, :]))
+        # one cell covering the whole matrix gets the area-weighted mean.
+        whole = regrid(pks, gr, gd, [0.0, 4.0], [3.0, 0.0])
+        self.assertAlmostEqual(whole[0, 0], (2 * 1.0 + 4 * 0.0 + 2 * 0.5 + 4 * 0.25) / 12.0)
+        # splitting cells in half keeps their PK, and cells past the edge are partly filled.
+        fine = regrid(pks, gr, gd, [4.0, 3.0, 2.0, 1.0, 0.0], [0.0, 1.0, 2.0, 3.0, 4.0], fill=0.5)
+        self.assertTrue(np.allclose(fine[:, :3], [[1.0, 0.0, 0.0]] * 2 + [[0.5, 0.25, 0.25]] * 2))
+        self.assertTrue(np.allclose(fine[:, 3], 0.5))
+
+    def test_regrid_all(self):
+        a = (np.ones((2, 2)), [4.0, 2.0, 0.0], [0.0, 1.0, 2.0])
+        b = (np.full((1, 1), 0.5), [3.0, 1.0], [1.0, 3.0])
+        stack, gr, gd = regrid_all([a, b])
+        self.assertEqual(list(gr), [4.0, 3.0, 2.0, 1.0, 0.0])
+        self.assertEqual(list(gd), [3.0, 2.0, 1.0, 0.0])
+        self.assertEqual(stack.shape, (2, 4, 3))
+        # every old cell is a block of common cells, so the totals are kept exactly.
+        area = np.outer(np.abs(np.diff(gr)), np.abs(np.diff(gd)))
+        self.assertAlmostEqual((stack[0] * area).sum(), 8.0)
+        self.assertAlmostEqual((stack[1] * area).sum(), 2.0)
+        self.assertEqual(stack.max(axis=0)[1, 1], 1.0)
+        self.assertEqual(len(common_gridlines([[0.0, 1.0, 2.0], [0.5, 1.5]], max_lines=3)), 3)
@@ -1,38 +1,77 @@
 from PyQt4 import QtGui
-from PyQt4.QtGui import QFileDialog
+from PyQt4.QtGui import QFileDialog, QCheckBox, QProgressBar, QComboBox, QPushButton, QSlider, QLabel, QInputDialog, \
+    QLineEdit, QTableView, QHeaderView, QPlainTextEdit, QMenu, QMessageBox
+from PyQt4.QtCore import Qt, QTimer
+import os
+import math
+from functools import partial
 import vtk
+import numpy as np
+from tvtk.api import tvtk
+import matrixlib
+import memory
+import perf
 from mayavi_qt import MayaviQWidget
 from plot3d import Plotter
 from access import CellBounds, PointBounds
+from sweep import SweepLoader
+from export import ImageExporter, MovieExport
+from detailtable import DetailTableModel, PK
+from const import AZIMUTH_PLAYBACK_INTERVAL, BURSTPOINT_PICK_RADIUS, PICK_TOLERANCE_PIXELS, SWEEP_AXES, \
+    SWEEP_FRAME_INTERVAL, MATRIX_VIEWS, MATRIX_COMPARE_MAX_LINES, EXPORT_MAGNIFICATION, MOVIE_KINDS, \
+    EXPORT_MAX_MAGNIFICATION, MOVIE_ORBIT_FRAMES, MOVIE_FPS, AV_SLIDER_STEPS, POINT_COLORINGS, SHOTLINE_DRAW_LIMIT, \
+    SHOTLINE_TRACE_LIMIT, DETAIL_MECHANISMS, SCENE_LAYERS
 
 
 class CustomInteractor(vtk.vtkInteractorStyleTrackballCamera):
-    """ Right-click functionality for PK callouts on the matrix grid.
-        I use the custom interactor here because Mayavi has no built-in prop picker. """
+    """ Right-click functionality for PK callouts on the matrix grid, plus an optional hover read-out of the cell
+        under the mouse. I use the custom interactor here because Mayavi has no built-in prop picker. """
     def __init__(self, model, view, plotter):
         vtk.vtkInteractorStyleTrackballCamera.__init__(self)
         self.model = model
         self.view = view
         self.plotter = plotter
         self.right_btn_event_id = self.AddObserver('RightButtonReleaseEvent', self.on_right_button_release)
+        self.AddObserver('EndInteractionEvent', self.on_end_interaction)
+        self.AddObserver('MouseMoveEvent', self.on_mouse_move)
         self.cb = self.plotter.access_obj = CellBounds(plotter)
         self.extent = None
+        # A fast hardware property picker that returns world coordinates. One picker is reused for every click.
+        self.picker = vtk.vtkPropPicker()
+        self.gridlines_range, self.gridlines_defl = None, None
+        self.set_model(model)
+        self.hover = False
+        self.hover_cell = None
+        self.hover_actor = vtk.vtkTextActor()
+        self.hover_actor.GetTextProperty().SetFontSize(14)
+        self.hover_actor.SetDisplayPosition(10, 10)
+        self.hover_actor.SetVisibility(False)
+        self.hover_renderer = None
+
+    def set_model(self, model):
+        """ Point the interactor at another case. """
+        self.model = model
+        self.hover_cell = None
+        # gridlines are kept as numpy arrays so each lookup is a binary search with no list conversion.
+        self.gridlines_range, self.gridlines_defl = None, None
+        if model.pks is not None:
+            self.gridlines_range = np.array(model.gridlines_range)
+            self.gridlines_defl = np.array(model.gridlines_defl)
 
     # noinspection PyUnusedLocal
+    @perf.timed()
     def on_right_button_release(self, obj, event_type):
         """ Handles cell PK display. """
-        # A fast hardware property picker that returns world coordinates. This was the only way I could get
-        # cell picking to work correctly. If I used the default cell picker in Mayavi, it wouldn't get a hit
-        # as I rotated the view closer to 90 degrees around the Z axis. vtkPropPicker works fast, and I can
-        # change the world coordinates to cell coordinates fairly easily.
-        picker = vtk.vtkPropPicker()
+        # This was the only way I could get cell picking to work correctly. If I used the default cell picker in
+        # Mayavi, it wouldn't get a hit as I rotated the view closer to 90 degrees around the Z axis. vtkPropPicker
+        # works fast, and I can change the world coordinates to cell coordinates fairly easily.
         click_pos = obj.GetInteractor().GetEventPosition()
         renderer = obj.GetCurrentRenderer()
         cmd = obj.GetCommand(self.right_btn_event_id)
         # if not aborted, the mouse will continue its "pan" functionality as if middle button was held down.
         cmd.SetAbortFlag(1)
-        picker.Pick(click_pos[0], click_pos[1], 0, renderer)
-        pos = picker.GetPickPosition()
+        self.picker.Pick(click_pos[0], click_pos[1], 0, renderer)
+        pos = self.picker.GetPickPosition()
         z = pos[2]
         # Pick position for any portion of the grid has a negative Z value if viewed from the top.
         # This means we can differentiate appropriate grid clicks from inappropriate ones (viewed from the bottom)
@@ -52,35 +91,130 @@ class CustomInteractor(vtk.vtkInteractorStyleTrackballCamera):
 
         vtk.vtkInteractorStyleTrackballCamera.OnRightButtonUp(self)
 
+    # noinspection PyUnusedLocal
+    def on_end_interaction(self, obj, event_type):
+        """ Once the camera stops moving, bring any large matrix tiles now in view up to full resolution. """
+        self.plotter.refine_matrix_tiles()
+
+    # noinspection PyUnusedLocal
+    def on_mouse_move(self, obj, event_type):
+        """ Updates the hover read-out. The cursor ray is intersected with the plane of the matrix directly, rather
+        than picked, so no extra render pass is needed, and the scene is only re-rendered when the cell changes. """
+        # an observer replaces the style's own handler, so the normal camera interaction has to be passed on first.
+        vtk.vtkInteractorStyleTrackballCamera.OnMouseMove(self)
+        # leave rotation, panning and zooming alone; the read-out catches up when the button is released.
+        if not self.hover or self.GetState() != 0:
+            return
+        x, y = obj.GetInteractor().GetEventPosition()
+        self.FindPokedRenderer(x, y)
+        renderer = self.GetCurrentRenderer()
+        if renderer is None:
+            return
+        cell = None
+        pos = self.ray_to_matrix(renderer, x, y)
+        if pos is not None:
+            rng_index, defl_index = self.find_cell(pos[0], pos[1])
+            if rng_index is not None:
+                cell = (rng_index, defl_index)
+        if cell == self.hover_cell:
+            return
+        self.hover_cell = cell
+        if self.hover_renderer is not renderer:
+            renderer.AddActor2D(self.hover_actor)
+            self.hover_renderer = renderer
+        if cell is None:
+            self.hover_actor.SetVisibility(False)
+        else:
+            pk, extent = self.get_cell_info(pos)
+            self.hover_actor.SetInput('Pk {0:.3f}   cell ({1}, {2})\nrange {3:.1f} to {4:.1f}   '
+                                      'defl {5:.1f} to {6:.1f}'.format(pk, cell[0], cell[1], extent[2], extent[3],
+                                                                       extent[0], extent[1]))
+            self.hover_actor.SetVisibility(True)
+        obj.GetInteractor().Render()
+
+    def set_hover(self, state):
+        """ Turns the hover read-out on or off. """
+        self.hover = state
+        self.hover_cell = None
+        self.hover_actor.SetVisibility(False)
+        self.GetInteractor().Render()
+
+    @staticmethod
+    def view_ray(renderer, x, y):
+        """
+        :param renderer: renderer the mouse is over
+        :param x: display X coordinate
+        :param y: display Y coordinate
+        :return: (origin, direction) of the view ray through (x, y) in world coordinates, or None.
+        """
+        ends = []
+        for depth in (0.0, 1.0):
+            renderer.SetDisplayPoint(x, y, depth)
+            renderer.DisplayToWorld()
+            wx, wy, wz, w = renderer.GetWorldPoint()
+            if w == 0.0:
+                return None
+            ends.append(np.array((wx / w, wy / w, wz / w)))
+        return ends[0], ends[1] - ends[0]
+
+    def ray_to_matrix(self, renderer, x, y):
+        """
+        :return: world coordinates where the view ray through display point (x, y) crosses the burst height plane,
+                 or None.
+        """
+        ray = self.view_ray(renderer, x, y)
+        if ray is None or ray[1][2] == 0.0:
+            return None
+        origin, direction = ray
+        t = (self.model.burst_height - origin[2]) / direction[2]
+        if t < 0.0:
+            return None
+        return origin[0] + t * direction[0], origin[1] + t * direction[1], self.model.burst_height
+
+    def get_matrix(self):
+        """ :return: (pks, pk_tree, gridlines_range, gridlines_defl) of the matrix on display, which is the mean, max
+                 or difference view or a sweep frame while one is shown, or None without a matrix. """
+        shown = self.plotter.get_shown_matrix()
+        if shown is not None:
+            pks, gridlines_range, gridlines_defl = shown
+            return pks, None, gridlines_range, gridlines_defl
+        if self.gridlines_range is None:
+            return None
+        return self.model.pks, self.plotter.pk_tree, self.gridlines_range, self.gridlines_defl
+
+    def find_cell(self, rng, defl):
+        """
+        :return: (range index, deflection index) of the matrix cell containing the point, or (None, None) if the point
+                 is outside the matrix.
+        """
+        matrix = self.get_matrix()
+        if matrix is None:
+            return None, None
+        _, _, gridlines_range, gridlines_defl = matrix
+        rng_index = int(matrixlib.find_cells(gridlines_range, rng))
+        defl_index = int(matrixlib.find_cells(gridlines_defl, defl))
+        if rng_index < 0 or defl_index < 0:
+            return None, None
+        return rng_index, defl_index
+
     def get_cell_info(self, selection_point):
         """
         :param selection_point: (rng, defl) tuple indicating selected point on matrix
         :return: None
         If the picked point falls inside matrix gridlines, this function will return the corresponding
            (PK, extent coordinates) of the grid cell. Outside of the grid cell, it will return (None, None). """
-        defl = selection_point[1]
-        rng = selection_point[0]
-        gridlines_defl = self.model.gridlines_defl
-        gridlines_range = self.model.gridlines_range
-        # find deflection index
-        defl_index = None
-        for i in range(len(gridlines_defl) - 1):
-            if gridlines_defl[i] >= defl >= gridlines_defl[i+1]:
-                defl_index = i
-                break
-        # find range index
-        rng_index = None
-        for i in range(len(gridlines_range) - 1):
-            if gridlines_range[i] >= rng >= gridlines_range[i+1]:
-                rng_index = i
-                break
-        if defl_index is None or rng_index is None:
+        rng_index, defl_index = self.find_cell(selection_point[0], selection_point[1])
+        if rng_index is None:
             return None, None  # out of bounds
         else:
-            # return PK and cell bounding box
-            pk = self.model.pks[rng_index, defl_index]
-            extent = (self.model.gridlines_defl[defl_index+1], self.model.gridlines_defl[defl_index],
-                      self.model.gridlines_range[rng_index+1], self.model.gridlines_range[rng_index],
+            # return PK and cell bounding box. The merged-cell matrix answers with the same PK as the dense array.
+            pks, pk_tree, gridlines_range, gridlines_defl = self.get_matrix()
+            if pk_tree is not None:
+                pk = pk_tree.pk_at(rng_index, defl_index)
+            else:
+                pk = pks[rng_index, defl_index]
+            extent = (gridlines_defl[defl_index+1], gridlines_defl[defl_index],
+                      gridlines_range[rng_index+1], gridlines_range[rng_index],
                       0.1, 0.1)
             return pk, extent
 
@@ -88,17 +222,28 @@ class CustomInteractor(vtk.vtkInteractorStyleTrackballCamera):
 # noinspection PyProtectedMember
 class MayaviController:
     # noinspection PyArgumentList
-    def __init__(self, model, view, working_dir):
+    def __init__(self, model, view, working_dir, matrix_tolerance=None):
         """
         :param model: Instance of DataModel class
         :param view: Instance of QDialog class
         :param working_dir: directory path string where JMAE output files are located
+        :param matrix_tolerance: PK tolerance for merging matrix cells, or None to draw every cell
         """
         self.model = model
         self.view = view
         self.working_dir = working_dir
-        self.plotter = plotter = Plotter(model)
+        self.plotter = plotter = Plotter(model, matrix_tolerance)
         self.dispatcher = None
+        self.azimuths = []
+        self.play_timer = None
+        self.sweep_cases = {}
+        self.current_file = None
+        self.sweep_loader = None
+        self.sweep_frame_shown = False
+        self.exporter = ImageExporter(plotter, self.on_export_progress, self.on_export_error, self.on_export_finished)
+        self.export_az = None
+        self.sweep_timer = None
+        self.detail_table = None
         vtk.vtkObject.GlobalWarningDisplayOff()
 
         # set up window controls and events
@@ -116,9 +261,11 @@ class MayaviController:
         # They cannot be drawn until the Mayavi widget is created, and the scene is activated (which fires
         # plotter.update_plot).
         if model.dtl_file is not None:
-            points = model.get_sample_points() if view.rdoSample.isChecked() else model.get_burst_points()
+            points = model.get_sample_array() if view.rdoSample.isChecked() else model.get_burst_array()
             az = view.buttonGroup.checkedId() if model.az_averaging else int(model.attack_az)
-            self.plotter.update_point_detail(az, points)
+            self.plotter.update_point_detail(az, points, self.get_point_mask(az))
+        # the scene is built progressively once the widget is up; the progress bar goes away when it's done.
+        plotter.progress_callback = self.on_build_progress
         # create the Mayavi widget and attach to the Qt grid layout at runtime, since the
         # widget isn't part of Qt Designer.
         self.mayavi_widget = MayaviQWidget(plotter, view.frmMayavi)
@@ -131,20 +278,19 @@ class MayaviController:
         fig = self.plotter.scene.mayavi_scene
         fig.scene.interactor.interactor_style = self.interactor
 
+        @perf.timed('MayaviController.picker_callback')
         def picker_callback(pick):
             """ This gets called when left button is clicked. """
-            # only allow a pick if the chosen actor is in the list of burstpoint (not sample point) objects.
-            if pick.actor in self.plotter.burstpoint_glyphs.actor.actors and view.rdoBurst.isChecked():
-                # Find which data point corresponds to the point picked:
-                # we have to account for the fact that each data point is
-                # represented by a glyph with several points.
-                point_id = pick.point_id // plotter.burstpoint_array.shape[0]
-
-                # If the no points have been selected, we have '-1'
+            # only allow a pick on burstpoints (not sample points).
+            if view.rdoBurst.isChecked() and model.burst_xyz is not None:
+                # The click is resolved against the k-d tree of burstpoints for the azimuth on display, so it
+                # doesn't depend on how the points are drawn.
+                point_id = self.pick_point(pick.selection_point[0], pick.selection_point[1])
+
+                # If no point is close enough to the click, we have '-1'
                 if point_id != -1:
-                    # Retrieve the coordinates corresponding to that data
-                    # point -- point ids start at 1, so add 1 to 0-based indexing.
-                    pid = plotter.pid = point_id + 1
+                    # Retrieve the .dtl point ID corresponding to that data point.
+                    pid = plotter.pid = model.point_ids[point_id]
 
                     # hide existing selection
                     self.plotter.access_obj.hide()
@@ -153,16 +299,76 @@ class MayaviController:
                     # Add an outline and center it on the data point.
                     self.update_point_details(pid)
 
-        picker = fig.on_mouse_pick(picker_callback)
-        picker.tolerance = 0.005  # Decrease tolerance, so that we can more easily select a precise point
+        # the world point picker only reads the depth buffer; the actual point lookup is done in pick_point.
+        fig.on_mouse_pick(picker_callback, type='world')
 
+    @perf.timed()
+    def pick_point(self, x, y):
+        """
+        :param x: display X coordinate of the click
+        :param y: display Y coordinate of the click
+        :return: index of the burstpoint closest to the viewer along the click ray, or -1 if none is close enough.
+        """
+        renderer = tvtk.to_vtk(self.plotter.scene.renderer)
+        ray = CustomInteractor.view_ray(renderer, x, y)
+        if ray is None:
+            return -1
+        # allow a few pixels of slop around the glyph, measured at the distance of the focal point.
+        camera = renderer.GetActiveCamera()
+        world_per_pixel = (2.0 * camera.GetDistance() * math.tan(math.radians(camera.GetViewAngle() / 2.0)) /
+                           max(renderer.GetSize()[1], 1))
+        radius = max(BURSTPOINT_PICK_RADIUS, PICK_TOLERANCE_PIXELS * world_per_pixel)
+        # points hidden by the blast volume filter can't be picked.
+        return self.model.get_burst_tree(self.plotter.selected_az).query_ray(ray[0], ray[1], radius,
+                                                                              self.plotter.point_mask)
+
+    def can_show(self, model):
+        """ :return: True if this window's controls also fit another case, so it can be switched over to it. """
+        old = self.model
+        return (model.az_averaging == old.az_averaging and model.attack_az == old.attack_az and
+                (model.dtl_file is None) == (old.dtl_file is None) and (model.pks is None) == (old.pks is None) and
+                bool(model.frag_ids) == bool(old.frag_ids) and
+                model.has_blast_detail() == old.has_blast_detail())
+
+    def update_model(self, model, title, matrix_tolerance=None):
+        """ Switch this window to another case, e.g. a different burst height, keeping the camera and display
+        settings. Only the parts of the scene that differ are rebuilt.
+        :param model: DataModel of the new case
+        :param title: window title
+        :param matrix_tolerance: PK tolerance for merging matrix cells, or None to draw every cell
+        """
+        # the loaded sweep frames were regridded for the old matrix, so they are thrown away.
+        self.stop_sweep()
+        if self.sweep_loader is not None:
+            self.sweep_loader.stop()
+            self.sweep_loader = None
+        if model.pks is not None:
+            self.view.cboMatrixView.blockSignals(True)
+            self.view.cboMatrixView.setCurrentIndex(0)
+            self.view.cboMatrixView.blockSignals(False)
+        self.model = model
+        self.interactor.set_model(model)
+        self.view.setWindowTitle(title)
+        self.clear_info()
+        if model.dtl_file is not None:
+            points = model.get_sample_array() if self.view.rdoSample.isChecked() else model.get_burst_array()
+            az = self.view.buttonGroup.checkedId() if model.az_averaging else int(model.attack_az)
+            self.plotter.update_point_detail(az, points, self.get_point_mask(az))
+            self.set_point_coloring()
+        self.plotter.update_model(model, matrix_tolerance)
+        if model.frag_ids:
+            self.set_av_slider_ranges()
+            self.update_av_colors()
+            self.on_txt_find_changed(self.view.txtFind.text())
+
+    @perf.timed()
     def update_point_details(self, pid):
         """ Highlight the burstpoint associated with the pid (point id). """
         model = self.model
         view = self.view
-        pts = model.get_sample_points() if view.rdoSample.isChecked() else model.get_burst_points()
+        pts = model.get_sample_array() if view.rdoSample.isChecked() else model.get_burst_array()
         azim = view.buttonGroup.checkedId() if model.az_averaging else int(model.attack_az)
-        x, y, z = pts[pid][azim][0], pts[pid][azim][1], pts[pid][azim][2]
+        x, y, z = pts[model.point_index[pid], model.detail_az_index[azim]]
         # the point is highlighted on-screen with a bounding box
         extent = x - 0.5, x + 0.5, y - 0.5, y + 0.5, z - 0.5, z + 0.5
         pb = self.plotter.access_obj = PointBounds(self.plotter)
@@ -178,30 +384,17 @@ class MayaviController:
             output = 'Burst point {0} ({1:.2f}, {2:.2f}, {3:.2f})\n'.format(pid, x, y, z)
 
         az = self.plotter.selected_az
-        # put all the different IDs (direct hit, blast and frag) into a single, sorted component ID list
-        # to iterate over them.
-        comp_ids = sorted(model.dh_ids.union(model.blast_ids).union(model.frag_ids))
-        for cid in comp_ids:
-            if cid in model.dh_ids:
-                output += '   DH PK for {0}: {1:.2f}\n'.format(model.comps[cid].name, model.comp_pk[pid][az][cid])
-                if model.comp_pk[pid][az][cid] > 0.0:
-                    # surf_names is 0 indexed, but JMAE surface IDs start at 1.
-                    surf_name = model.surf_names[model.surface_hit[pid][az] - 1]
-                    output += '      Surf hit: {0}\n'.format(surf_name)
-            elif cid in model.blast_ids:
-                output += '   Blast PK for {0}: {1:.2f}\n'.format(model.comps[cid].name,
-                                                                  model.comp_pk[pid][az][cid])
-            elif cid in model.frag_ids:
-                output += '   Frag PK for {0}: {1:.2f}\n'.format(model.comps[cid].name,
-                                                                 model.comp_pk[pid][az][cid])
-                zones = model.frag_zones[pid][az][cid]
-                if zones:
-                    for z in range(len(zones)):
-                        output += '      Zone {0}, {1}-{2} degrees\n'.format(zones[z][0], zones[z][1], zones[z][2])
-                else:
-                    output += 'None\n'
-
+        kill_pks = model.get_kill_pks()
+        if kill_pks is not None:
+            output += '   Kill PK: {0:.2f}\n'.format(kill_pks[model.point_index[pid], model.detail_az_index[az]])
+        if model.has_blast_detail():
+            inside = model.get_blast_inside()[model.point_index[pid], model.detail_az_index[az]]
+            names = [model.comps[cid].name for cid, hit in zip(model.blast_comp_ids, inside) if hit]
+            output += '   Inside blast volume of: {0}\n'.format(', '.join(names) if names else 'None')
         self.view.txtInfo.setPlainText(output)
+        # the per-component PKs, surface hits and frag zones go in the detail table, which only formats the rows
+        # it shows.
+        self.detail_table.set_point(model, pid, az)
 
     def set_window_events(self, view):
         """ Set up GUI window to handle relevant events. """
@@ -214,6 +407,136 @@ class MayaviController:
         view.btnAxes.clicked.connect(self.on_btn_axes_clicked)
         view.btnClearSel.clicked.connect(self.on_btn_clear_clicked)
         view.chkCompNames.clicked.connect(self.on_chk_compnames_clicked)
+        if self.model.has_blast_detail():
+            view.chkBlastOnly = QCheckBox('Only points inside blast volumes', view.frmDetail)
+            view.chkBlastOnly.clicked.connect(self.on_chk_blast_only_clicked)
+            view.gridLayout_2.addWidget(view.chkBlastOnly, 7, 0, 1, 2)
+        if self.model.dtl_file is not None:
+            view.btnShotlines = QPushButton('Trace Shotlines', view.frmDetail)
+            view.btnShotlines.clicked.connect(self.on_btn_shotlines_clicked)
+            view.gridLayout_2.addWidget(view.btnShotlines, 3, 1)
+            self.detail_table = DetailTableModel(view)
+            view.tblDetail = QTableView(view.frmDetail)
+            view.tblDetail.setModel(self.detail_table)
+            view.tblDetail.setSortingEnabled(True)
+            view.tblDetail.sortByColumn(PK, Qt.DescendingOrder)
+            view.tblDetail.verticalHeader().setVisible(False)
+            # fixed row heights keep the view from measuring rows it doesn't show.
+            view.tblDetail.verticalHeader().setResizeMode(QHeaderView.Fixed)
+            view.tblDetail.horizontalHeader().setStretchLastSection(True)
+            view.gridLayout_2.addWidget(view.tblDetail, 10, 0, 1, 2)
+            view.cboMechanism = QComboBox(view.frmDetail)
+            view.cboMechanism.addItems(DETAIL_MECHANISMS)
+            view.cboMechanism.currentIndexChanged.connect(self.on_cbo_mechanism_changed)
+            view.gridLayout_2.addWidget(view.cboMechanism, 8, 1)
+        if self.model.dtl_file is not None and self.model.frag_ids:
+            view.cboPointColor = QComboBox(view.frmDetail)
+            view.cboPointColor.addItems(POINT_COLORINGS)
+            view.cboPointColor.currentIndexChanged.connect(self.on_cbo_point_color_changed)
+            view.gridLayout_2.addWidget(view.cboPointColor, 6, 0)
+        view.btnExport = QPushButton('Export...', view.widget)
+        view.btnExport.clicked.connect(self.on_btn_export_clicked)
+        view.horizontalLayout.addWidget(view.btnExport)
+        view.btnMovie = QPushButton('Movie...', view.widget)
+        view.btnMovie.clicked.connect(self.on_btn_movie_clicked)
+        view.horizontalLayout.addWidget(view.btnMovie)
+        view.prgExport = QProgressBar(view.widget)
+        view.prgExport.setMaximumWidth(120)
+        view.prgExport.setFormat('Export %v/%m')
+        view.prgExport.setVisible(False)
+        view.horizontalLayout.addWidget(view.prgExport)
+        view.prgBuild = QProgressBar(view.widget)
+        view.prgBuild.setMaximumWidth(120)
+        view.prgBuild.setFormat('Loading %p%')
+        view.horizontalLayout.addWidget(view.prgBuild)
+        # timings panel under the scene, listing where the time of the last load went.
+        view.btnTimings = QPushButton('Timings', view.widget)
+        view.btnTimings.setCheckable(True)
+        view.btnTimings.clicked.connect(self.on_btn_timings_clicked)
+        view.horizontalLayout.addWidget(view.btnTimings)
+        view.txtPerf = QPlainTextEdit(view)
+        view.txtPerf.setReadOnly(True)
+        view.txtPerf.setFont(QtGui.QFont('Courier New'))
+        view.txtPerf.setMaximumHeight(160)
+        view.txtPerf.setVisible(False)
+        view.gridLayout.addWidget(view.txtPerf, 3, 0, 1, 3)
+        # frame time HUD, and a menu to hide whole layers of the scene to see what each one costs.
+        view.chkHud = QCheckBox('Frame HUD', view.widget)
+        view.chkHud.clicked.connect(self.on_chk_hud_clicked)
+        view.horizontalLayout.addWidget(view.chkHud)
+        view.btnLayers = QPushButton('Layers', view.widget)
+        view.mnuLayers = QMenu(view.btnLayers)
+        for layer in SCENE_LAYERS:
+            action = view.mnuLayers.addAction(layer)
+            action.setCheckable(True)
+            action.setChecked(True)
+            action.toggled.connect(partial(self.on_layer_toggled, layer))
+        view.btnLayers.setMenu(view.mnuLayers)
+        view.horizontalLayout.addWidget(view.btnLayers)
+        # AV coloring: pick a fragment mass and velocity, and the components are sized and colored by their AV.
+        if self.model.frag_ids:
+            view.chkAVColor = QCheckBox('Color AVs', view.widget)
+            view.chkAVColor.clicked.connect(self.update_av_colors)
+            view.horizontalLayout.addWidget(view.chkAVColor)
+            view.sldAVMass = QSlider(Qt.Horizontal, view.widget)
+            view.sldAVVel = QSlider(Qt.Horizontal, view.widget)
+            for sld in (view.sldAVMass, view.sldAVVel):
+                sld.setMaximumWidth(100)
+                sld.setEnabled(False)
+                sld.valueChanged.connect(self.update_av_colors)
+                view.horizontalLayout.addWidget(sld)
+            view.lblAV = QLabel('', view.widget)
+            view.horizontalLayout.addWidget(view.lblAV)
+            self.set_av_slider_ranges()
+            # component search: matching AV spheres are enlarged as the user types.
+            view.txtFind = QLineEdit(view.widget)
+            view.txtFind.setPlaceholderText('Find component')
+            view.txtFind.setMaximumWidth(140)
+            view.txtFind.textChanged.connect(self.on_txt_find_changed)
+            view.horizontalLayout.addWidget(view.txtFind)
+            view.lblFind = QLabel('', view.widget)
+            view.horizontalLayout.addWidget(view.lblFind)
+        # the matrix display toggles live in the toolbar row next to the camera buttons.
+        if self.model.pks is not None:
+            view.chkContours = QCheckBox('Pk contours', view.widget)
+            view.chkContours.clicked.connect(self.on_chk_contours_clicked)
+            view.horizontalLayout.addWidget(view.chkContours)
+            view.chkCells = QCheckBox('Matrix cells', view.widget)
+            view.chkCells.setChecked(True)
+            view.chkCells.clicked.connect(self.on_chk_cells_clicked)
+            view.horizontalLayout.addWidget(view.chkCells)
+            view.chkHover = QCheckBox('Hover Pk', view.widget)
+            view.chkHover.clicked.connect(self.on_chk_hover_clicked)
+            view.horizontalLayout.addWidget(view.chkHover)
+            # sweep controls: pick a terminal condition, then play the matrices of the cases along it.
+            view.cboSweep = QComboBox(view.widget)
+            view.cboSweep.addItems(SWEEP_AXES)
+            view.cboSweep.currentIndexChanged.connect(self.on_cbo_sweep_changed)
+            view.horizontalLayout.addWidget(view.cboSweep)
+            view.btnSweep = QPushButton('Sweep', view.widget)
+            view.btnSweep.setCheckable(True)
+            view.btnSweep.setEnabled(False)
+            view.btnSweep.clicked.connect(self.on_btn_sweep_clicked)
+            view.horizontalLayout.addWidget(view.btnSweep)
+            view.sldSweep = QSlider(Qt.Horizontal, view.widget)
+            view.sldSweep.setMaximumWidth(120)
+            view.sldSweep.setEnabled(False)
+            view.sldSweep.valueChanged.connect(self.on_sld_sweep_changed)
+            view.horizontalLayout.addWidget(view.sldSweep)
+            view.lblSweep = QLabel('', view.widget)
+            view.horizontalLayout.addWidget(view.lblSweep)
+            # derived views over the same cases: mean, max, or the difference from one of them.
+            view.cboMatrixView = QComboBox(view.widget)
+            view.cboMatrixView.addItems(MATRIX_VIEWS)
+            view.cboMatrixView.currentIndexChanged.connect(self.on_cbo_matrix_view_changed)
+            view.horizontalLayout.addWidget(view.cboMatrixView)
+            view.cboCompareCase = QComboBox(view.widget)
+            view.cboCompareCase.setEnabled(False)
+            view.cboCompareCase.currentIndexChanged.connect(self.on_cbo_matrix_view_changed)
+            view.horizontalLayout.addWidget(view.cboCompareCase)
+            self.sweep_timer = QTimer(view)
+            self.sweep_timer.setInterval(SWEEP_FRAME_INTERVAL)
+            self.sweep_timer.timeout.connect(self.on_sweep_timer)
 
     def setup_detailed_output_frames(self, model, view):
         """ When JMAE azimuth averaging mode is used, the GUI will display a radio button for each
@@ -225,12 +548,26 @@ class MayaviController:
         layout.addWidget(view.lblAzimuth)
         view.buttonGroup = QtGui.QButtonGroup(view.frmAzimuth)
         view.buttonGroup.buttonClicked.connect(self.on_rdo_azimuth_clicked)
-        for az in range(0, 360, int(model.attack_az)):
+        self.azimuths = list(range(0, 360, int(model.attack_az)))
+        for az in self.azimuths:
             rdo_button = QtGui.QRadioButton('{0} degrees'.format(az), view.frmAzimuth)
             layout.addWidget(rdo_button)
             view.buttonGroup.addButton(rdo_button, az)
             if az == 0:
                 rdo_button.setChecked(True)
+        # a slider and play button sweep through the same azimuths as the radio buttons.
+        view.sldAzimuth = QtGui.QSlider(Qt.Horizontal, view.frmAzimuth)
+        view.sldAzimuth.setRange(0, len(self.azimuths) - 1)
+        view.sldAzimuth.setTickPosition(QtGui.QSlider.TicksBelow)
+        view.sldAzimuth.valueChanged.connect(self.on_sld_azimuth_changed)
+        layout.addWidget(view.sldAzimuth)
+        view.btnPlayAzimuth = QtGui.QPushButton('Play', view.frmAzimuth)
+        view.btnPlayAzimuth.setCheckable(True)
+        view.btnPlayAzimuth.clicked.connect(self.on_btn_play_azimuth_clicked)
+        layout.addWidget(view.btnPlayAzimuth)
+        self.play_timer = QTimer(view)
+        self.play_timer.setInterval(AZIMUTH_PLAYBACK_INTERVAL)
+        self.play_timer.timeout.connect(self.on_play_timer)
 
     def on_btn_home_clicked(self):
         """ Using the home button on the toolbar returns the user to the original 3D camera orientation."""
@@ -248,6 +585,85 @@ class MayaviController:
         if filename:
             self.plotter.save_view_to_file(filename)
 
+    def on_btn_export_clicked(self):
+        """ Exports the current, home and top views, plus the current view at every azimuth when burstpoints are
+        azimuth averaged, as large images. The files are rendered and written in the background. """
+        filename = QFileDialog.getSaveFileName(self.view, 'Export Views', self.working_dir, 'Images(*.png *.jpg)')
+        if not filename:
+            return
+        magnification, ok = QInputDialog.getInt(self.view, 'Export Views', 'Image size (multiple of window size):',
+                                                EXPORT_MAGNIFICATION, 1, EXPORT_MAX_MAGNIFICATION)
+        if not ok:
+            return
+        root, ext = os.path.splitext(filename)
+        ext = ext or '.png'
+        self.exporter.add(root + ext, magnification)
+        self.exporter.add(root + '_home' + ext, magnification, self.plotter.reset_view)
+        self.exporter.add(root + '_top' + ext, magnification, self.plotter.top_view)
+        if self.model.az_averaging and self.model.dtl_file is not None and self.view.rdoBurst.isChecked():
+            # the azimuth on display is put back when the queue is done.
+            if self.export_az is None:
+                self.export_az = self.view.buttonGroup.checkedId()
+            for az in self.azimuths:
+                self.exporter.add('{0}_az{1}{2}'.format(root, az, ext), magnification, partial(self.select_azimuth, az))
+
+    def on_btn_movie_clicked(self):
+        """ Records a movie: an orbit around the focal point starting from the home or top view, or a sweep through
+        the azimuths or through the cases along the toolbar's sweep axis. Frames are rendered one per idle callback
+        and written in the background, and then encoded with ffmpeg when a video file was chosen. """
+        view = self.view
+        kinds = list(MOVIE_KINDS[:2])
+        if self.azimuths and view.rdoBurst.isChecked():
+            kinds.append(MOVIE_KINDS[2])
+        loader = self.sweep_loader
+        if (loader is not None and not loader.isRunning() and np.any(loader.loaded) and
+                self.plotter.can_set_matrix_pks() and view.cboMatrixView.currentIndex() == 0):
+            kinds.append(MOVIE_KINDS[3])
+        kind, ok = QInputDialog.getItem(view, 'Export Movie', 'Movie:', kinds, 0, False)
+        if not ok:
+            return
+        filename = QFileDialog.getSaveFileName(view, 'Export Movie', self.working_dir,
+                                               'Movies (*.mp4 *.avi);;Frames only (*.png)')
+        if not filename:
+            return
+        if not os.path.splitext(filename)[1]:
+            filename += '.mp4'
+        if kind in MOVIE_KINDS[:2]:
+            preset = self.plotter.reset_view if kind == MOVIE_KINDS[0] else self.plotter.top_view
+            step = 360.0 / MOVIE_ORBIT_FRAMES
+            setups = [partial(self.plotter.orbit_view, preset, i * step) for i in range(MOVIE_ORBIT_FRAMES)]
+        elif kind == MOVIE_KINDS[2]:
+            if self.export_az is None:
+                self.export_az = view.buttonGroup.checkedId()
+            setups = [partial(self.select_azimuth, az) for az in self.azimuths]
+        else:
+            self.stop_sweep()
+            setups = [partial(self.on_sld_sweep_changed, i) for i in np.nonzero(loader.loaded)[0]]
+        MovieExport(self.exporter, filename, setups, MOVIE_FPS, finished_callback=self.on_movie_finished)
+
+    def on_movie_finished(self, message):
+        self.view.txtInfo.appendPlainText(message)
+        # a sweep movie leaves its last frame on the matrix.
+        if not self.sweep_timer or not self.sweep_timer.isActive():
+            self.stop_sweep()
+
+    def select_azimuth(self, az):
+        self.view.buttonGroup.button(az).setChecked(True)
+        self.on_rdo_azimuth_clicked(None)
+
+    def on_export_progress(self, written, total):
+        self.view.prgExport.setMaximum(max(total, 1))
+        self.view.prgExport.setValue(written)
+        self.view.prgExport.setVisible(written < total)
+
+    def on_export_error(self, filename, message):
+        self.view.txtInfo.appendPlainText('Export of {0} failed: {1}'.format(filename, message))
+
+    def on_export_finished(self):
+        if self.export_az is not None:
+            self.select_azimuth(self.export_az)
+            self.export_az = None
+
     def on_btn_axes_clicked(self):
         """ Shows the X, Y, Z axes in the bottom left corner of the window for reference. """
         self.plotter.show_axes(self.view.btnAxes.isChecked())
@@ -255,38 +671,115 @@ class MayaviController:
     def on_btn_clear_clicked(self):
         """ Clears any selected point/cell and hides any text displayed in the Info window. """
         self.plotter.access_obj.hide()
-        self.view.txtInfo.setPlainText("")
+        self.plotter.hide_shotlines()
+        self.clear_info()
+
+    def on_btn_shotlines_clicked(self):
+        """ Trace shotlines from the selected burstpoint, or from every burstpoint on display if none is selected,
+        to each component, and list the target surfaces in the way. """
+        model = self.model
+        comp_ids = sorted(model.dh_ids.union(model.blast_ids).union(model.frag_ids))
+        if not comp_ids:
+            return
+        az = self.plotter.selected_az
+        pts = model.get_burst_array()[:, model.detail_az_index[az]]
+        obj = self.plotter.access_obj
+        selected = obj is not None and obj.is_visible() and not obj.is_cell_outline()
+        if selected:
+            idx = [model.point_index[self.plotter.pid]]
+        else:
+            shown = np.all(np.isfinite(pts), axis=1)
+            if self.plotter.point_mask is not None:
+                shown &= self.plotter.point_mask
+            idx = np.nonzero(shown)[0]
+            num_lines = len(idx) * len(comp_ids)
+            if num_lines > SHOTLINE_TRACE_LIMIT and QMessageBox.question(
+                    self.view, 'Trace Shotlines', 'Tracing {0} shotlines from {1} burst points may take a while. '
+                    'Select a burst point to trace from it alone. Trace them all anyway?'.format(num_lines, len(idx)),
+                    QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+                return
+        blocked, hits = model.trace_shotlines(pts[idx], comp_ids, list_hits=selected)
+        num_lines = blocked.size
+        if num_lines <= SHOTLINE_DRAW_LIMIT:
+            # end points are only made for shotlines that will be drawn.
+            self.plotter.show_shotlines(model.shotline_ends(pts[idx], comp_ids), blocked.ravel())
+        else:
+            self.plotter.hide_shotlines()
+        if selected:
+            output = 'Shotlines from burst point {0}:\n'.format(self.plotter.pid)
+            for c, cid in enumerate(comp_ids):
+                names = [model.surf_names[surf] for line, surf in hits if line == c]
+                output += '   {0}: {1}\n'.format(model.comps[cid].name,
+                                                 'blocked by ' + ', '.join(names) if names else 'clear')
+        else:
+            output = 'Clear shotlines from {0} burst points at {1} degrees:\n'.format(len(idx), az)
+            if num_lines > SHOTLINE_DRAW_LIMIT:
+                output += '   ({0} shotlines are too many to draw)\n'.format(num_lines)
+            for cid, clear in zip(comp_ids, (~blocked).sum(axis=0)):
+                output += '   {0}: {1}\n'.format(model.comps[cid].name, clear)
+        self.view.txtInfo.setPlainText(output)
+        self.plotter.scene.render()
 
     # noinspection PyUnusedLocal
     def on_rdo_azimuth_clicked(self, button):
         """ Hide any burstpoint or cell selection. If a burstpoint was already selected before, then reselect it and
         shift the frag zones to the new azimuth. """
-        self.view.txtInfo.setPlainText("")
+        self.clear_info()
+        # keep the slider in step with the radio buttons without firing its own event.
+        self.view.sldAzimuth.blockSignals(True)
+        self.view.sldAzimuth.setValue(self.azimuths.index(self.view.buttonGroup.checkedId()))
+        self.view.sldAzimuth.blockSignals(False)
         self.update_radius_params()
+        if self.model.frag_ids and self.view.chkAVColor.isChecked():
+            self.update_av_colors()
         obj = self.plotter.access_obj
         is_visible = obj.is_visible()
         obj.hide()
         if is_visible and not obj.is_cell_outline():
             self.update_point_details(self.plotter.pid)
 
+    def on_sld_azimuth_changed(self, idx):
+        """ Moving the slider selects the matching azimuth radio button. """
+        self.view.buttonGroup.button(self.azimuths[idx]).setChecked(True)
+        self.on_rdo_azimuth_clicked(None)
+
+    def on_btn_play_azimuth_clicked(self):
+        """ Starts/stops sweeping through the azimuths. """
+        if self.view.btnPlayAzimuth.isChecked():
+            self.view.btnPlayAzimuth.setText('Pause')
+            self.play_timer.start()
+        else:
+            self.view.btnPlayAzimuth.setText('Play')
+            self.play_timer.stop()
+
+    def on_play_timer(self):
+        """ Advance to the next azimuth, wrapping around at 360 degrees. """
+        self.view.sldAzimuth.setValue((self.view.sldAzimuth.value() + 1) % len(self.azimuths))
+
+    def _set_azimuth_controls_enabled(self, state):
+        self.view.lblAzimuth.setEnabled(state)
+        for btn in self.view.buttonGroup.buttons():
+            btn.setEnabled(state)
+        self.view.sldAzimuth.setEnabled(state)
+        self.view.btnPlayAzimuth.setEnabled(state)
+        if not state and self.view.btnPlayAzimuth.isChecked():
+            self.view.btnPlayAzimuth.setChecked(False)
+            self.on_btn_play_azimuth_clicked()
+
     def on_rdo_sample(self):
         """ Hide any burstpoint or cell selection and disable the azimuth buttons. """
-        self.view.txtInfo.setPlainText("")
+        self.clear_info()
         if self.model.az_averaging and self.model.dtl_file is not None:
-            self.view.lblAzimuth.setEnabled(False)
-            for btn in self.view.buttonGroup.buttons():
-                btn.setEnabled(False)
+            self._set_azimuth_controls_enabled(False)
         self.update_radius_params()
         obj = self.plotter.access_obj
         obj.hide()
 
     def on_rdo_burst(self):
         """ Shift the points to the new azimuth, but hide any burstpoint or cell selection. """
-        self.view.txtInfo.setPlainText("")
+        self.clear_info()
         if self.model.az_averaging and self.model.dtl_file is not None:
-            self.view.lblAzimuth.setEnabled(True)
-            for btn in self.view.buttonGroup.buttons():
-                btn.setEnabled(True)
+            self._set_azimuth_controls_enabled(True)
         self.update_radius_params()
         obj = self.plotter.access_obj
         obj.hide()
@@ -297,22 +790,328 @@ class MayaviController:
         self.plotter.scene.render()
         # self.view.update()
 
+    def set_av_slider_ranges(self):
+        """ Each AV slider steps evenly between the mass or velocity breakpoints of the AV tables. """
+        model = self.model
+        self.view.sldAVMass.setRange(0, (len(model.mss) - 1) * AV_SLIDER_STEPS)
+        self.view.sldAVVel.setRange(0, (len(model.vls) - 1) * AV_SLIDER_STEPS)
+
+    @staticmethod
+    def get_slider_breakpoint(breakpoints, pos):
+        """ :return: the value a slider position stands for, interpolated between two neighboring breakpoints. """
+        i, step = divmod(pos, AV_SLIDER_STEPS)
+        if i >= len(breakpoints) - 1:
+            return breakpoints[-1]
+        return breakpoints[i] + (breakpoints[i + 1] - breakpoints[i]) * step / AV_SLIDER_STEPS
+
+    def get_attack_azimuth(self):
+        """ :return: the azimuth selected in the azimuth frame, or the munition attack azimuth. """
+        model = self.model
+        if model.az_averaging:
+            return self.view.buttonGroup.checkedId() if model.dtl_file is not None else 0
+        return model.attack_az
+
+    def update_av_colors(self):
+        """ Recolor the AV components for the fragment mass and velocity on the sliders. The fragment elevation is
+        taken as the munition angle of fall. """
+        view = self.view
+        if not self.model.frag_ids:
+            return
+        colored = view.chkAVColor.isChecked()
+        view.sldAVMass.setEnabled(colored)
+        view.sldAVVel.setEnabled(colored)
+        if not colored:
+            view.lblAV.setText('')
+            self.plotter.clear_av_colors()
+            return
+        model = self.model
+        mass = self.get_slider_breakpoint(model.mss, view.sldAVMass.value())
+        vel = self.get_slider_breakpoint(model.vls, view.sldAVVel.value())
+        view.lblAV.setText('Mass {0:g}, velocity {1:g}'.format(mass, vel))
+        self.plotter.color_av(self.get_attack_azimuth(), model.aof, mass, vel)
+
+    def get_point_mask(self, az):
+        """ :return: which points to show at azimuth az, or None to show them all. """
+        model = self.model
+        if not model.has_blast_detail() or not self.view.chkBlastOnly.isChecked():
+            return None
+        return model.get_blast_mask(az)
+
+    def set_point_coloring(self):
+        """ Hand the plotter the values the points are colored by: kill PK, or the fraction of frag components that
+        lie inside their own frag zones. """
+        model = self.model
+        if model.dtl_file is None or not model.frag_ids or self.view.cboPointColor.currentIndex() == 0:
+            self.plotter.set_point_values(None)
+        else:
+            self.plotter.set_point_values(model.get_frag_reach().sum(axis=2) / float(len(model.reach_comp_ids)))
+
+    def on_cbo_point_color_changed(self, idx):
+        """ Recolor the points, and list how many burstpoints reach each frag component at this azimuth. """
+        self.set_point_coloring()
+        self.update_radius_params()
+        if idx == 0:
+            self.clear_info()
+            return
+        model = self.model
+        az = self.plotter.selected_az
+        output = 'Burst points whose frag zones reach each component at {0} degrees:\n'.format(az)
+        for cid, count in model.get_frag_reach_counts(az):
+            output += '   {0}: {1}\n'.format(model.comps[cid].name, count)
+        self.view.txtInfo.setPlainText(output)
+
+    def on_chk_blast_only_clicked(self):
+        """ Show only the points inside a blast volume, and list how many fall inside each one. """
+        self.plotter.access_obj.hide()
+        self.update_radius_params()
+        if not self.view.chkBlastOnly.isChecked():
+            self.clear_info()
+            return
+        model = self.model
+        az = self.plotter.selected_az
+        output = 'Burst points inside blast volumes at {0} degrees: {1}\n'.format(az, model.get_blast_mask(az).sum())
+        for cid, count in model.get_blast_counts(az):
+            output += '   {0}: {1}\n'.format(model.comps[cid].name, count)
+        self.view.txtInfo.setPlainText(output)
+
+    def clear_info(self):
+        """ Empty the Info box and the detail table. """
+        self.view.txtInfo.setPlainText("")
+        if self.detail_table is not None:
+            self.detail_table.clear()
+
+    def on_cbo_mechanism_changed(self, idx):
+        """ Show only the direct hit, blast or frag components in the detail table. """
+        self.detail_table.set_mechanism(self.view.cboMechanism.itemText(idx) if idx > 0 else None)
+
+    def on_txt_find_changed(self, text):
+        """ Highlight the AV components whose name or ID contains the search text. """
+        if not text.strip():
+            self.view.lblFind.setText('')
+            self.plotter.highlight_av(None)
+            return
+        comp_ids = self.model.get_comp_name_index().search(text)
+        self.view.lblFind.setText('{0} found'.format(len(comp_ids.intersection(self.plotter.av_ids))))
+        self.plotter.highlight_av(comp_ids)
+
+    def on_chk_contours_clicked(self):
+        """ show/hide the iso-PK contour lines over the matrix. """
+        self.plotter.set_matrix_contours_visible(self.view.chkContours.isChecked())
+        self.plotter.scene.render()
+
+    def on_chk_cells_clicked(self):
+        """ show/hide the individual matrix cells. """
+        self.plotter.set_matrix_cells_visible(self.view.chkCells.isChecked())
+        self.plotter.scene.render()
+
+    def on_chk_hover_clicked(self):
+        """ turn the matrix cell read-out under the mouse cursor on/off. """
+        self.interactor.set_hover(self.view.chkHover.isChecked())
+
     def _set_lbl_azimuth_text(self):
         if self.view.frmAzimuth.isVisible():
             label_text = 'View burstpoints at attack azimuth:'
             self.view.lblAzimuth.setText(label_text)
 
+    def set_sweep_cases(self, cases, current_file):
+        """
+        :param cases: dict of sweep axis name (from SWEEP_AXES) -> list of (terminal condition text, .out file path)
+                      of the cases that differ from this one only along that axis, in sweep order.
+        :param current_file: .out file path of the case on display
+        """
+        self.sweep_cases = cases
+        self.current_file = current_file
+        if self.model.pks is not None:
+            self.on_cbo_sweep_changed(self.view.cboSweep.currentIndex())
+
+    # noinspection PyUnusedLocal
+    def on_cbo_sweep_changed(self, idx):
+        """ A sweep needs at least two cases along the chosen axis. """
+        self.stop_sweep()
+        cases = self.sweep_cases.get(self.view.cboSweep.currentText(), [])
+        self.view.btnSweep.setEnabled(len(cases) > 1)
+        self.view.cboCompareCase.blockSignals(True)
+        self.view.cboCompareCase.clear()
+        self.view.cboCompareCase.addItems([text for text, _ in cases])
+        self.view.cboCompareCase.blockSignals(False)
+        self.update_matrix_view()
+
+    def get_sweep_loader(self):
+        """ Start reading the cases along the chosen sweep axis, unless that's already been done.
+        :return: SweepLoader for the chosen axis
+        """
+        cases = self.sweep_cases[self.view.cboSweep.currentText()]
+        if self.sweep_loader is None or self.sweep_loader.cases != cases:
+            if self.sweep_loader is not None:
+                self.sweep_loader.stop()
+            self.sweep_loader = SweepLoader(cases, self.model.gridlines_range, self.model.gridlines_defl, self.view)
+            self.sweep_loader.frame_loaded.connect(self.on_sweep_frame_loaded)
+            self.sweep_loader.model_loaded.connect(self.on_sweep_model_loaded)
+            self.sweep_loader.finished.connect(partial(self.on_sweep_loader_finished, self.sweep_loader))
+            self.sweep_loader.start()
+            self.view.sldSweep.blockSignals(True)
+            self.view.sldSweep.setRange(0, len(cases) - 1)
+            self.view.sldSweep.setValue(0)
+            self.view.sldSweep.blockSignals(False)
+        return self.sweep_loader
+
+    def on_sweep_loader_finished(self, loader):
+        """ Show the combined view that was waiting on the cases. A loader that has since been replaced, or one that
+        was only reading frames for sweep playback, leaves the display alone. """
+        if loader is self.sweep_loader and self.view.cboMatrixView.currentIndex() != 0:
+            self.update_matrix_view()
+
+    # noinspection PyUnusedLocal
+    def on_cbo_matrix_view_changed(self, idx):
+        self.update_matrix_view()
+
+    def update_matrix_view(self):
+        """ Show the matrix view chosen in the toolbar. Every view but the case PKs combines the cases along the
+        sweep axis, so they're read first (in the background) and put on a common grid; switching between views
+        after that is just a reduction over the stacked array. """
+        view = self.view
+        mode = view.cboMatrixView.currentIndex()
+        cases = self.sweep_cases.get(view.cboSweep.currentText(), [])
+        view.cboCompareCase.setEnabled(mode == 3)
+        if mode == 0:
+            self.plotter.hide_matrix_view()
+            self.on_chk_cells_clicked()
+            view.btnSweep.setEnabled(len(cases) > 1)
+            return
+        self.stop_sweep()
+        view.btnSweep.setEnabled(False)
+        if len(cases) < 2:
+            view.txtInfo.setPlainText('There is only one case along the {0} axis.'.format(view.cboSweep.currentText()))
+            return
+        loader = self.get_sweep_loader()
+        if loader.isRunning():
+            view.lblSweep.setText('Reading {0} cases...'.format(len(cases)))
+            return  # the loader calls back here when it's done.
+        idx, stack, gr, gd = loader.common_stack(MATRIX_COMPARE_MAX_LINES)
+        view.lblSweep.setText('')
+        if mode == 1:
+            self.plotter.show_matrix_view(stack.mean(axis=0), gr, gd, 'Mean Pk')
+        elif mode == 2:
+            self.plotter.show_matrix_view(stack.max(axis=0), gr, gd, 'Max Pk')
+        else:
+            paths = [cases[i][1] for i in idx]
+            other = cases[view.cboCompareCase.currentIndex()][1]
+            if self.current_file not in paths or other not in paths:
+                view.txtInfo.setPlainText("One of the cases to compare couldn't be read.")
+                return
+            diff = stack[paths.index(self.current_file)] - stack[paths.index(other)]
+            self.plotter.show_matrix_view(diff, gr, gd, 'Pk - Pk at {0}'.format(view.cboCompareCase.currentText()),
+                                          diverging=True)
+
+    def on_btn_sweep_clicked(self):
+        """ Starts/stops the sweep. The matrices are read in the background the first time, and each frame is shown
+        as soon as it's ready. """
+        view = self.view
+        if not view.btnSweep.isChecked():
+            self.stop_sweep()
+            return
+        if not self.plotter.can_set_matrix_pks():
+            view.txtInfo.setPlainText("Sweeps need the 'All cells' matrix display.")
+            view.btnSweep.setChecked(False)
+            return
+        self.get_sweep_loader()
+        view.sldSweep.setEnabled(True)
+        view.btnSweep.setText('Stop')
+        self.sweep_timer.start()
+
+    def on_sweep_timer(self):
+        """ Advance to the next frame that has been loaded, wrapping around at the end. """
+        loaded = np.nonzero(self.sweep_loader.loaded)[0]
+        if len(loaded):
+            later = loaded[loaded > self.view.sldSweep.value()]
+            self.view.sldSweep.setValue(int(later[0] if len(later) else loaded[0]))
+
+    def on_sld_sweep_changed(self, idx):
+        """ Show a sweep frame by copying its PKs into the matrix on display. """
+        loader = self.sweep_loader
+        if loader is not None and loader.loaded[idx]:
+            self.plotter.set_matrix_pks(loader.frames[idx])
+            self.sweep_frame_shown = True
+            self.view.lblSweep.setText('{0} {1}'.format(self.view.cboSweep.currentText(), loader.cases[idx][0]))
+
+    @staticmethod
+    def on_sweep_model_loaded(model):
+        """ Count a sweep case in the memory totals. Runs on the GUI thread, which is the one that reads them. """
+        memory.track_model(model)
+
+    def on_sweep_frame_loaded(self, idx, error):
+        if error:
+            self.view.txtInfo.appendPlainText('Sweep case {0} not loaded: {1}'.format(self.sweep_loader.cases[idx][0],
+                                                                                     error))
+
+    def stop_sweep(self):
+        """ Stop playing and put the window's own matrix back on display. """
+        if self.sweep_timer is None:
+            return
+        self.sweep_timer.stop()
+        self.view.btnSweep.setChecked(False)
+        self.view.btnSweep.setText('Sweep')
+        self.view.sldSweep.setEnabled(False)
+        if self.sweep_frame_shown:
+            self.sweep_frame_shown = False
+            self.view.lblSweep.setText('')
+            self.plotter.set_matrix_pks(self.model.pks)
+            self.plotter.clear_frame()
+
+    def on_build_progress(self, done, total):
+        """ Called by the plotter each time another piece of the scene has been drawn. """
+        self.view.prgBuild.setMaximum(total)
+        self.view.prgBuild.setValue(done)
+        self.view.prgBuild.setVisible(done < total)
+        if done == total:
+            self.update_timings()
+
+    def on_chk_hud_clicked(self):
+        self.plotter.show_hud(self.view.chkHud.isChecked())
+
+    def on_layer_toggled(self, layer, is_checked):
+        self.plotter.set_layer_visible(layer, is_checked)
+
+    def on_btn_timings_clicked(self):
+        self.view.txtPerf.setVisible(self.view.btnTimings.isChecked())
+        self.update_timings()
+
+    def update_timings(self):
+        """ List the stages of the last load in the timings panel, slowest first. Rendering keeps adding to the
+        load, so the list is refreshed each time the panel is opened. """
+        if not self.view.txtPerf.isVisible():
+            return
+        load = perf.last_load()
+        if not perf.is_enabled():
+            text = 'Timings are off. Turn on "Record timings" in the case dialog, then load a case.'
+        elif load is None or not load.stages:
+            text = 'No timings recorded yet.'
+        else:
+            lines = ['{0}: {1:.0f} ms total'.format(load.label, load.total),
+                     '{0:<48}{1:>8}{2:>12}'.format('Stage', 'Calls', 'ms')]
+            lines.extend('{0:<48}{1:>8}{2:>12.1f}'.format(stage, calls, ms) for stage, calls, ms in load.summary())
+            lines.extend('{0}: {1}'.format(name, n) for name, n in sorted(load.counters.items()))
+            text = '\n'.join(lines)
+        self.view.txtPerf.setPlainText(text)
+
     # noinspection PyUnusedLocal
     def closeEvent(self, event):
         """ deleteLater() causes the event loop to delete the widget after all pending events have been delivered to it
         and prevents errors on close. """
+        if self.play_timer is not None:
+            self.play_timer.stop()
+        self.plotter.cancel_build()
+        self.exporter.shutdown()
+        self.stop_sweep()
+        if self.sweep_loader is not None:
+            self.sweep_loader.stop()
         self.mayavi_widget.deleteLater()
 
     def update_radius_params(self):
         """ Update plotter object with newly selected azimuth and sample/burst points for display."""
         model = self.model
         view = self.view
-        points = model.get_sample_points() if view.rdoSample.isChecked() else model.get_burst_points()
+        points = model.get_sample_array() if view.rdoSample.isChecked() else model.get_burst_array()
         az = view.buttonGroup.checkedId() if model.az_averaging else int(model.attack_az)
-        self.plotter.update_point_detail(az, points)
+        self.plotter.update_point_detail(az, points, self.get_point_mask(az))
         self.plotter.plot_detail()
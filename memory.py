@@ -0,0 +1,187 @@
+import sys
+import types
+import unittest
+import weakref
+from itertools import islice
+import numpy as np
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Memory accounting for the cases and 3D scenes open in this process, and a budget that is checked before the
+    workstation runs out of memory. Cases (DataModel) and scenes (Plotter) report their own use and are tracked here
+    without being kept alive; caches register a way to size and clear themselves, so they can be evicted first.
+'''
+
+_models = weakref.WeakSet()
+_scenes = weakref.WeakSet()
+_caches = []
+_armed = True  # False after an eviction, until usage drops back under the rearm fraction
+_SKIPPED = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def sizeof(obj, seen=None):
+    """ Approximate bytes held by an object and everything it refers to. Numpy arrays count their data buffer once,
+    however many views share it.
+    :param obj: object to size
+    :param seen: set of object IDs already counted, to share between calls that shouldn't count an object twice
+    :return: size in bytes
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if item is None or id(item) in seen or isinstance(item, _SKIPPED):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)  # an array that owns its data includes the buffer here, a view doesn't
+        if isinstance(item, np.ndarray):
+            if item.base is not None:
+                stack.append(item.base)
+            if item.dtype == object:
+                stack.extend(item.flat)
+        elif isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, int, float, complex, bool)):
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            for name in getattr(type(item), '__slots__', ()):
+                stack.append(getattr(item, name, None))
+    return total
+
+
+def estimate_sizeof(mapping, samples=16, seen=None):
+    """ Approximate bytes held by a large dictionary of similar records, from the size of its first few records
+    times the number of records. Walking every record of the nested .dtl dictionaries takes seconds on large cases.
+    :param mapping: dictionary to size
+    :param samples: number of records sized
+    :param seen: set of object IDs already counted; the dictionary is added to it so a later sizeof skips it
+    :return: size in bytes
+    """
+    if seen is not None:
+        seen.add(id(mapping))
+    total = sys.getsizeof(mapping)
+    if not mapping:
+        return total
+    records = {key: mapping[key] for key in islice(mapping, samples)}
+    return total + int(sizeof(records) - sys.getsizeof(records)) * len(mapping) // len(records)
+
+
+def track_model(model):
+    """ Count a case once it's read in. It's dropped from the count when nothing else refers to it. """
+    _models.add(model)
+
+
+def track_scene(plotter):
+    _scenes.add(plotter)
+
+
+def track_cache(name, size, clear):
+    """
+    :param name: name shown in the totals
+    :param size: function returning the bytes held by the cache
+    :param clear: function emptying the cache
+    """
+    _caches.append((name, size, clear))
+
+
+def usage():
+    """ :return: (cases, scenes, caches) byte totals of everything open in the process. """
+    cases = sum(sum(model.memory_usage().values()) for model in list(_models))
+    # windows showing the same target share geometry, which is counted once.
+    seen = set()
+    scenes = sum(sum(plotter.memory_usage(seen).values()) for plotter in list(_scenes))
+    caches = sum(size() for _, size, _ in _caches)
+    return cases, scenes, caches
+
+
+def enforce_budget(budget, evict_fraction, rearm_fraction):
+    """ When the totals get close to the budget, clear the caches and have each scene let go of geometry that's out
+    of view. Cases are never dropped here, since they are what the user has open. Evicting only happens once until
+    the totals drop under the rearm fraction, so open cases that alone are over the evict fraction don't have the
+    shared geometry released and rebuilt on every check.
+    :param budget: bytes the process should stay under
+    :param evict_fraction: fraction of the budget at which evicting starts
+    :param rearm_fraction: fraction of the budget the totals have to drop under before evicting again
+    :return: (cases, scenes, caches, evicted), where evicted is True if anything had to be released.
+    """
+    global _armed
+    cases, scenes, caches = usage()
+    total = cases + scenes + caches
+    if total < budget * rearm_fraction:
+        _armed = True
+    if total <= budget * evict_fraction or not _armed:
+        return cases, scenes, caches, False
+    _armed = False
+    for _, _, clear in _caches:
+        clear()
+    for plotter in list(_scenes):
+        plotter.release_memory()
+    cases, scenes, caches = usage()
+    return cases, scenes, caches, True
+
+
+def format_bytes(n):
+    for unit in ('bytes', 'KB', 'MB'):
+        if n < 1024.0:
+            return '{0:.0f} {1}'.format(n, unit)
+        n /= 1024.0
+    return '{0:.1f} GB'.format(n)
+
+
+class TestMemory(unittest.TestCase):
+    def test_sizeof(self):
+        data = np.zeros(1000)
+        # the view and the list refer to the same buffer, which is only counted once.
+        size = sizeof([data, data[10:], {'a': data}])
+        self.assertTrue(data.nbytes <= size < 2 * data.nbytes)
+        cycle = []
+        cycle.append(cycle)
+        self.assertEqual(sizeof(cycle), sys.getsizeof(cycle))
+
+    def test_estimate_sizeof(self):
+        records = {i: {'pk': 0.5 * i, 'zones': [1.0 * i, 2.0 * i]} for i in range(1000)}
+        seen = set()
+        estimate = estimate_sizeof(records, seen=seen)
+        self.assertTrue(0.8 * sizeof(records) < estimate < 1.2 * sizeof(records))
+        self.assertEqual(sizeof(records, seen), 0)
+
+    def test_enforce_budget(self):
+        class Model(object):
+            def memory_usage(self):
+                return {'PKs': 600}
+
+        class Scene(object):
+            def __init__(self):
+                self.released = False
+
+            def memory_usage(self, seen):
+                return {'Target': 100}
+
+            def release_memory(self):
+                self.released = True
+
+        cache = {'size': 300}
+        track_cache('test', lambda: cache['size'], lambda: cache.update(size=0))
+        model, scene = Model(), Scene()
+        track_model(model)
+        track_scene(scene)
+        try:
+            self.assertEqual(enforce_budget(2000, 0.8, 0.7), (600, 100, 300, False))
+            self.assertEqual(enforce_budget(1000, 0.8, 0.7), (600, 100, 0, True))
+            self.assertTrue(scene.released)
+            # still over the evict fraction, but nothing more is released until usage drops under the rearm fraction.
+            scene.released = False
+            cache['size'] = 300
+            self.assertEqual(enforce_budget(1000, 0.8, 0.7), (600, 100, 300, False))
+            self.assertFalse(scene.released)
+            self.assertEqual(enforce_budget(2000, 0.8, 0.7), (600, 100, 300, False))
+            self.assertEqual(enforce_budget(1000, 0.8, 0.7), (600, 100, 0, True))
+        finally:
+            _caches.pop()
+            _models.discard(model)
+            _scenes.discard(scene)
@@ -1,12 +1,16 @@
 import os
 from fnmatch import fnmatch
-from PyQt4.QtGui import QFileDialog, QApplication
-from PyQt4.QtCore import Qt
+from PyQt4.QtGui import QFileDialog, QApplication, QComboBox, QLabel, QCheckBox, QMessageBox
+from PyQt4.QtCore import Qt, QTimer
+import perf
+import memory
 from textlabel import TextLabel
 from inifile import IniParser
 from datamodel import DataModel
 from uiloader import load_ui_widget
 from mayavicontroller import MayaviController
+from const import MATRIX_CELL_OPTIONS, SWEEP_AXES, PERF_LOG_FILE, MEMORY_BUDGET_MB, MEMORY_EVICT_FRACTION, \
+    MEMORY_REARM_FRACTION, MEMORY_CHECK_INTERVAL
 
 
 # noinspection SpellCheckingInspection
@@ -24,6 +28,27 @@ class ParamController:
         dlg.lblLayout.addWidget(dlg.lblDirectory)
         dlg.lblLayout.addWidget(choose_btn)
         dlg.frame.setLayout(dlg.lblLayout)
+        # matrix cell option sits under the terminal condition combos; merged cells draw large matrices much faster.
+        dlg.cboMatrixCells = QComboBox(dlg)
+        dlg.cboMatrixCells.addItems([name for name, _ in MATRIX_CELL_OPTIONS])
+        dlg.formLayout_2.addRow(QLabel('Matrix cells:', dlg), dlg.cboMatrixCells)
+        # when checked, a new case is shown in the last opened 3D window instead of a new one.
+        dlg.chkUpdateWindow = QCheckBox('Update current window', dlg)
+        dlg.formLayout_2.addRow(dlg.chkUpdateWindow)
+        # timings of each load go to the Timings panel of the 3D windows and to a log file.
+        dlg.chkTimings = QCheckBox('Record timings', dlg)
+        dlg.chkTimings.setChecked(perf.is_enabled())
+        dlg.chkTimings.clicked.connect(self.on_chk_timings_clicked)
+        dlg.formLayout_2.addRow(dlg.chkTimings)
+        self.on_chk_timings_clicked()
+        # memory of the open cases and 3D windows, checked against the budget every few seconds.
+        dlg.lblMemory = QLabel('', dlg)
+        dlg.formLayout_2.addRow(QLabel('Memory:', dlg), dlg.lblMemory)
+        self.memory_warned = False
+        self.memory_timer = QTimer(dlg)
+        self.memory_timer.setInterval(MEMORY_CHECK_INTERVAL)
+        self.memory_timer.timeout.connect(self.check_memory)
+        self.memory_timer.start()
         dlg.btnDisplay.setEnabled(False)
         self.ini_parser = IniParser(dlg)
         self.ini_parser.dir = start_dir
@@ -113,6 +138,8 @@ class ParamController:
             return
         self._update_model(file_prefix)
         self.ini_parser.write_ini_file()
+        if self.dlg.chkUpdateWindow.isChecked() and self.dlg.btnDisplay.isEnabled():
+            self._update_current_window(file_prefix)
 
     # noinspection PyArgumentList
     def on_btn_display(self):
@@ -122,16 +149,88 @@ class ParamController:
         # noinspection PyArgumentList
         QApplication.setOverrideCursor(Qt.WaitCursor)  # show hourglass cursor
         file_prefix = self._get_file_match()
-        plotter_win = load_ui_widget('mayavi_win.ui')
-        plotter_win.setWindowTitle(file_prefix)
-        controller = MayaviController(self.model, plotter_win, self.start_dir)
-        self.controllers.append(controller)
-        plotter_win.show()
+        if not self.dlg.chkUpdateWindow.isChecked() or not self._update_current_window(file_prefix):
+            plotter_win = load_ui_widget('mayavi_win.ui')
+            plotter_win.setWindowTitle(file_prefix)
+            controller = MayaviController(self.model, plotter_win, self.start_dir,
+                                          MATRIX_CELL_OPTIONS[self.dlg.cboMatrixCells.currentIndex()][1])
+            controller.set_sweep_cases(self._get_sweep_cases(file_prefix), self._get_out_file(file_prefix))
+            self.controllers.append(controller)
+            plotter_win.show()
         QApplication.restoreOverrideCursor()  # show standard arrow cursor
+        self.check_memory()
+
+    def check_memory(self):
+        """ Shows the memory totals, releasing caches and offscreen geometry as they near the budget, and warns once
+        each time the budget is still exceeded after that. The tooltip breaks down the selected case. """
+        budget = MEMORY_BUDGET_MB * 1024 * 1024
+        cases, scenes, caches, evicted = memory.enforce_budget(budget, MEMORY_EVICT_FRACTION,
+                                                                  MEMORY_REARM_FRACTION)
+        total = cases + scenes + caches
+        self.dlg.lblMemory.setText('{0} of {1} (cases {2}, 3D windows {3}, caches {4}){5}'.format(
+            memory.format_bytes(total), memory.format_bytes(budget), memory.format_bytes(cases),
+            memory.format_bytes(scenes), memory.format_bytes(caches), ', caches released' if evicted else ''))
+        self.dlg.lblMemory.setStyleSheet('color: red' if total > budget else '')
+        if self.model is not None and self.model.comps is not None:
+            self.dlg.lblMemory.setToolTip('\n'.join('{0}: {1}'.format(group, memory.format_bytes(n))
+                                                    for group, n in self.model.memory_usage().items()))
+        if total > budget and not self.memory_warned:
+            QMessageBox.warning(self.dlg, 'Memory', 'The open cases and 3D windows use {0}, over the budget of {1}. '
+                                'Close some 3D windows to free memory.'.format(memory.format_bytes(total),
+                                                                               memory.format_bytes(budget)))
+        self.memory_warned = total > budget
+
+    def _update_current_window(self, file_prefix):
+        """ Show the current model in the most recently opened 3D window that is still open.
+        :return: False if there is no open window that can show this case.
+        """
+        # closed windows are dropped so they don't keep their scenes alive.
+        self.controllers = [c for c in self.controllers if c.view.isVisible()]
+        if not self.controllers or not self.controllers[-1].can_show(self.model):
+            return False
+        self.controllers[-1].update_model(self.model, file_prefix,
+                                          MATRIX_CELL_OPTIONS[self.dlg.cboMatrixCells.currentIndex()][1])
+        self.controllers[-1].set_sweep_cases(self._get_sweep_cases(file_prefix), self._get_out_file(file_prefix))
+        return True
+
+    def _get_out_file(self, file_prefix):
+        return self.ini_parser.dir + os.path.sep + file_prefix + '.out'
+
+    def _get_sweep_cases(self, file_prefix):
+        """ Finds the cases that differ from the chosen one along a single terminal condition.
+        :return: dict of sweep axis name -> sorted list of (terminal condition text, .out file path).
+        """
+        def split(name):
+            # file names end with _aof-velocity-height, the same layout _populate_combo_boxes relies on.
+            base, vel, height = name.rsplit('-', 2)
+            head, aof = base.rsplit('_', 1)
+            return head, (aof, vel, height)
+
+        head, conditions = split(file_prefix)
+        cases = {axis: [] for axis in SWEEP_AXES}
+        for f in self.out_files:
+            if f.count('-') < 2 or '_' not in f.rsplit('-', 2)[0]:
+                continue
+            f_head, f_conditions = split(f)
+            if f_head != head:
+                continue
+            for i, axis in enumerate(SWEEP_AXES):
+                if all(f_conditions[j] == conditions[j] for j in range(3) if j != i):
+                    cases[axis].append((float(f_conditions[i]), f_conditions[i], self._get_out_file(f)))
+        return {axis: [(text, path) for _, text, path in sorted(lst)] for axis, lst in cases.items()}
 
     def about_to_quit(self):
         """ Fires when the app is about to end, and writes out the user preferences to an .ini file. """
         self.ini_parser.write_ini_file()
+        perf.end_load()
+        perf.set_log_file(None)
+
+    def on_chk_timings_clicked(self):
+        """ Turns timing spans on or off. While they're on, every span is appended to a JSON lines log file next to
+        the .ini file. """
+        state = self.dlg.chkTimings.isChecked()
+        perf.set_enabled(state)
+        perf.set_log_file(os.path.abspath(os.path.curdir) + os.path.sep + PERF_LOG_FILE if state else None)
 
     def _get_file_match(self):
         """ Returns which file in the chosen directory matches the selected case name and terminal conditions."""
@@ -152,6 +251,7 @@ class ParamController:
         """ Parses the files associated with a chosen case. Reports any parsing errors at the bottom of the dialog. """
         dlg = self.dlg
         QApplication.setOverrideCursor(Qt.WaitCursor)  # show hourglass cursor
+        perf.begin_load(file_prefix)
         try:
             self.model = DataModel()
             self.model.read_and_transform_all_files(self.ini_parser.dir + os.path.sep + file_prefix + '.out')
@@ -161,4 +261,5 @@ class ParamController:
             dlg.lblErrorReport.setText(str(e))
             dlg.btnDisplay.setEnabled(False)
         QApplication.restoreOverrideCursor()   # show standard arrow cursor
+        self.check_memory()
 
@@ -2,6 +2,7 @@ import sys
 import numpy as np
 import os
 from collections import OrderedDict, defaultdict
+import perf
 from const import CMPID, R1, R2, R3, Z1, Z2
 
 
@@ -36,6 +37,7 @@ class AV(object):
         model.vls = []
         model.mss = []
         model.table_names = None
+        model.table_ids = []
         self.vel_cutoff = None
         model.avs = None
         model.pes = None
@@ -80,6 +82,7 @@ class AV(object):
             comp = AVComp(x=float(tokens[1]), y=float(tokens[2]), z=float(tokens[3]), name=tokens[4])
             comp_id = int(tokens[0])
             model.comps[i+1] = comp
+            model.table_ids.append(comp_id)  # component ID of each AV table, in table order
             if comp_id == 0:
                 continue  # dummy component
             model.frag_ids.add(comp_id)
@@ -169,6 +172,7 @@ class AV(object):
                     if model.av_averaging == 1 and polar_el:
                         break  # read only a single az/el pair if we're at a 90 degree elevation
 
+    @perf.timed()
     def read(self, av_file):
         with open(av_file) as self.avf:
             self._read_av_header()
@@ -192,6 +196,7 @@ class Surfaces(object):
         model.srf_min_y, model.srf_max_y = sys.maxsize, -sys.maxsize
         model.srf_max_z = -sys.maxsize
 
+    @perf.timed()
     def read(self, srf_file):
         """
         Reads surface file data
@@ -357,6 +362,7 @@ class Output(object):
                 else:
                     raise IOError(error_msg)
 
+    @perf.timed()
     def read(self, out_file):
         """
         Reads output file data.
@@ -425,6 +431,7 @@ class Kill(object):
         model.kill_lines = {}
         model.last_node = {}
 
+    @perf.timed()
     def read(self, kill_file):
         """
         Reads kill definition file data.
@@ -514,6 +521,7 @@ class Matrix(object):
         model.cell_size_range, model.cell_size_defl = None, None
         model.pks = None
 
+    @perf.timed()
     def read(self, mtx_file):
         """
         Reads matrix file data.
@@ -585,6 +593,9 @@ class Detail(object):
         model.surface_hit = {}
         model.frag_zones = {}
         model.comp_pk = {}
+        # the same PKs and frag zones as flat columns, one entry per record, so they can go into arrays in one step.
+        model.pk_pid, model.pk_az, model.pk_cid, model.pk_value = [], [], [], []
+        model.zone_pid, model.zone_az, model.zone_cid, model.zone_lower, model.zone_upper = [], [], [], [], []
         model.dh_include_frag_effects = None
         model.comp_num = None
 
@@ -665,6 +676,12 @@ class Detail(object):
             zone_info.append((zone_num, lower_zone_angle, upper_zone_angle))
             curr_frag_zone += 1
         model.frag_zones[idx][self.az][model.comp_num] = zone_info
+        for _, lower, upper in zone_info:
+            model.zone_pid.append(idx)
+            model.zone_az.append(self.az)
+            model.zone_cid.append(model.comp_num)
+            model.zone_lower.append(lower)
+            model.zone_upper.append(upper)
         return True
 
     # noinspection PyUnusedLocal
@@ -676,12 +693,19 @@ class Detail(object):
         idx = self.bp_idx
         cid = model.comp_num
         # identify the correct token for component PK by looking at the DH, blast and frag IDs.
+        pk = None
         if cid in model.dh_ids:
-            model.comp_pk[idx][self.az][cid] = float(tokens[12])
+            pk = float(tokens[12])
         elif cid in model.blast_ids:
-            model.comp_pk[idx][self.az][cid] = float(tokens[13])
+            pk = float(tokens[13])
         elif cid in model.frag_ids:
-            model.comp_pk[idx][self.az][cid] = float(tokens[14])
+            pk = float(tokens[14])
+        if pk is not None:
+            model.comp_pk[idx][self.az][cid] = pk
+            model.pk_pid.append(idx)
+            model.pk_az.append(self.az)
+            model.pk_cid.append(cid)
+            model.pk_value.append(pk)
         model.comp_num += 1
         return True
 
@@ -704,6 +728,7 @@ class Detail(object):
 
         return validated
 
+    @perf.timed()
     def read(self, dtl_file):
         """
         Reads detailed output file data.
@@ -727,6 +752,9 @@ class Detail(object):
         model.surface_hit = {}
         model.frag_zones = {}
         model.comp_pk = {}
+        # the same PKs and frag zones as flat columns, one entry per record, so they can go into arrays in one step.
+        model.pk_pid, model.pk_az, model.pk_cid, model.pk_value = [], [], [], []
+        model.zone_pid, model.zone_az, model.zone_cid, model.zone_lower, model.zone_upper = [], [], [], [], []
 
         with open(dtl_file) as self.dtl:
             while 1:
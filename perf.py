@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+import unittest
+from functools import wraps
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Timing spans and counters for the main stages of loading and showing a case (parsing, model transforms, plotting,
+    picking and rendering). Recording is off unless turned on with set_enabled or the JMAEOUT_PERF environment
+    variable, and when it's off a timed call costs one flag check. Each span can also be appended to a JSON lines
+    log file, so timings from many machines can be collected and compared.
+'''
+
+_lock = threading.Lock()
+_local = threading.local()
+_enabled = os.environ.get('JMAEOUT_PERF', '') not in ('', '0')
+_log_file = None
+_load = None
+
+
+class Load(object):
+    """ Timings of one case, from reading its files to the end of building its scene. """
+    def __init__(self, label):
+        self.label = label
+        self.start = time.time()
+        self.stages = {}  # stage name -> [number of calls, total milliseconds]
+        self.counters = {}
+        self.total = 0.0  # time of the outermost spans only, since nested spans are part of their callers' time
+
+    def add(self, stage, ms, outermost=True):
+        entry = self.stages.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += ms
+        if outermost:
+            self.total += ms
+
+    def summary(self):
+        """ :return: list of (stage, calls, total milliseconds), slowest stage first. """
+        return sorted(((stage, calls, ms) for stage, (calls, ms) in self.stages.items()), key=lambda s: -s[2])
+
+    def to_dict(self):
+        return {'load': self.label, 'time': self.start, 'total_ms': round(self.total, 3),
+                'stages': {stage: {'calls': calls, 'ms': round(ms, 3)} for stage, calls, ms in self.summary()},
+                'counters': dict(self.counters)}
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(state):
+    global _enabled
+    _enabled = state
+
+
+def set_log_file(filename):
+    """ Append every span (and a summary of each load) to a JSON lines file.
+    :param filename: log file path, or None to stop logging
+    """
+    global _log_file
+    with _lock:
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = open(filename, 'a') if filename else None
+
+
+def _write(record):
+    if _log_file is not None:
+        _log_file.write(json.dumps(record) + '\n')
+        _log_file.flush()
+
+
+def begin_load(label):
+    """ Start collecting the timings of a new case. The summary of the previous one goes to the log file. """
+    global _load
+    with _lock:
+        if _load is not None and _load.stages:
+            _write(_load.to_dict())
+        _load = Load(label)
+
+
+def end_load():
+    """ Write out the summary of the current case, e.g. when the application closes. """
+    global _load
+    with _lock:
+        if _load is not None and _load.stages:
+            _write(_load.to_dict())
+        _load = None
+
+
+def last_load():
+    """ :return: the Load being collected, or None. """
+    return _load
+
+
+def add_time(stage, ms):
+    """ Add time to a stage without writing a log line, for things that happen too often to log one by one (like
+    rendering a frame). """
+    if _enabled and _load is not None:
+        with _lock:
+            _load.add(stage, ms)
+
+
+def count(name, n=1):
+    """ Add n to a counter of the current case. """
+    if _enabled and _load is not None:
+        with _lock:
+            _load.counters[name] = _load.counters.get(name, 0) + n
+
+
+class span(object):
+    """ Context manager timing a block of code as a stage.
+
+        with perf.span('build matrix'):
+            ...
+    """
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        if _enabled:
+            _local.depth = getattr(_local, 'depth', 0) + 1
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is None:
+            return False
+        ms = (time.perf_counter() - self.start) * 1000.0
+        _local.depth -= 1
+        with _lock:
+            if _load is not None:
+                _load.add(self.stage, ms, _local.depth == 0)
+            _write({'load': _load.label if _load is not None else None, 'stage': self.stage, 'ms': round(ms, 3),
+                    'depth': _local.depth, 'thread': threading.current_thread().name, 'time': time.time()})
+        return False
+
+
+def timed(stage=None):
+    """ Decorator that times every call of a function as a stage, named after the function unless given. """
+    def decorate(func):
+        name = stage or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TestPerf(unittest.TestCase):
+    def tearDown(self):
+        set_enabled(False)
+        end_load()
+
+    def test_disabled(self):
+        set_enabled(False)
+        begin_load('case')
+        timed()(lambda: None)()
+        self.assertEqual(last_load().stages, {})
+
+    def test_spans(self):
+        set_enabled(True)
+        begin_load('case')
+
+        @timed('stage')
+        def work(x):
+            return x * 2
+
+        self.assertEqual(work(2), 4)
+        work(3)
+        with span('block'):
+            count('points', 10)
+            work(1)
+        add_time('render', 5.0)
+        stages = {stage: calls for stage, calls, _ in last_load().summary()}
+        self.assertEqual(stages, {'stage': 3, 'block': 1, 'render': 1})
+        self.assertEqual(last_load().to_dict()['counters'], {'points': 10})
+
+    def test_total(self):
+        load = Load('case')
+        load.add('outer', 5.0)
+        load.add('inner', 2.0, outermost=False)
+        self.assertEqual(load.total, 5.0)
+        self.assertEqual(load.summary(), [('outer', 1, 5.0), ('inner', 1, 2.0)])
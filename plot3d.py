@@ -1,14 +1,24 @@
 import math
-from numpy import array, full, ones_like
+import os
+import time
+from collections import deque
+from numpy import array, arange, full, ones_like, ascontiguousarray, concatenate, column_stack, repeat, percentile
 import util
+import perf
+import memory
+import matrixlib
+from avlib import AVTables
 from tvtk.api import tvtk
 from mayavi import mlab
 from traits.api import HasTraits, Instance, on_trait_change
 from traitsui.api import View, Item
+from pyface.api import GUI
 from mayavi.core.ui.api import MayaviScene, MlabSceneModel, SceneEditor
 from mayavi.core.api import Engine
 from callout import Callout
-from const import GYPSY_PINK
+from const import GYPSY_PINK, MATRIX_TILE_THRESHOLD, MATRIX_TILE_SIZE, MATRIX_COARSE_FACTOR, PK_CONTOUR_LEVELS, \
+    POINT_RENDER_THRESHOLD, POINT_RENDER_SIZE, AV_GLYPH_SIZE, AV_GLYPH_MIN_SIZE, AV_GLYPH_MAX_SIZE, \
+    AV_HIGHLIGHT_SCALE, AV_DIM_SCALE, AV_HIGHLIGHT_CALLOUTS, SCENE_LAYERS, HUD_FRAME_WINDOW, EXPORT_MAX_RENDER_SIZE
 
 """
 Created on Wed Nov 27 10:37:08 2013
@@ -21,12 +31,75 @@ __doc__ = '''
     The AVs in AVFILE are plotted as small red spheres. 
     Target surfaces are plotted as wireframe quads.
     Blast volumes are plotted as spheres or double cylinders with sphere caps.
-    Matrix is a VTK rectilinear grid that can display either fixed- or exponential-size cells.
+    Matrix is a VTK rectilinear grid that can display either fixed- or exponential-size cells. Evenly spaced matrices
+    are drawn as VTK image data instead, and very large matrices are split into tiles that are only drawn at full
+    resolution while they are in view.
     Sample/burst points are displayed as small white spheres.
+    All 3D windows share one Mayavi engine, and target, blast volume and AV label geometry is cached by source file
+    so windows showing the same target share it.
 '''
 
 
 ######################################################################
+class MatrixTile(object):
+    """ One square section of a tiled matrix, holding its own slice of the PKs and gridlines. """
+    def __init__(self, pks, gridlines_range, gridlines_defl):
+        self.pks = pks
+        self.gridlines_range = gridlines_range
+        self.gridlines_defl = gridlines_defl
+        self.source = None
+        self.coarse_grid = None
+        self.full_grid = None
+        self.refined = False
+
+
+_engine = None
+_geometry = {}
+
+
+def get_engine():
+    """ All 3D windows share one Mayavi engine, each with its own scene. """
+    global _engine
+    if _engine is None:
+        _engine = Engine()
+        _engine.start()
+    return _engine
+
+
+def file_key(filename):
+    """ Identifies a source file by path and modification time, so an edited file isn't served from the cache. """
+    filename = os.path.abspath(filename)
+    return filename, os.path.getmtime(filename) if os.path.exists(filename) else None
+
+
+def shared_geometry(key, build):
+    """ Return the geometry cached under key, calling build() to make it the first time it's asked for.
+    Cached objects are shared by every window and must not be modified.
+    """
+    if key not in _geometry:
+        _geometry[key] = build()
+    return _geometry[key]
+
+
+def vtk_data_size(data, seen):
+    """ :return: bytes held by a VTK data set, or 0 if it was already counted in seen. """
+    data = tvtk.to_vtk(data) if data is not None else None
+    if data is None or data in seen or not hasattr(data, 'GetActualMemorySize'):
+        return 0
+    seen.add(data)
+    return data.GetActualMemorySize() * 1024
+
+
+def geometry_cache_size():
+    seen = set()
+    return sum(vtk_data_size(item, seen) if isinstance(item, tvtk.Object) else memory.sizeof(item, seen)
+               for item in _geometry.values())
+
+
+# dropping the cache only forgets the geometry; scenes still showing it keep their own references.
+memory.track_cache('Shared geometry', geometry_cache_size, _geometry.clear)
+
+
 class Visualization(HasTraits):
     scene = Instance(MlabSceneModel)
 
@@ -36,8 +109,7 @@ class Visualization(HasTraits):
 
     def __init__(self, **traits):
         super(HasTraits, self).__init__(**traits)
-        self.engine = Engine()
-        self.engine.start()
+        self.engine = get_engine()
 
     def _scene_default(self):
         return MlabSceneModel(engine=self.engine)
@@ -48,7 +120,11 @@ class Visualization(HasTraits):
 
 
 class Plotter(Visualization):
-    def __init__(self, model):
+    def __init__(self, model, matrix_tolerance=None):
+        """
+        :param model: DataModel of the case to show
+        :param matrix_tolerance: PK tolerance of the merged-cell matrix, or None to draw every cell
+        """
         super(Plotter, self).__init__()
         self.scale_defl, self.scale_range = 0.0, 0.0
         self.plot = None
@@ -58,80 +134,206 @@ class Plotter(Visualization):
         self.sel_x = []
         self.sel_y = []
         self.sel_z = []
-        self.burstpoint_array = None
+        self.burstpoint_mode = None
         self.burstpoint_glyphs = None
         self.outline = None
         self.axes = None
         self.selected_az = None
         self.radius_points = None
+        self.point_mask = None
+        self.point_values = None
         self.pid = None
         self.rgrid = None
         self.wgrid = None
         self.rgrid_array = None
+        self.matrix_image = None
+        self.matrix_poly = None
+        self.matrix_surfs = []
+        self.matrix_tiles = []
+        self.tile_corners = None
+        # this window's merged-cell matrix; other windows on the same case may merge cells differently.
+        self.pk_tree = model.get_pk_tree(matrix_tolerance)
+        self.contour_surf = None
+        self.contour_poly = None
+        self.contour_levels = None
+        self.frame_matrix = None  # (pks, gridlines_range, gridlines_defl) of a sweep frame on display
+        self.view_matrix = None  # the same for a matrix view
+        self.zone_meshes = {}
+        self.zone_poly = None
+        self.zone_source = None
+        self.zone_surf = None
+        self.shotline_poly = None
+        self.shotline_source = None
+        self.shotline_surf = None
         self.mtx_callout = None
         self.mun_callout = None
         self.av_callouts = []
         self.access_obj = None
         self.lut_table = None
+        self.target_key = None
+        self.av_key = None
+        self.av_glyphs = None
+        self.av_ids = []
+        self.av_aspect = None
+        self.av_sizes = None
+        self.av_colors = None
+        self.av_highlight = None
+        self.av_callouts_visible = False
+        self.blast_surfs = {}
+        self.munition_arrows = []
+        self.matrix_kind = None
+        self.view_grid = None
+        self.view_surf = None
+        self.build_queue = []
+        self.build_total = 0
+        self.progress_callback = None
+        self.frame_times = deque(maxlen=HUD_FRAME_WINDOW)
+        self.hud = None
+        self.hidden_layers = set()
+        self.hidden_callouts = set()
+        self.export_window = None
+        self.export_renderer = None
+        self.layer_lines = None  # HUD lines of the actor and polygon counts, recounted after the layers change
+        memory.track_scene(self)
 
+    @perf.timed()
     def plot_av(self):
-        """ Plot fragment vulnerable AVs as points (spheres) on the 3D scene."""
-        # TODO: plot AVs based on interpolation like JMAE (not just the nearest ones)
+        """ Plot fragment vulnerable AVs as points (spheres) on the 3D scene. They're drawn all the same until
+        color_av is given a fragment to size and color them by."""
         model = self.model
+        self.av_ids = sorted(model.frag_ids)
+        self.av_key = ('av labels', file_key(model.av_file), tuple(self.av_ids))
+        labels = shared_geometry(self.av_key, self.make_av_labels)
         x, y, z, sz, color = [], [], [], [], []
-        for i in model.frag_ids:
-            x.append(model.comps[i].x)
-            y.append(model.comps[i].y)
-            z.append(model.comps[i].z)
-            sz.append(0.3)
+        for title, (cx, cy, cz) in labels:
+            x.append(cx)
+            y.append(cy)
+            z.append(cz)
+            sz.append(AV_GLYPH_SIZE)
             color.append(1.0)
-            title = '{0} ({1},{2},{3})'.format(model.comps[i].name, x[-1], y[-1], z[-1])
             callout = Callout(title, justification='center', font_size=9, color=(1, 1, 1),
-                              position=(x[-1], y[-1], z[-1] + 0.5))
+                              position=(cx, cy, cz + 0.5))
             callout.visible = False
             self.av_callouts.append(callout)
             self.scene.add_actor(callout.actor)
-        pts = self.scene.mlab.quiver3d([x], [y], [z], [sz], [sz], [sz], name='component AV', colormap='blue-red',
-                                       scalars=color, mode='sphere', scale_factor=1)
+        pts = self.av_glyphs = self.scene.mlab.quiver3d([x], [y], [z], [sz], [sz], [sz], name='component AV',
+                                                        colormap='blue-red',
+                                                        scalars=color, mode='sphere', scale_factor=1,
+                                                        figure=self.scene.mayavi_scene)
         pts.module_manager.scalar_lut_manager.reverse_lut = True
         pts.glyph.color_mode = 'color_by_scalar'
         pts.glyph.glyph_source.glyph_source.center = (0, 0, 0)
+        self.av_sizes, self.av_colors = array(sz), array(color)
+        if self.av_aspect is not None:
+            self.color_av(*self.av_aspect)
+        elif self.av_highlight is not None:
+            self.highlight_av(self.av_highlight)
+
+    def color_av(self, az, el, mass, vel):
+        """ Size and color the AV components by their vulnerable area against one fragment, interpolated from the
+        AV tables like JMAE does. The largest AV in view gets the biggest, reddest sphere.
+
+        :param az: attack azimuth in degrees
+        :param el: attack elevation in degrees
+        :param mass: fragment mass
+        :param vel: fragment velocity
+        """
+        self.av_aspect = (az, el, mass, vel)
+        if self.av_glyphs is None or not self.av_ids:
+            return
+        model = self.model
+        # windows on the same AV file share one set of table arrays.
+        tables = shared_geometry(('av tables', file_key(model.av_file)), lambda: AVTables(model))
+        avs, _ = tables.evaluate(az, el, mass, vel)
+        table_idx = {comp_id: i for i, comp_id in reversed(list(enumerate(model.table_ids)))}
+        values = array([avs[table_idx[comp_id]] for comp_id in self.av_ids])
+        if values.max() > 0.0:
+            values /= values.max()
+        # sphere area follows AV, so the radius goes with its square root.
+        sz = AV_GLYPH_MIN_SIZE + (AV_GLYPH_MAX_SIZE - AV_GLYPH_MIN_SIZE) * values ** 0.5
+        self.set_av_glyphs(sz, values, fixed_range=True)
+
+    def clear_av_colors(self):
+        """ Put the AV components back to constant size and color. """
+        self.av_aspect = None
+        if self.av_glyphs is not None and self.av_ids:
+            self.set_av_glyphs(full(len(self.av_ids), AV_GLYPH_SIZE), full(len(self.av_ids), 1.0))
+
+    def set_av_glyphs(self, sz, color, fixed_range=False):
+        """ Update the AV sphere sizes and colors in place.
+        :param sz: sphere size of each component
+        :param color: color scalar of each component
+        :param fixed_range: True to map colors over 0-1 instead of the range of the scalars
+        """
+        lut_manager = self.av_glyphs.module_manager.scalar_lut_manager
+        lut_manager.use_default_range = not fixed_range
+        if fixed_range:
+            lut_manager.data_range = (0.0, 1.0)
+        self.av_sizes, self.av_colors = sz, color
+        self.highlight_av(self.av_highlight)
+
+    def highlight_av(self, comp_ids):
+        """ Make the spheres of some AV components stand out by growing them and shrinking the rest. Only the point
+        data of the AV glyph source changes; no actors are added. The callouts of a few matches are shown too.
+        :param comp_ids: set of component IDs to highlight, or None to show all of them normally
+        """
+        self.av_highlight = comp_ids
+        if self.av_glyphs is None or not self.av_ids:
+            return
+        sz = self.av_sizes
+        matched = array([cid in comp_ids for cid in self.av_ids]) if comp_ids is not None else None
+        if matched is not None:
+            sz = sz * (AV_DIM_SCALE + (AV_HIGHLIGHT_SCALE - AV_DIM_SCALE) * matched)
+        self.av_glyphs.mlab_source.set(u=[sz], v=[sz], w=[sz], scalars=[self.av_colors])
+        show_matches = matched is not None and matched.sum() <= AV_HIGHLIGHT_CALLOUTS
+        for i, c in enumerate(self.av_callouts):
+            c.visible = self.av_callouts_visible or (show_matches and bool(matched[i]))
+        self.layers_changed()
+        self.scene.render()
+
+    def make_av_labels(self):
+        """ :return: list of (callout text, (x, y, z)) for each frag AV component. """
+        comps = self.model.comps
+        return [('{0} ({1},{2},{3})'.format(comps[i].name, comps[i].x, comps[i].y, comps[i].z),
+                 (comps[i].x, comps[i].y, comps[i].z)) for i in sorted(self.model.frag_ids)]
 
     # noinspection SpellCheckingInspection
+    @perf.timed()
     def plot_srf_file(self):
         """ Reformat target model surfaces as a numpy array, and display them as wireframe polygons on the 3D scene. """
         model = self.model
-        polys = array([[4 * i, 4 * i + 1, 4 * i + 2, 4 * i + 3] for i in range(len(model.surfaces) // 4)])
-        poly_obj = tvtk.PolyData(points=model.surfaces, polys=polys)
-        self.target = mlab.pipeline.surface(poly_obj, name='target')
+
+        def build():
+            polys = array([[4 * i, 4 * i + 1, 4 * i + 2, 4 * i + 3] for i in range(len(model.surfaces) // 4)])
+            return tvtk.PolyData(points=model.surfaces, polys=polys)
+
+        # windows showing the same target share one polydata; each gets its own surface module on top of it.
+        self.target_key = ('target', file_key(model.srf_file))
+        poly_obj = shared_geometry(self.target_key, build)
+        self.target = mlab.pipeline.surface(poly_obj, name='target', figure=self.scene.mayavi_scene)
         self.target.actor.property.representation = 'wireframe'
         self.target.actor.property.color = (0, 0, 0)
         # save this table for later in case of frag zone plotting
         self.lut_table = self.target.module_manager.scalar_lut_manager.lut
 
     # noinspection SpellCheckingInspection
+    @perf.timed()
     def plot_matrix_file(self):
-        """ Show matrix as a VTK rectilinear grid at the munition burst height. """
+        """ Show matrix at the munition burst height. A merged-cell matrix is displayed as one quad per leaf,
+        evenly spaced gridlines as VTK image data, large uneven matrices as a set of tiles, and everything else as a
+        single VTK rectilinear grid. """
         model = self.model
-
-        # Define rectilinear grid according to the matrix gridlines.
-        # Set the single Z coordinate in the elevation array equal to the munition burst height.
-        elevations = full(1, model.burst_height)
-        x_dim, y_dim, z_dim = len(model.gridlines_range), len(model.gridlines_defl), len(elevations)
-        self.rgrid = tvtk.RectilinearGrid(x_coordinates=model.gridlines_range, y_coordinates=model.gridlines_defl,
-                                          z_coordinates=elevations, dimensions=(x_dim, y_dim, z_dim))
-        # Grid colors are displayed using an additional array (PKs).
-        # T transposes the 2D PK array to match the gridline cells and then
-        # ravel() flattens the 2D array to a 1D array for VTK use as scalars.
-        self.rgrid.cell_data.scalars = model.pks.T.ravel()
-        self.rgrid.cell_data.scalars.name = 'pks'
-        self.rgrid.cell_data.update()  # refreshes the grid now that a new array has been added.
-        p = tvtk.Property(color=(0, 0, 0))  # color only matters if we are using wireframe, but I left it in for ref.
-
-        # this method puts the surface in the Mayavi pipeline so the user can change it.
-        surf = self.scene.mlab.pipeline.surface(self.rgrid, name='matrix')
-        surf.actor.actor.property = p
-        surf.actor.update_data()
+        self.matrix_kind = self.get_matrix_kind()
+        if self.matrix_kind == 'quadtree':
+            self.plot_matrix_quadtree()
+        elif self.matrix_kind == 'image':
+            self.matrix_image = self._make_image()
+            self.matrix_surfs.append(self._add_matrix_surface(self.matrix_image, 'matrix'))
+        elif self.matrix_kind == 'tiles':
+            self.plot_matrix_tiles()
+        else:
+            self.rgrid = self._make_rgrid(model.pks, model.gridlines_range, model.gridlines_defl)
+            self.matrix_surfs.append(self._add_matrix_surface(self.rgrid, 'matrix'))
 
         # gridlines added at JJS request, but they make the scene look fairly bad, so I'm commenting them out.
         # wgrid_height = full(1, model.burst_height+0.1)
@@ -142,211 +344,934 @@ class Plotter(Visualization):
         # surf.actor.actor.property = wf
         # surf.actor.update_data()
 
-        # give PK colorbar a range between 0 and 1. The default is to use the min/max values in the array,
-        # which would give us a custom range every time and make it harder for the user to consistently identify what
-        # the colors mean.
-        surf.module_manager.scalar_lut_manager.use_default_range = False
-        surf.module_manager.scalar_lut_manager.data_range = array([0., 1.])
-        self.scene.mlab.colorbar(surf, title='Cell Pk', orientation='vertical')
+        self.scene.mlab.colorbar(self.matrix_surfs[0], title='Cell Pk', orientation='vertical')
+
+        self.plot_matrix_callout()
 
-        # Put max and min gridline coordinates in the upper-right corner of the matrix.
-        # Also, scale the text to a readable size.
+    @perf.timed()
+    def plot_matrix_callout(self):
+        """ Put max and min gridline coordinates in the upper-right corner of the matrix. """
+        model = self.model
+        # scale the text to a readable size.
         sz = max(1, int(abs(model.gridlines_range[-1] - model.gridlines_range[0]) / 100))
         spacing = max(5, sz)
         text = 'Matrix range: (%5.1f, %5.1f)\nMatrix defl: (%5.1f, %5.1f)' % (model.mtx_extent_range[0],
                                                                               model.mtx_extent_range[1],
                                                                               model.mtx_extent_defl[0],
                                                                               model.mtx_extent_defl[1])
-        self.mtx_callout = Callout(text, justification='left', font_size=18, color=(1, 1, 1),
-                                   position=(model.gridlines_range[-1], model.gridlines_defl[0], 4 * spacing))
-        self.scene.add_actor(self.mtx_callout.actor)
+        position = (model.gridlines_range[-1], model.gridlines_defl[0], 4 * spacing)
+        if self.mtx_callout is None:
+            self.mtx_callout = Callout(text, justification='left', font_size=18, color=(1, 1, 1), position=position)
+            self.scene.add_actor(self.mtx_callout.actor)
+        else:
+            self.mtx_callout.text = text
+            self.mtx_callout.position = position
+            self.mtx_callout.visible = True
+
+    def get_matrix_kind(self):
+        """ :return: how the current matrix is drawn: 'quadtree', 'image', 'tiles' or 'rgrid'. """
+        model = self.model
+        if self.pk_tree is not None:
+            return 'quadtree'
+        elif (matrixlib.uniform_spacing(model.gridlines_range) is not None and
+              matrixlib.uniform_spacing(model.gridlines_defl) is not None):
+            return 'image'
+        elif model.pks.size > MATRIX_TILE_THRESHOLD:
+            return 'tiles'
+        return 'rgrid'
+
+    def _make_rgrid(self, pks, gridlines_range, gridlines_defl):
+        """ Define rectilinear grid according to the matrix gridlines.
+        Set the single Z coordinate in the elevation array equal to the munition burst height. """
+        elevations = full(1, self.model.burst_height)
+        x_dim, y_dim, z_dim = len(gridlines_range), len(gridlines_defl), len(elevations)
+        rgrid = tvtk.RectilinearGrid(x_coordinates=gridlines_range, y_coordinates=gridlines_defl,
+                                     z_coordinates=elevations, dimensions=(x_dim, y_dim, z_dim))
+        # Grid colors are displayed using an additional array (PKs).
+        # T transposes the 2D PK array to match the gridline cells and then
+        # ravel() flattens the 2D array to a 1D array for VTK use as scalars.
+        rgrid.cell_data.scalars = pks.T.ravel()
+        rgrid.cell_data.scalars.name = 'pks'
+        rgrid.cell_data.update()  # refreshes the grid now that a new array has been added.
+        return rgrid
+
+    def _add_matrix_surface(self, data, name):
+        """ Adds a matrix dataset (or a Mayavi source holding one) to the scene with the standard PK coloring. """
+        # this method puts the surface in the Mayavi pipeline so the user can change it.
+        surf = self.scene.mlab.pipeline.surface(data, name=name, figure=self.scene.mayavi_scene)
+        # color only matters if we are using wireframe, but I left it in for ref.
+        surf.actor.actor.property = tvtk.Property(color=(0, 0, 0))
+        surf.actor.update_data()
+        # give PK colorbar a range between 0 and 1. The default is to use the min/max values in the array,
+        # which would give us a custom range every time and make it harder for the user to consistently identify what
+        # the colors mean.
+        surf.module_manager.scalar_lut_manager.use_default_range = False
+        surf.module_manager.scalar_lut_manager.data_range = array([0., 1.])
+        return surf
 
+    def _make_image(self):
+        """ Evenly spaced gridlines only need an origin and a spacing, so the matrix is stored as VTK image data
+        instead of a rectilinear grid. This skips the coordinate arrays and lets VTK use its faster image paths. """
+        model = self.model
+        step_range = matrixlib.uniform_spacing(model.gridlines_range)
+        step_defl = matrixlib.uniform_spacing(model.gridlines_defl)
+        # image data always runs from the minimum corner upward, so flip the PKs along any descending axis.
+        pks = model.pks
+        if step_range < 0:
+            pks = pks[::-1, :]
+        if step_defl < 0:
+            pks = pks[:, ::-1]
+        image = tvtk.ImageData(origin=(min(model.gridlines_range), min(model.gridlines_defl), model.burst_height),
+                               spacing=(abs(step_range), abs(step_defl), 1.0),
+                               dimensions=(len(model.gridlines_range), len(model.gridlines_defl), 1))
+        image.cell_data.scalars = ascontiguousarray(pks.T).ravel()
+        image.cell_data.scalars.name = 'pks'
+        image.cell_data.update()
+        return image
+
+    @perf.timed()
+    def plot_matrix_quadtree(self):
+        """ Draw the merged-cell matrix from DataModel.get_pk_tree, with one quad polygon per leaf. """
+        model = self.model
+        tree = self.pk_tree
+        polys = arange(4 * len(tree)).reshape(-1, 4)
+        self.matrix_poly = tvtk.PolyData(points=tree.quads(model.gridlines_range, model.gridlines_defl,
+                                                           model.burst_height), polys=polys)
+        self.matrix_poly.cell_data.scalars = tree.pk
+        self.matrix_poly.cell_data.scalars.name = 'pks'
+        self.matrix_poly.cell_data.update()
+        self.matrix_surfs.append(self._add_matrix_surface(self.matrix_poly, 'matrix'))
+
+    @perf.timed()
+    def plot_matrix_tiles(self):
+        """ Split a large matrix into square tiles. Each tile starts out as a coarse grid, and is swapped for its
+        full resolution grid by refine_matrix_tiles when it comes into view. """
+        model = self.model
+        gr, gd = array(model.gridlines_range), array(model.gridlines_defl)
+        for r0, r1, d0, d1 in matrixlib.tile_bounds(model.pks.shape[0], model.pks.shape[1], MATRIX_TILE_SIZE):
+            tile = MatrixTile(model.pks[r0:r1, d0:d1], gr[r0:r1 + 1], gd[d0:d1 + 1])
+            coarse_pks, coarse_range, coarse_defl = matrixlib.coarsen(tile.pks, tile.gridlines_range,
+                                                                      tile.gridlines_defl, MATRIX_COARSE_FACTOR)
+            tile.source = self.scene.mlab.pipeline.add_dataset(self._make_rgrid(coarse_pks, coarse_range,
+                                                                                 coarse_defl),
+                                                               name='matrix tile %d-%d' % (r0, d0),
+                                                               figure=self.scene.mayavi_scene)
+            self.matrix_surfs.append(self._add_matrix_surface(tile.source, 'matrix'))
+            self.matrix_tiles.append(tile)
+        z = model.burst_height
+        self.tile_corners = array([[(t.gridlines_range[0], t.gridlines_defl[0], z),
+                                    (t.gridlines_range[-1], t.gridlines_defl[0], z),
+                                    (t.gridlines_range[-1], t.gridlines_defl[-1], z),
+                                    (t.gridlines_range[0], t.gridlines_defl[-1], z)] for t in self.matrix_tiles])
+
+    @perf.timed()
+    def refine_matrix_tiles(self):
+        """ Show tiles that are in view and large enough on screen at full resolution, and the rest at low
+        resolution. Called whenever the camera stops moving. """
+        if not self.matrix_tiles:
+            return
+        renderer = self.scene.renderer
+        matrix = self.scene.camera.get_composite_projection_transform_matrix(renderer.tiled_aspect_ratio, -1, 1)
+        in_view, ndc_size = matrixlib.project_tiles(self.tile_corners, matrix.to_array())
+        # a tile is only worth refining if its coarse cells would be drawn larger than a couple of pixels.
+        pixels = (ndc_size * array(renderer.size) / 2.0).max(axis=1)
+        changed = False
+        for tile, visible, px in zip(self.matrix_tiles, in_view, pixels):
+            refine = bool(visible and px > 2.0 * max(tile.pks.shape) / MATRIX_COARSE_FACTOR)
+            if tile.refined == refine:
+                continue
+            if refine:
+                if tile.full_grid is None:  # built on first use, since most tiles may never be looked at closely.
+                    tile.full_grid = self._make_rgrid(tile.pks, tile.gridlines_range, tile.gridlines_defl)
+                tile.coarse_grid = tile.source.data
+                tile.source.data = tile.full_grid
+            else:
+                tile.source.data = tile.coarse_grid
+            tile.refined = refine
+            changed = True
+        if changed:
+            self.layers_changed()
+            self.scene.render()
+
+    @perf.timed()
+    def plot_matrix_contours(self, levels=PK_CONTOUR_LEVELS, pks=None):
+        """ Draw the iso-PK lines for each level as one polyline actor floating just above the matrix. The lines are
+        colored with the same PK scale as the matrix cells.
+        :param levels: PK levels to draw
+        :param pks: PKs to contour instead of the model's, on the same gridlines
+        """
+        self.contour_levels = levels
+        self.contour_poly = tvtk.PolyData()
+        self._set_contour_lines(self.model.pks if pks is None else pks)
+        self.contour_surf = self.scene.mlab.pipeline.surface(self.contour_poly, name='pk contours', line_width=3,
+                                                             figure=self.scene.mayavi_scene)
+        self.contour_surf.module_manager.scalar_lut_manager.use_default_range = False
+        self.contour_surf.module_manager.scalar_lut_manager.data_range = array([0., 1.])
+
+    def _set_contour_lines(self, pks):
+        """ Fill the contour polydata with the iso-PK lines of pks, which are in model order on the model's
+        gridlines. """
+        model = self.model
+        x = matrixlib.cell_centers(model.gridlines_range)
+        y = matrixlib.cell_centers(model.gridlines_defl)
+        segments = [matrixlib.contour_segments(pks, x, y, level) for level in self.contour_levels]
+        counts = [len(seg) for seg in segments]
+        xy = concatenate(segments).reshape(-1, 2)
+        # lift the lines a little above the grid so they don't fight with the matrix cells for the same pixels.
+        poly = self.contour_poly
+        poly.points = column_stack([xy, full(len(xy), model.burst_height + 0.05)])
+        poly.lines = arange(len(xy)).reshape(-1, 2)
+        poly.point_data.scalars = repeat(array(self.contour_levels, dtype=float), [2 * n for n in counts])
+        poly.point_data.scalars.name = 'contour pks'
+        poly.point_data.update()
+
+    def set_matrix_contours_visible(self, is_visible):
+        """ Show/hide the iso-PK lines, which are only built the first time they're shown. """
+        if self.contour_surf is None:
+            if not is_visible or self.model.pks is None:
+                return
+            self.plot_matrix_contours()
+        self.contour_surf.visible = is_visible
+        self.layers_changed()
+
+    def set_matrix_cells_visible(self, is_visible):
+        """ Show/hide the matrix cells. Hiding them while the contours are shown saves most of the draw cost on
+        huge matrices. """
+        for surf in self.matrix_surfs:
+            surf.visible = is_visible
+        self.layers_changed()
+
+    def show_matrix_view(self, pks, gridlines_range, gridlines_defl, title, diverging=False):
+        """ Draw a matrix derived from several cases (a mean, max or difference) in place of the case matrix.
+        The view grid is made once and its data swapped on later calls.
+        :param pks: 2D PK array indexed as [range, defl]
+        :param gridlines_range: range gridlines of pks
+        :param gridlines_defl: deflection gridlines of pks
+        :param title: colorbar title
+        :param diverging: color the PKs on a -1 to 1 scale, for differences
+        """
+        rgrid = self._make_rgrid(pks, gridlines_range, gridlines_defl)
+        # the view has its own grid, so picking has to look its cells up there rather than in the case.
+        self.view_matrix = (pks, array(gridlines_range), array(gridlines_defl))
+        if self.view_surf is None:
+            self.view_grid = rgrid
+            self.view_surf = self._add_matrix_surface(rgrid, 'matrix view')
+        else:
+            self.view_grid.shallow_copy(rgrid)
+            self.view_grid.modified()
+        lut_manager = self.view_surf.module_manager.scalar_lut_manager
+        lut_manager.lut_mode = 'RdBu' if diverging else 'blue-red'
+        lut_manager.reverse_lut = diverging  # keep higher PKs red either way
+        lut_manager.data_range = array([-1., 1.]) if diverging else array([0., 1.])
+        self.scene.mlab.colorbar(self.view_surf, title=title, orientation='vertical')
+        if self.matrix_surfs:
+            self.matrix_surfs[0].module_manager.scalar_lut_manager.show_scalar_bar = False
+        for surf in self.matrix_surfs:
+            surf.visible = False
+        self.view_surf.visible = True
+        self.layers_changed()
+        self.scene.render()
+
+    def hide_matrix_view(self):
+        """ Go back to showing the case matrix. """
+        if self.view_surf is None or not self.view_surf.visible:
+            return
+        self.view_surf.visible = False
+        self.view_matrix = None
+        self.view_surf.module_manager.scalar_lut_manager.show_scalar_bar = False
+        if self.matrix_surfs:
+            self.matrix_surfs[0].module_manager.scalar_lut_manager.show_scalar_bar = True
+        for surf in self.matrix_surfs:
+            surf.visible = True
+        self.layers_changed()
+        self.scene.render()
+
+    def can_set_matrix_pks(self):
+        """ :return: True if the matrix is drawn as a single grid whose PKs can be replaced in place. """
+        return self.matrix_kind in ('rgrid', 'image')
+
+    def set_matrix_pks(self, pks):
+        """ Copy new PKs into the scalars of the matrix on display, e.g. for a sweep frame. Nothing in the scene is
+        rebuilt, so this is cheap enough to call every animation frame.
+        :param pks: 2D PK array on the same gridlines as the model's matrix
+        """
+        cell_pks = pks
+        if self.matrix_kind == 'rgrid':
+            data = self.rgrid
+        elif self.matrix_kind == 'image':
+            data = self.matrix_image
+            # image data runs from the minimum corner upward, the same flips as in _make_image.
+            if matrixlib.uniform_spacing(self.model.gridlines_range) < 0:
+                cell_pks = cell_pks[::-1, :]
+            if matrixlib.uniform_spacing(self.model.gridlines_defl) < 0:
+                cell_pks = cell_pks[:, ::-1]
+        else:
+            return
+        # picking reads the cells of the frame on display rather than the case.
+        self.frame_matrix = (pks, array(self.model.gridlines_range), array(self.model.gridlines_defl))
+        scalars = data.cell_data.scalars
+        scalars.to_array()[:] = cell_pks.T.ravel()
+        scalars.modified()
+        data.modified()
+        if self.contour_surf is not None and self.contour_surf.visible:
+            # the iso-PK lines follow the frame, refilled in place from the model-order PKs.
+            self._set_contour_lines(pks)
+            self.contour_surf.module_manager.source.update()
+            self.layers_changed()
+        self.scene.render()
+
+    def clear_frame(self):
+        """ Forget the sweep frame once the case's own PKs are back on display. """
+        self.frame_matrix = None
+
+    def get_shown_matrix(self):
+        """ :return: (pks, gridlines_range, gridlines_defl) of the matrix on display when it isn't the case's own
+                 (a matrix view or a sweep frame), or None. """
+        return self.view_matrix if self.view_matrix is not None else self.frame_matrix
+
+    def get_zone_mesh(self, lower_angle, upper_angle):
+        """ Returns the (points, triangles) arrays of a unit-radius frag zone band between the two angles. Each band
+        is generated once and cached, since the same zone angles come up for every burstpoint and azimuth. """
+        key = (lower_angle, upper_angle)
+        if key not in self.zone_meshes:
+            # the center is (0, 0, 0) so rotation occurs about the origin first, then translation at the end.
+            zone = tvtk.SphereSource(center=(0, 0, 0), radius=1.0, start_phi=lower_angle, end_phi=upper_angle,
+                                     phi_resolution=50, theta_resolution=50)
+            zone.update()
+            # sphere sources are made of triangles only, so each cell in the connectivity array is [3, i, j, k].
+            self.zone_meshes[key] = (zone.output.points.to_array(),
+                                     zone.output.polys.to_array().reshape(-1, 4)[:, 1:])
+        return self.zone_meshes[key]
+
+    def update_frag_zones(self, points, triangles, pks):
+        """ Replace the geometry of the frag zone actor with the given shells, colored per cell by component PK.
+        The actor is created on first use and reused for every burstpoint after that. """
+        if self.zone_poly is None:
+            self.zone_poly = tvtk.PolyData(points=points, polys=triangles)
+            self.zone_poly.cell_data.scalars = pks
+            self.zone_poly.cell_data.scalars.name = 'zone pks'
+            self.zone_source = self.scene.mlab.pipeline.add_dataset(self.zone_poly, name='frag zones',
+                                                                    figure=self.scene.mayavi_scene)
+            self.zone_surf = self.scene.mlab.pipeline.surface(self.zone_source, opacity=0.5, reset_zoom=False)
+            # A color lookup table was saved when the scene was generated, and here I use it to match the same
+            # color scheme as the rest of the PKs.
+            lut_manager = self.zone_surf.module_manager.scalar_lut_manager
+            lut_manager.lut.table = self.lut_table.table.to_array()
+            lut_manager.use_default_range = False
+            lut_manager.data_range = array(self.lut_table.table_range)
+        else:
+            self.zone_poly.points = points
+            self.zone_poly.polys = triangles
+            self.zone_poly.cell_data.scalars = pks
+            self.zone_poly.cell_data.scalars.name = 'zone pks'
+            self.zone_source.update()
+        self.zone_surf.visible = True
+        self.layers_changed()
+
+    def show_shotlines(self, ends, blocked):
+        """ Draw shotlines as one polyline actor, blue where the line of sight is clear and red where a surface is in
+        the way. Like the frag zones, the actor is made once and its data is replaced after that.
+        :param ends: (N, 2, 3) array of shotline end points
+        :param blocked: (N,) boolean array, True for obstructed shotlines
+        """
+        num_lines = len(ends)
+        points = concatenate([ends[:, 0], ends[:, 1]])
+        lines = column_stack([arange(num_lines), arange(num_lines) + num_lines])
+        if self.shotline_poly is None:
+            self.shotline_poly = tvtk.PolyData(points=points, lines=lines)
+            self.shotline_poly.cell_data.scalars = blocked.astype(float)
+            self.shotline_poly.cell_data.scalars.name = 'blocked'
+            self.shotline_source = self.scene.mlab.pipeline.add_dataset(self.shotline_poly, name='shotlines',
+                                                                        figure=self.scene.mayavi_scene)
+            self.shotline_surf = self.scene.mlab.pipeline.surface(self.shotline_source, reset_zoom=False)
+            lut_manager = self.shotline_surf.module_manager.scalar_lut_manager
+            lut_manager.use_default_range = False
+            lut_manager.data_range = array([0., 1.])
+        else:
+            self.shotline_poly.points = points
+            self.shotline_poly.lines = lines
+            self.shotline_poly.cell_data.scalars = blocked.astype(float)
+            self.shotline_poly.cell_data.scalars.name = 'blocked'
+            self.shotline_source.update()
+        self.shotline_surf.visible = True
+
+    def hide_shotlines(self):
+        if self.shotline_surf is not None:
+            self.shotline_surf.visible = False
+
+    @perf.timed()
     def plot_blast_volumes(self):
+        """ Plot the blast volumes of the current model. Volumes that are already on the scene are kept, and ones that
+        are no longer part of the model are removed, so this is also how a window switches to another case. """
         model = self.model
         p = tvtk.Property(opacity=0.25, color=GYPSY_PINK)
+        keys = {}
         for bidx in model.blast_ids:
             comp = model.comps[bidx]
-            r1, r2, r3, z1, z2 = model.blast_vol[bidx]
-            if r1 == 0 and r2 == 0 and z1 == 0:
-                # blast sphere
-                source_obj = mlab.pipeline.builtin_surface()
-                source_obj.source = 'sphere'
-                source_obj.data_source.center = (comp.x, comp.y, z2)
-                source_obj.data_source.radius = r3
-                source_obj.data_source.phi_resolution = 50
-                source_obj.data_source.theta_resolution = 50
-                # adding TVTK poly to Mayavi pipeline will do all the rest of the setup necessary to view the volume
-                surf = mlab.pipeline.surface(source_obj, name='blast sphere %s' % comp.name)
-                surf.actor.actor.property = p  # add color
-            else:
-                # double cylinder merged with sphere cap
-                cap = tvtk.SphereSource(center=(0, 0, 0), radius=r3, start_theta=0,
-                                        end_theta=180, phi_resolution=50, theta_resolution=50)
+            keys[('blast', file_key(model.av_file), comp.x, comp.y, tuple(model.blast_vol[bidx]))] = comp
+        for key in set(self.blast_surfs) - set(keys):
+            self._remove(self.blast_surfs.pop(key))
+        for key, comp in keys.items():
+            if key in self.blast_surfs:
+                continue
+            vol = key[-1]
+            r1, r2, _, z1, _ = vol
+            kind = 'sphere' if r1 == 0 and r2 == 0 and z1 == 0 else 'volume'
+            # the same component volume is the same mesh in every window, whatever the burst height.
+            mesh = shared_geometry(key, lambda: self.make_blast_mesh(comp.x, comp.y, vol))
+            # adding TVTK poly to Mayavi pipeline will do all the rest of the setup necessary to view the volume
+            surf = mlab.pipeline.surface(mesh, name='blast %s %s' % (kind, comp.name), figure=self.scene.mayavi_scene)
+            surf.actor.actor.property = p  # add color
+            self.blast_surfs[key] = surf
+
+    @staticmethod
+    def make_blast_mesh(x, y, vol):
+        """
+        :param x: X location of the blast component
+        :param y: Y location of the blast component
+        :param vol: (r1, r2, r3, z1, z2) blast volume parameters
+        :return: PolyData of the blast sphere, or of the double cylinder merged with a sphere cap.
+        """
+        r1, r2, r3, z1, z2 = vol
+        if r1 == 0 and r2 == 0 and z1 == 0:
+            # blast sphere
+            source_obj = tvtk.SphereSource(center=(x, y, z2), radius=r3, phi_resolution=50, theta_resolution=50)
+            source_obj.update()
+        else:
+            # double cylinder merged with sphere cap
+            cap = tvtk.SphereSource(center=(0, 0, 0), radius=r3, start_theta=0,
+                                    end_theta=180, phi_resolution=50, theta_resolution=50)
+            t = tvtk.Transform()
+            t.translate(x, y, z2)
+            t.rotate_x(90.0)
+            cap_tf = tvtk.TransformPolyDataFilter(input_connection=cap.output_port, transform=t)
+            cap_tf.update()
+            upper_cyl_height = r3 + z2 - z1
+            source_obj = tvtk.AppendPolyData()
+            if upper_cyl_height > 0.0:  # handle both upper cylinder with sphere cap, plus lower cylinder
+                upper_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r2, height=upper_cyl_height, resolution=50)
+                t = tvtk.Transform()
+                t.translate(x, y, upper_cyl_height / 2.0)
+                t.rotate_x(90.0)
+                upper_tf = tvtk.TransformPolyDataFilter(input_connection=upper_cyl.output_port, transform=t)
+                upper_tf.update()
+                tri1 = tvtk.TriangleFilter(input_connection=cap_tf.output_port)
+                tri2 = tvtk.TriangleFilter(input_connection=upper_tf.output_port)
+                cap_slice = tvtk.BooleanOperationPolyDataFilter()
+                cap_slice.operation = 'difference'
+                cap_slice.add_input_connection(0, tri1.output_port)
+                cap_slice.add_input_connection(1, tri2.output_port)
+                cap_slice.update()
+                lower_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r1, height=z1, resolution=50)
                 t = tvtk.Transform()
-                t.translate(comp.x, comp.y, z2)
+                t.translate(x, y, z1 / 2.0 + 0.01)
                 t.rotate_x(90.0)
-                cap_tf = tvtk.TransformPolyDataFilter(input_connection=cap.output_port, transform=t)
-                cap_tf.update()
-                upper_cyl_height = r3 + z2 - z1
-                source_obj = tvtk.AppendPolyData()
-                if upper_cyl_height > 0.0:  # handle both upper cylinder with sphere cap, plus lower cylinder
-                    upper_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r2, height=upper_cyl_height, resolution=50)
-                    t = tvtk.Transform()
-                    t.translate(comp.x, comp.y, upper_cyl_height / 2.0)
-                    t.rotate_x(90.0)
-                    upper_tf = tvtk.TransformPolyDataFilter(input_connection=upper_cyl.output_port, transform=t)
-                    upper_tf.update()
-                    tri1 = tvtk.TriangleFilter(input_connection=cap_tf.output_port)
-                    tri2 = tvtk.TriangleFilter(input_connection=upper_tf.output_port)
-                    cap_slice = tvtk.BooleanOperationPolyDataFilter()
-                    cap_slice.operation = 'difference'
-                    cap_slice.add_input_connection(0, tri1.output_port)
-                    cap_slice.add_input_connection(1, tri2.output_port)
-                    cap_slice.update()
-                    lower_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r1, height=z1, resolution=50)
-                    t = tvtk.Transform()
-                    t.translate(comp.x, comp.y, z1 / 2.0 + 0.01)
-                    t.rotate_x(90.0)
-                    lower_tf = tvtk.TransformPolyDataFilter(input_connection=lower_cyl.output_port, transform=t)
-                    lower_tf.update()
-                    tri3 = tvtk.TriangleFilter(input_connection=cap_slice.output_port)
-                    tri4 = tvtk.TriangleFilter(input_connection=lower_tf.output_port)
-                    upper_cyl_plus_cap = tvtk.BooleanOperationPolyDataFilter()
-                    upper_cyl_plus_cap.operation = 'difference'
-                    upper_cyl_plus_cap.add_input_connection(0, tri3.output_port)
-                    upper_cyl_plus_cap.add_input_connection(1, tri4.output_port)
-                    upper_cyl_plus_cap.update()
-                    source_obj.add_input_connection(upper_cyl_plus_cap.output_port)
-                    source_obj.add_input_connection(lower_tf.output_port)
-                    source_obj.update()
-                else:  # lower cylinder only, intersected with sphere cap
-                    lower_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r1, height=z1, resolution=50)
-                    t = tvtk.Transform()
-                    t.translate(comp.x, comp.y, z1 / 2)
-                    t.rotate_x(90.0)
-                    lower_tf = tvtk.TransformPolyDataFilter(input_connection=lower_cyl.output_port, transform=t)
-                    lower_tf.update()
-                    tri1 = tvtk.TriangleFilter(input_connection=cap_tf.output_port)
-                    tri2 = tvtk.TriangleFilter(input_connection=lower_tf.output_port)
-                    boolean_op = tvtk.BooleanOperationPolyDataFilter()
-                    boolean_op.operation = 'difference'
-                    boolean_op.add_input_connection(0, tri1.output_port)
-                    boolean_op.add_input_connection(1, tri2.output_port)
-                    boolean_op.update()
-                    source_obj.add_input_connection(lower_tf.output_port)
-                    source_obj.add_input_connection(boolean_op.output_port)
-                    source_obj.update()
-                # adding TVTK poly to Mayavi pipeline will do all the rest of the setup necessary to view the volume
-                surf = mlab.pipeline.surface(source_obj.output, name='blast volume %s' % comp.name)
-                surf.actor.actor.property = p  # add color
+                lower_tf = tvtk.TransformPolyDataFilter(input_connection=lower_cyl.output_port, transform=t)
+                lower_tf.update()
+                tri3 = tvtk.TriangleFilter(input_connection=cap_slice.output_port)
+                tri4 = tvtk.TriangleFilter(input_connection=lower_tf.output_port)
+                upper_cyl_plus_cap = tvtk.BooleanOperationPolyDataFilter()
+                upper_cyl_plus_cap.operation = 'difference'
+                upper_cyl_plus_cap.add_input_connection(0, tri3.output_port)
+                upper_cyl_plus_cap.add_input_connection(1, tri4.output_port)
+                upper_cyl_plus_cap.update()
+                source_obj.add_input_connection(upper_cyl_plus_cap.output_port)
+                source_obj.add_input_connection(lower_tf.output_port)
+                source_obj.update()
+            else:  # lower cylinder only, intersected with sphere cap
+                lower_cyl = tvtk.CylinderSource(center=(0, 0, 0), radius=r1, height=z1, resolution=50)
+                t = tvtk.Transform()
+                t.translate(x, y, z1 / 2)
+                t.rotate_x(90.0)
+                lower_tf = tvtk.TransformPolyDataFilter(input_connection=lower_cyl.output_port, transform=t)
+                lower_tf.update()
+                tri1 = tvtk.TriangleFilter(input_connection=cap_tf.output_port)
+                tri2 = tvtk.TriangleFilter(input_connection=lower_tf.output_port)
+                boolean_op = tvtk.BooleanOperationPolyDataFilter()
+                boolean_op.operation = 'difference'
+                boolean_op.add_input_connection(0, tri1.output_port)
+                boolean_op.add_input_connection(1, tri2.output_port)
+                boolean_op.update()
+                source_obj.add_input_connection(lower_tf.output_port)
+                source_obj.add_input_connection(boolean_op.output_port)
+                source_obj.update()
+        # copy the result so the cached mesh doesn't hold on to the filter pipeline that made it.
+        mesh = tvtk.PolyData()
+        mesh.deep_copy(source_obj.output)
+        return mesh
 
+    @perf.timed()
     def plot_munition(self):
         """ Plot an arrow showing direction of incoming munition and display text showing angle of fall,
-        attack azimuth and terminal velocity. """
+        attack azimuth and terminal velocity. Arrows and callout that are already on the scene are moved in place. """
         model = self.model
 
-        # calculate scaling size for matrix range and deflection text.
-        # allow for a missing matrix file by checking to see whether gridlines exist first.
-        if model.gridlines_range:
-            sz = max(1, int(abs(model.gridlines_range[-1] - model.gridlines_range[0]) / 1000),
-                     int(abs(model.gridlines_defl[-1] - model.gridlines_defl[0]) / 1000))
-        else:
-            sz = 1
-
         # position arrow position outside of target, using both maximum radius and matrix offset.
         line_scale = 15
         zloc = model.burst_height + line_scale * math.sin(math.radians(model.aof))
 
         if not model.az_averaging:
-            xv, yv, zv = util.rotate_pt_around_yz_axes(1.0, 0.0, 0.0, model.aof, model.attack_az)
-
+            azimuths = [model.attack_az]
+            format_str = '{0} deg AOF\n{1}° deg attack azimuth\n{2} ft/s terminal velocity\n{3} ft. burst height'
+        else:  # azimuth averaged case
+            # plot arrows showing incoming AOF for each azimuth
+            azimuths = list(range(0, 360, int(model.attack_az)))
+            format_str = '{0} deg AOF\nAvg attack az - {1} deg inc.\n{2} ft/s terminal velocity\n'
+            format_str += '{3} fr. burst height'
+        for i, az in enumerate(azimuths):
             # rotate unit vector into position of munition attack_az and aof
-            xloc, yloc, _ = util.rotate_pt_around_yz_axes(-1.0, 0.0, 0.0, model.aof, model.attack_az)
+            xv, yv, zv = util.rotate_pt_around_yz_axes(1.0, 0.0, 0.0, model.aof, az)
+            xloc, yloc, _ = util.rotate_pt_around_yz_axes(-1.0, 0.0, 0.0, model.aof, az)
             xloc *= model.volume_radius
             yloc *= model.volume_radius
 
             # rotate arrow into correct position
-            mlab.quiver3d([xloc], [yloc], [zloc], [xv], [yv], [zv], color=(1, 1, 1), reset_zoom=False,
-                          scale_factor=15, name='munition')
-            # label arrow with text describing terminal conditions
-            format_str = '{0} deg AOF\n{1}° deg attack azimuth\n{2} ft/s terminal velocity\n{3} ft. burst height'
-            label = format_str.format(model.aof, model.attack_az, model.term_vel, model.burst_height)
-            self.mun_callout = Callout(label, justification='left', font_size=14, color=(1, 1, 1),
-                                       position=(xloc, yloc, zloc + 3))
-            self.scene.add_actor(self.mun_callout.actor)
-        else:  # azimuth averaged case
-            # plot arrows showing incoming AOF for each azimuth
-            for az in range(0, 360, int(model.attack_az)):
-                xv, yv, zv = util.rotate_pt_around_yz_axes(1.0, 0.0, 0.0, model.aof, az)
-
-                # rotate arrow into correct position
-                xloc, yloc, _ = util.rotate_pt_around_yz_axes(-1.0, 0.0, 0.0, model.aof, az)
-                xloc *= model.volume_radius
-                yloc *= model.volume_radius
-                self.scene.mlab.quiver3d([xloc], [yloc], [zloc], [xv], [yv], [zv], color=(1, 1, 1), reset_zoom=False,
-                                         scale_factor=15, name='munition %d deg' % az)
-                if az == 0:
-                    # display one callout showing terminal conditions above the 0 degree azimuth arrow.
-                    format_str = '{0} deg AOF\nAvg attack az - {1} deg inc.\n{2} ft/s terminal velocity\n'
-                    format_str += '{3} fr. burst height'
-                    label = format_str.format(model.aof, model.attack_az, model.term_vel, model.burst_height)
+            if i < len(self.munition_arrows):
+                self.munition_arrows[i].mlab_source.set(x=[xloc], y=[yloc], z=[zloc], u=[xv], v=[yv], w=[zv])
+            else:
+                name = 'munition %d deg' % az if model.az_averaging else 'munition'
+                self.munition_arrows.append(self.scene.mlab.quiver3d([xloc], [yloc], [zloc], [xv], [yv], [zv],
+                                                                     color=(1, 1, 1), reset_zoom=False,
+                                                                     scale_factor=15, name=name,
+                                                                     figure=self.scene.mayavi_scene))
+            if i == 0:
+                # label the first arrow (0 degrees when azimuth averaging) with text describing terminal conditions
+                label = format_str.format(model.aof, model.attack_az, model.term_vel, model.burst_height)
+                if self.mun_callout is None:
                     self.mun_callout = Callout(label, justification='left', font_size=14, color=(1, 1, 1),
                                                position=(xloc, yloc, zloc + 3))
                     self.scene.add_actor(self.mun_callout.actor)
+                else:
+                    self.mun_callout.text = label
+                    self.mun_callout.position = (xloc, yloc, zloc + 3)
 
+    @perf.timed()
     def plot_detail(self):
         """ Plot burstpoints or sample points from the detail file."""
-        self.sel_x, self.sel_y, self.sel_z = [], [], []
-        points = self.radius_points
-        az = self.selected_az
-        for _, key in enumerate(points):
-            self.sel_x.append(points[key][az][0])
-            self.sel_y.append(points[key][az][1])
-            self.sel_z.append(points[key][az][2])
+        # radius_points holds every azimuth, so switching azimuths is just a different slice of the same array.
+        pts = self.radius_points[:, self.model.detail_az_index[self.selected_az]]
+        if self.point_mask is not None:
+            pts = pts[self.point_mask]
+        if len(pts) == 0:
+            # everything is filtered out at this azimuth.
+            if self.burstpoint_glyphs is not None:
+                self.burstpoint_glyphs.visible = False
+                self.layers_changed()
+            return
+        self.sel_x, self.sel_y, self.sel_z = pts[:, 0], pts[:, 1], pts[:, 2]
+        # above the threshold, each point is drawn as a single vertex sized in screen pixels rather than a sphere
+        # glyph, which would cost hundreds of triangles per point. Picking goes through the model's k-d trees, so
+        # it works the same way in either mode.
+        mode = 'point' if len(pts) > POINT_RENDER_THRESHOLD else 'sphere'
+        if self.burstpoint_glyphs is not None and self.burstpoint_mode != mode:
+            self._remove(self.burstpoint_glyphs)
+            self.burstpoint_glyphs = None
+        # with a kill PK for every point, the points are colored by it like the matrix cells; otherwise they're white.
+        values = self.model.get_kill_pks() if self.point_values is None else self.point_values
+        if values is None:
+            scalars = ones_like(self.sel_x)
+        else:
+            scalars = values[:, self.model.detail_az_index[self.selected_az]]
+            if self.point_mask is not None:
+                scalars = scalars[self.point_mask]
         # setting the scalars here is necessary to avoid VTK error: "Algorithm vtkAssignAttribute returned failure
         # for request: vtkInformation". See https://github.com/enthought/mayavi/issues/3
         if self.burstpoint_glyphs is None:
-            self.burstpoint_glyphs = self.scene.mlab.points3d(self.sel_x, self.sel_y, self.sel_z, ones_like(self.sel_x),
-                                                              color=(1, 1, 1), scale_factor=0.75)
+            self.burstpoint_mode = mode
+            self.burstpoint_glyphs = self.scene.mlab.points3d(self.sel_x, self.sel_y, self.sel_z, scalars,
+                                                              scale_factor=0.75, scale_mode='none', mode=mode,
+                                                              figure=self.scene.mayavi_scene)
+            self.burstpoint_glyphs.actor.property.color = (1, 1, 1)
+            lut_manager = self.burstpoint_glyphs.module_manager.scalar_lut_manager
+            lut_manager.lut.table = self.lut_table.table.to_array()
+            lut_manager.use_default_range = False
+            lut_manager.data_range = array([0., 1.])
+            if mode == 'point':
+                prop = self.burstpoint_glyphs.actor.property
+                prop.point_size = POINT_RENDER_SIZE
+                if hasattr(prop, 'render_points_as_spheres'):  # VTK 8.1 and up; older VTK draws square points
+                    prop.render_points_as_spheres = True
+        elif len(self.burstpoint_glyphs.mlab_source.x) != len(self.sel_x):
+            self.burstpoint_glyphs.mlab_source.reset(x=self.sel_x, y=self.sel_y, z=self.sel_z, scalars=scalars)
         else:
-            self.burstpoint_glyphs.mlab_source.set(x=self.sel_x, y=self.sel_y, z=self.sel_z,
-                                                   scalars=ones_like(self.sel_x))
-        # Here, we grab the points describing the individual glyph, to figure
-        # out how many points are in an individual glyph.
-        self.burstpoint_array = self.burstpoint_glyphs.glyph.glyph_source.glyph_source.output.points.to_array()
+            self.burstpoint_glyphs.mlab_source.set(x=self.sel_x, y=self.sel_y, z=self.sel_z, scalars=scalars)
+        self.burstpoint_glyphs.actor.mapper.scalar_visibility = values is not None
+        self.burstpoint_glyphs.visible = True
+        self.layers_changed()
 
     @on_trait_change('scene.activated')
     def update_plot(self):
-        """ Called after Mayavi window has been initialized, so 3D scene is ready to be graphed. """
+        """ Called after Mayavi window has been initialized, so 3D scene is ready to be graphed. Only the target and
+        matrix are drawn here; everything else is queued and streamed in by build_next. """
         model = self.model
         # noinspection PyProtectedMember
         self.scene.scene_editor._tool_bar.setVisible(False)
+        self.time_renders()
         self.scene.disable_render = True  # generate scene more quickly by temporarily turning off rendering
         if model.pks is not None:
             self.plot_matrix_file()  # matrix can be plotted if it was read in
         self.plot_srf_file()
-        if model.blast_ids:
-            self.plot_blast_volumes()
-        self.plot_av()
-        self.plot_munition()
-        if model.sample_loc:
-            self.plot_detail()
         self.axes = self.scene.mlab.orientation_axes(figure=self.scene.mayavi_scene)
         self.axes.visible = False
         self.scene.disable_render = False  # reinstate display
         super(Plotter, self).update_plot()
         self.reset_view()
 
+        # the rest of the scene goes in priority order, one piece per idle callback, so the first frame shows up
+        # right away and the camera can be moved while the scene fills in.
+        self.build_queue = []
+        if model.blast_ids:
+            self.build_queue.append(self.plot_blast_volumes)
+        self.build_queue.extend([self.plot_av, self.plot_munition])
+        if model.sample_loc:
+            self.build_queue.append(self.plot_detail)
+        self.build_total = len(self.build_queue)
+        self.report_build_progress()
+        GUI.invoke_later(self.build_next)
+
+    def time_renders(self):
+        """ Keep the times of the last frames drawn in this scene for the HUD, and add them to the 'render' stage of
+        the current load. Frames are too frequent to log one by one, so they're only totaled. """
+        start = []
+
+        # noinspection PyUnusedLocal
+        def on_start(obj, event_type):
+            # the HUD text goes out with this frame. Only the frame times are new; the layer counts are kept until
+            # the layers change.
+            if self.hud is not None and self.hud.visibility:
+                self.update_hud()
+            start[:] = [time.perf_counter()]
+
+        # noinspection PyUnusedLocal
+        def on_end(obj, event_type):
+            if start:
+                ms = (time.perf_counter() - start.pop()) * 1000.0
+                self.frame_times.append(ms)
+                perf.add_time('render', ms)
+        render_window = self.scene.render_window
+        render_window.add_observer('StartEvent', on_start)
+        render_window.add_observer('EndEvent', on_end)
+
+    def get_layers(self):
+        """ :return: dict of layer name -> list of (actor, visible) for the actors drawn in that layer, where visible
+        is whether the scene code means the actor to be shown. """
+        def modules(*lst):
+            return [(actor, module.visible) for module in lst if module is not None for actor in module.actor.actors]
+
+        def callouts(*lst):
+            return [(c.actor, c.visible or c.actor in self.hidden_callouts) for c in lst if c is not None]
+
+        return {'Target': modules(self.target),
+                'Matrix': modules(self.contour_surf, self.view_surf, *self.matrix_surfs),
+                'Blast volumes': modules(*self.blast_surfs.values()),
+                'AV glyphs': modules(self.av_glyphs),
+                'Callouts': callouts(self.mtx_callout, self.mun_callout, *self.av_callouts),
+                'Burstpoints': modules(self.burstpoint_glyphs),
+                'Frag zones': modules(self.zone_surf)}
+
+    def memory_usage(self, seen=None):
+        """
+        :param seen: set of VTK data sets already counted, so geometry shared with other windows is counted once
+        :return: dict of bytes of VTK data drawn in each layer, plus 'Offscreen' for geometry that is kept but
+                 not shown.
+        """
+        seen = set() if seen is None else seen
+        usage = {}
+        for layer, actors in self.get_layers().items():
+            # text actors have 2D mappers with no data set, and are left out.
+            mappers = [tvtk.to_vtk(actor).GetMapper() for actor, _ in actors]
+            usage[layer] = sum(vtk_data_size(mapper.GetInputAsDataSet(), seen) for mapper in mappers
+                               if hasattr(mapper, 'GetInputAsDataSet'))
+        offscreen = [tile.full_grid for tile in self.matrix_tiles if not tile.refined]
+        if self.shotline_surf is not None and not self.shotline_surf.visible:
+            offscreen.append(self.shotline_poly)
+        if self.view_surf is not None and not self.view_surf.visible:
+            offscreen.append(self.view_grid)
+        usage['Offscreen'] = sum(vtk_data_size(data, seen) for data in offscreen) + memory.sizeof(self.zone_meshes)
+        return usage
+
+    def release_memory(self):
+        """ Let go of geometry that isn't on screen: full resolution matrix tiles now drawn coarse, hidden shotlines,
+        frag zones and matrix views, and the frag zone mesh cache. Each is rebuilt if it's needed again. """
+        for tile in self.matrix_tiles:
+            if not tile.refined:
+                tile.full_grid = None
+        if self.shotline_surf is not None and not self.shotline_surf.visible:
+            self._remove(self.shotline_surf)
+            self.shotline_poly, self.shotline_source, self.shotline_surf = None, None, None
+        if self.zone_surf is not None and not self.zone_surf.visible:
+            self._remove(self.zone_surf)
+            self.zone_poly, self.zone_source, self.zone_surf = None, None, None
+        if self.view_surf is not None and not self.view_surf.visible:
+            self._remove(self.view_surf)
+            self.view_grid, self.view_surf = None, None
+        self.zone_meshes = {}
+
+    def set_layer_visible(self, layer, is_visible):
+        """ Show or hide a whole layer of the scene, e.g. to see how much of the frame time it takes.
+        :param layer: one of SCENE_LAYERS
+        :param is_visible: False to keep the layer hidden until it's shown again
+        """
+        if is_visible:
+            self.hidden_layers.discard(layer)
+            for actor, visible in self.get_layers()[layer]:
+                actor.visibility = visible
+                self.hidden_callouts.discard(actor)
+        else:
+            self.hidden_layers.add(layer)
+        self.layers_changed()
+        self.scene.render()
+
+    def layers_changed(self):
+        """ Called wherever the scene code adds, removes, shows or hides actors. The actors of hidden layers are
+        hidden again, whatever the scene code just did to them, and the HUD recounts the layers on its next frame. """
+        if self.hidden_layers:
+            self.enforce_hidden_layers()
+        self.layer_lines = None
+
+    def enforce_hidden_layers(self):
+        layers = self.get_layers()
+        for layer in self.hidden_layers:
+            for actor, _ in layers[layer]:
+                if actor.visibility:
+                    actor.visibility = False
+                    if layer == 'Callouts':
+                        self.hidden_callouts.add(actor)
+
+    def show_hud(self, is_visible):
+        """ Overlay frame time percentiles and the actor and polygon count of each layer on the scene. """
+        if self.hud is None:
+            self.hud = tvtk.TextActor()
+            prop = self.hud.text_property
+            prop.font_family, prop.font_size, prop.color = 'courier', 13, (1, 1, 1)
+            prop.vertical_justification = 'top'
+            self.hud.position_coordinate.coordinate_system = 'normalized_viewport'
+            self.hud.position_coordinate.value = (0.01, 0.98, 0.0)
+            self.scene.add_actor(self.hud)
+        self.hud.visibility = is_visible
+        self.scene.render()
+
+    def update_hud(self):
+        if self.frame_times:
+            p50, p90, p99 = percentile(self.frame_times, (50, 90, 99))
+            lines = ['Frame ms  p50 {0:.1f}  p90 {1:.1f}  p99 {2:.1f}  ({3} frames)'.format(
+                p50, p90, p99, len(self.frame_times))]
+        else:
+            lines = ['Frame ms  -']
+        if self.layer_lines is None:
+            self.layer_lines = self.count_layers()
+        self.hud.input = '\n'.join(lines + self.layer_lines)
+
+    def count_layers(self):
+        """ :return: HUD lines with the number of actors and polygons shown in each layer. """
+        lines = ['{0:<15}{1:>8}{2:>11}'.format('Layer', 'Actors', 'Polygons')]
+        layers = self.get_layers()
+        for layer in SCENE_LAYERS:
+            actors = [actor for actor, visible in layers[layer] if visible]
+            polys = sum(self.count_polygons(actor) for actor in actors)
+            state = ' (hidden)' if layer in self.hidden_layers else ''
+            lines.append('{0:<15}{1:>8}{2:>11}{3}'.format(layer, len(actors), polys, state))
+        return lines
+
+    @staticmethod
+    def count_polygons(actor):
+        """ :return: number of cells the actor's mapper draws, or 0 for text actors. """
+        mapper = tvtk.to_vtk(actor).GetMapper()
+        if not hasattr(mapper, 'GetInputAsDataSet'):
+            return 0
+        data = mapper.GetInputAsDataSet()
+        return data.GetNumberOfCells() if data is not None else 0
+
+    def build_next(self):
+        """ Plot the next queued piece of the scene, then schedule the one after it. """
+        if not self.build_queue:
+            return
+        try:
+            self.keep_camera(self.build_queue.pop(0))
+        finally:
+            # a step that fails doesn't stop the rest of the scene from being built.
+            self.report_build_progress()
+            if self.build_queue:
+                GUI.invoke_later(self.build_next)
+
+    def keep_camera(self, step):
+        """ Run step() with rendering off, then render. mlab calls may reset the camera, so it's put back where the
+        user left it. """
+        camera = self.scene.camera
+        position, focal_point, view_up = camera.position, camera.focal_point, camera.view_up
+        self.scene.disable_render = True
+        try:
+            step()
+        finally:
+            # rendering is turned back on even if the step fails, or the scene would never be drawn again.
+            camera.position, camera.focal_point, camera.view_up = position, focal_point, view_up
+            self.scene.renderer.reset_camera_clipping_range()
+            self.layers_changed()
+            self.scene.disable_render = False
+            self.scene.render()
+
+    def update_model(self, model, matrix_tolerance=None):
+        """ Show another case of the same target in this window. Only the pieces of the scene that differ from the
+        current case are rebuilt, and the camera stays where it is.
+        :param model: DataModel of the new case
+        :param matrix_tolerance: PK tolerance of the merged-cell matrix, or None to draw every cell
+        """
+        self.cancel_build()
+        self.model = model
+        self.pk_tree = model.get_pk_tree(matrix_tolerance)
+        self.keep_camera(self._update_scene)
+        self.report_build_progress()
+
+    @perf.timed()
+    def _update_scene(self):
+        model = self.model
+        if self.access_obj is not None:
+            self.access_obj.hide()
+        if self.zone_surf is not None:
+            self.zone_surf.visible = False
+        self.hide_shotlines()
+        self.hide_matrix_view()
+        if self.target_key != ('target', file_key(model.srf_file)):
+            self._remove(self.target)
+            self.plot_srf_file()
+        self.update_matrix()
+        self.plot_blast_volumes()
+        if self.av_key != ('av labels', file_key(model.av_file), tuple(sorted(model.frag_ids))):
+            self._remove(self.av_glyphs)
+            for callout in self.av_callouts:
+                self.scene.remove_actor(callout.actor)
+            self.av_callouts = []
+            self.plot_av()
+        self.plot_munition()
+        if model.sample_loc:
+            self.plot_detail()
+        elif self.burstpoint_glyphs is not None:
+            self.burstpoint_glyphs.visible = False
+
+    @perf.timed()
+    def update_matrix(self):
+        """ Swap in the matrix of the current model. A plain grid or image keeps its actor and only gets new
+        gridlines and PKs; any other change of matrix layout replaces the matrix actors. """
+        model = self.model
+        cells_visible = all(surf.visible for surf in self.matrix_surfs)
+        contours_visible = self.contour_surf is not None and self.contour_surf.visible
+        if self.contour_surf is not None:
+            self._remove(self.contour_surf)
+            self.contour_surf, self.contour_poly = None, None
+        self.frame_matrix = None
+        kind = self.get_matrix_kind() if model.pks is not None else None
+        if kind is not None and kind == self.matrix_kind and kind in ('rgrid', 'image'):
+            if kind == 'rgrid':
+                self.rgrid.shallow_copy(self._make_rgrid(model.pks, model.gridlines_range, model.gridlines_defl))
+            else:
+                self.matrix_image.shallow_copy(self._make_image())
+            self.matrix_surfs[0].module_manager.source.update()
+            self.plot_matrix_callout()
+        else:
+            for surf in self.matrix_surfs:
+                self._remove(surf)
+            self.matrix_surfs, self.matrix_tiles, self.tile_corners = [], [], None
+            self.rgrid, self.matrix_image, self.matrix_poly, self.matrix_kind = None, None, None, None
+            if kind is None:
+                if self.mtx_callout is not None:
+                    self.mtx_callout.visible = False
+                return
+            self.plot_matrix_file()
+            self.refine_matrix_tiles()
+        self.set_matrix_cells_visible(cells_visible)
+        self.set_matrix_contours_visible(contours_visible)
+
+    def _remove(self, module):
+        """ Take a module off the scene along with the data source feeding it. """
+        if module is not None:
+            module.module_manager.source.remove()
+            self.layers_changed()
+
+    def cancel_build(self):
+        """ Drop whatever is still queued, e.g. when the window is closing. """
+        self.build_queue = []
+
+    def report_build_progress(self):
+        if self.progress_callback is not None:
+            self.progress_callback(self.build_total - len(self.build_queue), self.build_total)
+
     def reset_view(self):
         """ Puts 3D camera back in default position. """
-        self.scene.mlab.view(azimuth=315, elevation=83, distance=self.model.volume_radius * 6, focalpoint=(0, 0, 20))
+        self.scene.mlab.view(azimuth=315, elevation=83, distance=self.model.volume_radius * 6, focalpoint=(0, 0, 20),
+                             figure=self.scene.mayavi_scene)
+        self.refine_matrix_tiles()
 
     def top_view(self):
-        self.scene.mlab.view(azimuth=270, elevation=0, distance=self.model.volume_radius * 12, focalpoint=(0, 0, 20))
+        self.scene.mlab.view(azimuth=270, elevation=0, distance=self.model.volume_radius * 12, focalpoint=(0, 0, 20),
+                             figure=self.scene.mayavi_scene)
+        self.refine_matrix_tiles()
 
     def save_view_to_file(self, filename):
         self.scene.mlab.savefig(filename, figure=self.scene.mayavi_scene)
 
+    def orbit_view(self, preset, angle):
+        """ Put the camera at a preset and then turn it around the vertical axis through the focal point.
+        :param preset: camera preset method (reset_view or top_view)
+        :param angle: degrees to turn
+        """
+        preset()
+        camera = self.scene.camera
+        c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        fx, fy, _ = camera.focal_point
+        x, y, z = camera.position
+        ux, uy, uz = camera.view_up
+        camera.position = (fx + c * (x - fx) - s * (y - fy), fy + s * (x - fx) + c * (y - fy), z)
+        camera.view_up = (c * ux - s * uy, s * ux + c * uy, uz)
+        self.scene.renderer.reset_camera_clipping_range()
+
+    def render_image(self, magnification=1):
+        """ Render the current view at a multiple of the window size in an offscreen window, so the window on screen
+        is left alone. The image is drawn in one pass when it fits in EXPORT_MAX_RENDER_SIZE, and otherwise in tiles
+        of the window size, since most GL drivers can't allocate a frame buffer much larger than that.
+        :param magnification: image size as a multiple of the window size
+        :return: (pixels, (width, height)), with pixels as a (width * height, components) uint8 array
+        """
+        renderer = self.scene.renderer
+        width, height = renderer.render_window.size
+        # the offscreen window is kept for the whole export queue, so a movie doesn't make a GL context per frame.
+        if self.export_window is None:
+            self.export_renderer = tvtk.Renderer()
+            self.export_window = tvtk.RenderWindow(off_screen_rendering=True)
+            self.export_window.add_renderer(self.export_renderer)
+        offscreen = self.export_renderer
+        offscreen.background = renderer.background
+        offscreen.active_camera = renderer.active_camera
+        # the HUD describes this window, not the picture, so it's left out of exported images.
+        hud = tvtk.to_vtk(self.hud) if self.hud is not None else None
+        props = tvtk.to_vtk(renderer).GetViewProps()
+        props.InitTraversal()
+        for _ in range(props.GetNumberOfItems()):
+            prop = props.GetNextProp()
+            if prop is not hud:
+                tvtk.to_vtk(offscreen).AddViewProp(prop)
+        try:
+            if max(width, height) * magnification <= EXPORT_MAX_RENDER_SIZE:
+                self.export_window.size = (width * magnification, height * magnification)
+                self.export_window.render()
+                grab = tvtk.WindowToImageFilter(input=self.export_window)
+            else:
+                self.export_window.size = (width, height)
+                grab = tvtk.RenderLargeImage(input=offscreen, magnification=magnification)
+            grab.update()
+            output = grab.output
+            width, height, _ = output.dimensions
+            # copy the pixels out of the filter so they can be handed to another thread.
+            pixels = output.point_data.scalars.to_array().copy()
+        finally:
+            offscreen.remove_all_view_props()
+        return pixels, (width, height)
+
+    def release_export_window(self):
+        """ Close the offscreen window once the export queue is done. """
+        if self.export_window is not None:
+            self.export_window.finalize()
+            self.export_window, self.export_renderer = None, None
+
     def show_axes(self, state):
         """ Shows/hides 3D axis legend on the window. """
         self.axes.visible = state
@@ -354,14 +1279,29 @@ class Plotter(Visualization):
     def get_camera(self):
         return self.scene.camera
 
-    def update_point_detail(self, az, points):
+    def update_point_detail(self, az, points, mask=None):
         """ Called when view selections are changed, and associated azimuth and sample/burst points need to
-        be updated on next scene refresh. """
+        be updated on next scene refresh.
+        :param az: selected azimuth
+        :param points: (num_points, num_azimuths, 3) array of sample or burstpoint locations
+        :param mask: optional boolean array over the points; only points where it's True are shown
+        """
         self.selected_az = az
         self.radius_points = points
+        self.point_mask = mask
+
+    def set_point_values(self, values):
+        """ Color the sample points or burstpoints by something other than kill PK.
+        :param values: (num_points, num_azimuths) array of values between 0 and 1, or None to go back to kill PK
+        """
+        self.point_values = values
 
     def set_av_callouts_visible(self, is_visible):
         """ Show/hide component AV callouts """
+        self.av_callouts_visible = is_visible
         for c in self.av_callouts:
             c.visible = is_visible
+        self.layers_changed()
+        if self.av_highlight is not None:
+            self.highlight_av(self.av_highlight)
 
@@ -0,0 +1,51 @@
+import unittest
+from bisect import bisect_left
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Text search over component names and IDs, fast enough to run on every keystroke.
+'''
+
+
+class NameIndex(object):
+    """ Sorted list of every suffix of every key (lowercased names and ID numbers). Any substring of a key is a prefix
+    of one of its suffixes, so a query is two binary searches plus the run of suffixes between them. """
+    def __init__(self, names):
+        """
+        :param names: dict of {item ID: name}
+        """
+        entries = []
+        for item_id, name in names.items():
+            for key in (name.lower(), str(item_id)):
+                entries.extend((key[i:], i == 0, item_id) for i in range(len(key)))
+        entries.sort(key=lambda entry: entry[0])
+        self.suffixes = [entry[0] for entry in entries]
+        self.is_start = [entry[1] for entry in entries]
+        self.ids = [entry[2] for entry in entries]
+
+    def search(self, text, prefix_only=False):
+        """
+        :param text: text to look for; case doesn't matter
+        :param prefix_only: True to match only names or IDs that start with the text
+        :return: set of IDs whose name or ID contains the text.
+        """
+        text = text.strip().lower()
+        if not text:
+            return set()
+        lo = bisect_left(self.suffixes, text)
+        # every string starting with text sorts before text followed by the highest character.
+        hi = bisect_left(self.suffixes, text + '\U0010ffff', lo)
+        return set(self.ids[i] for i in range(lo, hi) if self.is_start[i] or not prefix_only)
+
+
+class TestSearchLib(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex({1: 'Fuel Tank', 2: 'Engine', 3: 'Fuel Line', 12: 'Pilot'})
+
+    def test_search(self):
+        self.assertEqual(self.index.search('fuel'), {1, 3})
+        self.assertEqual(self.index.search('IN'), {2, 3})
+        self.assertEqual(self.index.search('in', prefix_only=True), set())
+        self.assertEqual(self.index.search('1'), {1, 12})
+        self.assertEqual(self.index.search('2', prefix_only=True), {2})
+        self.assertEqual(self.index.search('  '), set())
@@ -0,0 +1,70 @@
+import numpy as np
+from PyQt4.QtCore import QThread, pyqtSignal
+import matrixlib
+from datamodel import DataModel
+
+__author__ = 'brandon.corfman'
+__doc__ = '''
+    Background loading of the matrices for a sweep across one terminal condition (AOF, terminal velocity or burst
+    height) of a case.
+'''
+
+
+class SweepLoader(QThread):
+    """ Reads the matrix of each case in a sweep on a worker thread and regrids it onto the gridlines of the matrix on
+    display, so a frame can be shown by copying its PKs into the existing matrix scalars. """
+    frame_loaded = pyqtSignal(int, str)  # frame index, and an error message or '' if the frame loaded fine.
+    model_loaded = pyqtSignal(object)  # DataModel of each case read, for the GUI thread to count in memory.track_model
+
+    def __init__(self, cases, gridlines_range, gridlines_defl, parent=None):
+        """
+        :param cases: list of (terminal condition text, .out file path) in sweep order
+        :param gridlines_range: range gridlines of the matrix on display
+        :param gridlines_defl: deflection gridlines of the matrix on display
+        :param parent: owning QObject
+        """
+        super().__init__(parent)
+        self.cases = cases
+        self.gridlines_range = np.array(gridlines_range, dtype=float)
+        self.gridlines_defl = np.array(gridlines_defl, dtype=float)
+        # all the frames are kept in one stacked array, indexed as [frame, range, defl].
+        self.frames = np.zeros((len(cases), len(gridlines_range) - 1, len(gridlines_defl) - 1))
+        self.loaded = np.zeros(len(cases), dtype=bool)
+        # the matrices as read, for views that put every case on a common grid (see common_stack).
+        self.matrices = [None] * len(cases)
+        self.models = [None] * len(cases)  # kept while their matrices are, so they're counted in the memory totals
+        self.common = None
+        self.stop_requested = False
+
+    def run(self):
+        for i, (_, out_file) in enumerate(self.cases):
+            if self.stop_requested:
+                return
+            try:
+                model = DataModel()
+                model.read_matrix(out_file)
+                self.models[i] = model
+                self.matrices[i] = model.pks, model.gridlines_range, model.gridlines_defl
+                self.frames[i] = matrixlib.regrid(model.pks, model.gridlines_range, model.gridlines_defl,
+                                                  self.gridlines_range, self.gridlines_defl)
+            except Exception as e:
+                self.frame_loaded.emit(i, str(e))
+                continue
+            self.loaded[i] = True
+            self.model_loaded.emit(model)
+            self.frame_loaded.emit(i, '')
+
+    def common_stack(self, max_lines):
+        """ Every loaded matrix resampled onto one common grid, computed once the first time it's asked for.
+        :return: (indices of the loaded cases, stack indexed as [case, range, defl], gridlines_range, gridlines_defl)
+        """
+        if self.common is None:
+            idx = np.nonzero(self.loaded)[0]
+            stack, gr, gd = matrixlib.regrid_all([self.matrices[i] for i in idx], max_lines)
+            self.common = idx, stack, gr, gd
+        return self.common
+
+    def stop(self):
+        """ Ask the worker to quit after the frame it is reading, and wait for it. """
+        self.stop_requested = True
+        self.wait()